@@ -0,0 +1,193 @@
+"""
+Benchmark of the control tick (20 simulation steps) for every algorithm mode and BENCHMARK_CAR_COUNTS cars.
+The traffic is synthetic: the cars are spread evenly over all lanes of the freeway in the LocalSimulation, so no SUMO
+is needed and every run is reproducible. After BENCHMARK_WARMUP_TICKS ticks, BENCHMARK_TICKS ticks are measured with
+a breakdown into the sections of the main loop in PlatooningAPI:
+
+    simulation          20 x PlexeCommands.flush, simulationStep and snapshot update (LocalSimulation, not
+                        comparable to SUMO)
+    removal             removing routine at the end of the routes
+    neighbor_update     neighbor table and neighbors of every car
+    neighbor_search     processing_neighbor_search (only in decision ticks, every 100 steps)
+    state_dispatch      state actions of every car, including the leader actions of every platoon
+    monitoring          Monitoring.observe in the steps of the tick which are a multiple of MONITORING_INTERVAL, like in
+                        PlatooningAPI
+
+The results are written as JSON (BENCHMARK_OUTPUT or the first argument), the seconds per tick of every section are
+averaged over all measured ticks ("sections") and over the decision ticks only ("decision_sections").
+"""
+
+import json
+import math
+import random
+import sys
+import time
+from timeit import default_timer as clock
+
+import CONSTANTS
+
+# Monitoring and the VehicleStore are sized for AMOUNT_RANDOM_CARS, the benchmark has to record all cars.
+CONSTANTS.AMOUNT_RANDOM_CARS = max(CONSTANTS.BENCHMARK_CAR_COUNTS)
+
+import LocalSimulation
+
+LocalSimulation.install()
+
+import traci
+
+import createUtils
+import EventLog
+import Monitoring
+import PlatooningAPI
+import PlexeCommands
+import RunIndex
+import VehicleSnapshot
+from CONSTANTS import *
+
+TICK_STEPS = 20
+SECTIONS = ("simulation", "removal", "neighbor_update", "neighbor_search", "state_dispatch", "monitoring")
+# The cars are placed in front of this position, so every car has at least one route to choose.
+SPREAD = 19000
+
+
+def populate(plexe, cars):
+    """
+    Adds the cars evenly spread over all lanes, each with a random start route which ends behind its position.
+    """
+    network = LocalSimulation.get_world().network
+    lanes = LocalSimulation.LANES
+    spacing = float(SPREAD) / int(math.ceil(float(cars) / lanes))
+    for i in range(cars):
+        position = (i // lanes) * spacing + random.uniform(0, max(spacing - 2 * VEHICLE_LENGTH, 0))
+        # Route types 0 - 3 start at the beginning of the freeway
+        routes = [vroute for vroute in range(4)
+                  if network.routes[ROUTE_TYPES[vroute]].end > position + LEAVE_HIGHWAY_DISTANCE]
+        createUtils.add_vehicle(plexe, "v.%d" % i, position, lane=i % lanes, vroute=random.choice(routes))
+
+
+def simulation_step(step):
+    PlexeCommands.flush()
+    traci.simulationStep()
+    all_vehicles = list(traci.vehicle.getIDList())
+    VehicleSnapshot.update(all_vehicles)
+    EventLog.set_time(step)
+    return all_vehicles
+
+
+def run_tick(step, plexe, vehicleInfos, neighbor_index, counter, monitors, times):
+    """
+    Runs the tick starting at step (a multiple of TICK_STEPS) and adds the time of every section to times.
+    Returns the amount of cars handled by the state machine.
+    """
+    start = clock()
+    all_vehicles = simulation_step(step)
+    times["simulation"] += clock() - start
+
+    vehicles = list(all_vehicles)
+    start = clock()
+    PlatooningAPI.remove_vehicles(all_vehicles, vehicles, vehicleInfos, plexe, counter, [])
+    times["removal"] += clock() - start
+
+    start = clock()
+    PlatooningAPI.update_neighbor_table(neighbor_index, vehicles)
+    times["neighbor_update"] += clock() - start
+
+    for car in vehicles:
+        state = vehicleInfos[car].get_state()
+        start = clock()
+        neighbors = PlatooningAPI.update_neighbors(car, neighbor_index, vehicleInfos)
+        searched = clock()
+        neighbor = PlatooningAPI.search_neighbor(car, state, neighbors, step)
+        dispatched = clock()
+        PlatooningAPI.perform_state_action(car, state, neighbor, neighbors, step, vehicleInfos, counter,
+                                           monitors[0], monitors[1])
+        end = clock()
+        times["neighbor_update"] += searched - start
+        times["neighbor_search"] += dispatched - searched
+        times["state_dispatch"] += end - dispatched
+
+    observe(step, times)
+    for tick_step in range(step + 1, step + TICK_STEPS):
+        start = clock()
+        simulation_step(tick_step)
+        times["simulation"] += clock() - start
+        observe(tick_step, times)
+    return len(vehicles)
+
+
+def observe(step, times):
+    """
+    Samples the monitoring, if it is due in this step (same interval as in PlatooningAPI.run_simulation).
+    """
+    if step % MONITORING_INTERVAL == 0:
+        start = clock()
+        Monitoring.observe(step)
+        times["monitoring"] += clock() - start
+
+
+def mean(values):
+    return sum(values) / len(values) if values else 0.0
+
+
+def summary(ticks):
+    sections = dict((name, mean([times[name] for times in ticks])) for name in SECTIONS)
+    sections["total"] = mean([sum(times.values()) for times in ticks])
+    return sections
+
+
+def benchmark(mode, cars):
+    """
+    Returns the result of one mode and car count.
+    """
+    plexe, vehicleInfos, neighbor_index = PlatooningAPI.setup_simulation(BENCHMARK_SEED, mode, gui=False)
+    populate(plexe, cars)
+    counter = [0, 0, 0, 0, 0, 0]
+    monitors = [], []
+
+    ticks = []
+    decision_ticks = []
+    vehicles = []
+    for tick in range(BENCHMARK_WARMUP_TICKS + BENCHMARK_TICKS):
+        step = tick * TICK_STEPS
+        times = dict((name, 0.0) for name in SECTIONS)
+        amount = run_tick(step, plexe, vehicleInfos, neighbor_index, counter, monitors, times)
+        if tick >= BENCHMARK_WARMUP_TICKS:
+            ticks.append(times)
+            vehicles.append(amount)
+            if PlatooningAPI.hundred_ms_times(10, step):
+                decision_ticks.append(times)
+    traci.close()
+
+    sections = summary(ticks)
+    return {"mode": mode,
+            "algorithm": RunIndex.ALGORITHMS[mode],
+            "cars": cars,
+            "vehicles": mean(vehicles),
+            "ticks": len(ticks),
+            "decision_ticks": len(decision_ticks),
+            "sections": sections,
+            "decision_sections": summary(decision_ticks),
+            "max_total": max(sum(times.values()) for times in ticks),
+            "counters": dict((name, counter[index]) for name, index in RunIndex.COUNTERS)}
+
+
+def main():
+    output = sys.argv[1] if len(sys.argv) > 1 else BENCHMARK_OUTPUT
+    results = []
+    for mode in MODES:
+        for cars in BENCHMARK_CAR_COUNTS:
+            result = benchmark(mode, cars)
+            results.append(result)
+            print("Benchmark " + result["algorithm"] + " " + str(cars) + " cars: "
+                  + str(round(result["sections"]["total"] * 1000, 1)) + " ms per tick")
+
+    with open(output, 'w') as f:
+        json.dump({"created": round(time.time(), 3),
+                   "config_hash": RunIndex.config_hash(),
+                   "tick_steps": TICK_STEPS,
+                   "warmup_ticks": BENCHMARK_WARMUP_TICKS,
+                   "results": results}, f, indent=2, sort_keys=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,9 @@ import matplotlib.pyplot as plt
 
 from CONSTANTS import SINGLE_CAR, JOINING_PROCESS, PREPARE_JOINING, PLATOON, MERGING, LEAVING_PROCESS, LEFT, \
     NO_PLATOONING, NEW_SPAWNED, AMOUNT_RANDOM_CARS
+import MetricLoader
+import RunIndex
+import aggregate
 
 
 COLORS = ['tab:blue', 'tab:orange', 'tab:brown', 'tab:purple', 'tab:cyan', 'tab:olive', 'tab:pink', 'tab:red']
@@ -26,9 +29,8 @@ MEGA_SIZE = 20
 
 
 def csv_to_array(path):
-    with open(path, 'r') as f:
-        array = list(csv.reader(f, delimiter=","))
-        return np.array(array[2:], dtype=np.float)
+    # Parsed once per run and metric, see MetricLoader.
+    return MetricLoader.load_file(path)
 
 
 def boxplots(path):
@@ -46,17 +48,25 @@ def boxplots(path):
 
 
     for scenario in sorted(scenarios):
-        tmp_seeds = os.listdir(scenario)
-        seeds = []
-        for s in tmp_seeds:
-            if not (s.endswith(".png") or s.endswith(".txt")):
-                seeds.append(s)
-
-        tmp_algorithms = os.listdir(scenario + "/" + seeds[0])
-        algorithms = []
-        for a in tmp_algorithms:
-            if not (a.endswith(".png") or a.endswith(".txt")):
-                algorithms.append(a)
+        if RunIndex.exists(scenario):
+            runs = RunIndex.by_algorithm(RunIndex.read(scenario))
+            algorithms = list(runs.keys())
+            run_paths = [[RunIndex.run_path(scenario, record) for record in runs[algorithm]]
+                         for algorithm in algorithms]
+        else:
+            # Scenarios copied without run index
+            tmp_seeds = os.listdir(scenario)
+            seeds = []
+            for s in tmp_seeds:
+                if not (s.endswith(".png") or s.endswith(".txt")):
+                    seeds.append(s)
+
+            tmp_algorithms = os.listdir(scenario + "/" + seeds[0])
+            algorithms = []
+            for a in tmp_algorithms:
+                if not (a.endswith(".png") or a.endswith(".txt")):
+                    algorithms.append(a)
+            run_paths = [[scenario + "/" + seed + "/" + algorithm for seed in seeds] for algorithm in algorithms]
 
         timesteps = np.arange(150, 600, 1)
         #       Aufrufreihenfolge data[algorithm][timestep]
@@ -64,27 +74,17 @@ def boxplots(path):
         average_happiness = [[] for a in xrange(len(algorithms))]
 
         for a in range(len(algorithms)):
-            for seed in seeds:
-                full_path = scenario + "/" + seed + "/" + algorithms[a]
-
-                platoon_size = csv_to_array(full_path + "/platoon_size.csv")
-                happiness = csv_to_array(full_path + "/happiness.csv")
-
-                for step in timesteps:
-                    # for every line in array
-                    if len(platoon_size) / 2 > step:
-                        platoon_size_step = (platoon_size[step, 1:])
-                        happiness_step = (happiness[step, 1:])
-                        # amount of cars is actually the same
-                        amount_of_cars = np.sum((platoon_size_step > -1))
-
-                        platoon_leaders = np.sum((platoon_size_step > -1) & (platoon_size_step < 1000))
-                        average_platoon_size[a].append(float(amount_of_cars) / platoon_leaders)
-
-                        happiness_sum = sum(happiness_step) - amount_of_cars + len(happiness_step)
-                        average_happiness[a].append(float(happiness_sum) / amount_of_cars)
+            for full_path in run_paths[a]:
+                platoon_size, happiness = aggregate.align(csv_to_array(full_path + "/platoon_size.csv"),
+                                                          csv_to_array(full_path + "/happiness.csv"))
 
+                average_platoon_size_all, amount_of_cars = aggregate.average_platoon_size(platoon_size)
+                average_happiness_all = aggregate.ratio(aggregate.sum_present(happiness, amount_of_cars),
+                                                        amount_of_cars)
 
+                steps = aggregate.rows_before(platoon_size, timesteps)
+                average_platoon_size[a].extend(average_platoon_size_all[steps].tolist())
+                average_happiness[a].extend(average_happiness_all[steps].tolist())
 
         # append all timestep - lists to one list for boxplotting
         for a in range(len(algorithms)):
@@ -169,11 +169,14 @@ def deleter(folder):
                         if not (algorithm.endswith(".png") or algorithm.endswith(".txt")):
                             files = os.listdir(folder + "/" + scenario + "/" + seed + "/" + algorithm)
                             for file in files:
+                                # Folders of the loader cache and the binary chunks
+                                if os.path.isdir(folder + "/" + scenario + "/" + seed + "/" + algorithm + "/" + file):
+                                    continue
                                 if not (file.startswith("happiness.csv") or file.startswith("platoon_size.csv")):
                                     os.remove(folder + "/" + scenario + "/" + seed + "/" + algorithm + "/" + file)
                         else:
                             os.remove(folder + "/" + scenario + "/" + seed + "/" + algorithm)
-                else:
+                elif seed != RunIndex.INDEX_FILE:
                     os.remove(folder + "/" + scenario + "/" + seed)
 
 
@@ -79,6 +79,49 @@ HEINOVSKI = 4
 CURRENT = 0
 MEAN = 1
 
+# Above this amount of cars, distances are computed on demand instead of as a full matrix per step.
+DISTANCE_MATRIX_MAX_CARS = 1000
+
+# SWEEP
+SEEDS = 4, 5, 6, 7, 8, 9, 10, 11
+MODES = E_GREEDY, UCB1, BAYES_UCB, THOMPSON_SAMPLING, HEINOVSKI
+SWEEP_WORKERS = None            # None uses all available cores
+HEADLESS = False                # Run with the plain sumo binary. Sweeps always run headless.
+LOCAL_SIMULATION = False        # Kinematic stand-in for SUMO / Plexe (LocalSimulation.py) instead of SUMO, or --local
+PROFILING = False               # Time the main loop and count all TraCI / Plexe calls (profile.txt), or --profile
+PLEXE_COMMAND_BUFFER = True     # Send only the last Plexe / TraCI setter per car and parameter of a tick (PlexeCommands)
+
+# BENCHMARK
+BENCHMARK_CAR_COUNTS = 50, 250, 1000, 5000
+BENCHMARK_WARMUP_TICKS = 25     # Ticks before the measurement, the first platoons are formed in this time
+BENCHMARK_TICKS = 20            # Measured ticks per mode and car count
+BENCHMARK_SEED = 0              # Seed of the synthetic traffic, its monitoring output goes to data/<seed>
+BENCHMARK_OUTPUT = "data/benchmark.json"
+
+# MONITORING
+MONITORING_BINARY = False       # Write the metrics as numpy chunks (data/<seed>/<mode>/npy) instead of csv files
+MONITORING_INTERVAL = 50        # Steps between two observations (50 steps = 0.5 s)
+# Sampling interval of each metric as a multiple of MONITORING_INTERVAL, 0 disables the metric.
+MONITORING_METRICS = {
+    "desired_platoon_speed": 1,
+    "desired_speed": 1,
+    "speed": 1,
+    "speed_factor": 1,
+    "platoon_size": 1,
+    "happiness": 1,
+    "speed_happiness": 1,
+    "platoon_size_happiness": 1,
+    "distance_to_end_happiness": 1,
+    "distance_in_between_happiness": 1,
+    "happiness_table": 1,
+    "neighborhood": 1,
+    "candidatehood": 1,
+    "states": 1
+}
+MONITORING_CHEAP = False        # Skips the happiness decomposition and the happiness table, only total happiness
+MONITORING_SPARSE = False       # Write only existing cars as (time, car, value) records instead of dense matrices
+MONITORING_STATE_EVENTS = True  # Log every state transition to data/<seed>/<mode>/state_events.bin
+
 #E_GREEDY
 E_GREEDY_E = 0.1
 #BAYES_UCB
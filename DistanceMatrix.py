@@ -0,0 +1,80 @@
+"""
+Signed distance matrix between all vehicles of the current step.
+The matrix is computed in a single numpy pass from the positions of the VehicleSnapshot the first time a distance is
+requested in a step. Every further get_distance call of the step is a lookup.
+"""
+
+import math
+
+import numpy as np
+
+import VehicleSnapshot
+from CONSTANTS import VEHICLE_LENGTH, DISTANCE_MATRIX_MAX_CARS
+
+version = -1
+index = {}
+positions = []
+matrix = None
+
+
+def reset():
+    global version
+    global index
+    global positions
+    global matrix
+    version = -1
+    index = {}
+    positions = []
+    matrix = None
+
+
+def __build():
+    """
+    Collects the positions of the snapshot and computes the distance matrix.
+    Above DISTANCE_MATRIX_MAX_CARS vehicles the n x n matrix gets too large, in that case only the positions are
+    cached and distances are computed on demand.
+    """
+    global version
+    global index
+    global positions
+    global matrix
+    index = {}
+    positions = []
+    for car, position in VehicleSnapshot.get_all_positions():
+        index[car] = len(positions)
+        positions.append(position)
+    version = VehicleSnapshot.version
+
+    if 0 < len(positions) <= DISTANCE_MATRIX_MAX_CARS:
+        xy = np.array(positions, dtype=np.float64)
+        dx = xy[:, 0][:, np.newaxis] - xy[:, 0][np.newaxis, :]
+        dy = xy[:, 1][:, np.newaxis] - xy[:, 1][np.newaxis, :]
+        distance = np.hypot(dx, dy) - VEHICLE_LENGTH
+        # A vehicle in front of v1 has a positive, a vehicle behind v1 a negative distance.
+        matrix = np.where(dx > 0, -distance, distance)
+    else:
+        matrix = None
+
+
+def __calc_distance(v1_position, v2_position):
+    distance = math.sqrt((v1_position[0] - v2_position[0]) ** 2 +
+                         (v1_position[1] - v2_position[1]) ** 2) - VEHICLE_LENGTH
+    if v1_position[0] > v2_position[0]:
+        return - distance
+    return distance
+
+
+def get_distance(v1, v2):
+    """
+    Returns the signed distance between two vehicles, removing the length.
+    """
+    if version != VehicleSnapshot.version:
+        __build()
+    i = index.get(v1)
+    j = index.get(v2)
+    if i is None or j is None:
+        # Vehicle is not part of the snapshot (yet).
+        return __calc_distance(VehicleSnapshot.get_position(v1), VehicleSnapshot.get_position(v2))
+    if matrix is None:
+        return __calc_distance(positions[i], positions[j])
+    return float(matrix[i, j])
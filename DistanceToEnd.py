@@ -0,0 +1,57 @@
+"""
+Step scoped cache for the distance to the end of the route.
+plexe.get_distance_to_end is requested at most once per car and simulation step. The cache is invalidated with every
+VehicleSnapshot update, i.e. right after traci.simulationStep(). The maximal distance to end of the members of a
+platoon is memoized per step as well.
+"""
+
+import VehicleSnapshot
+
+version = -1
+distances = {}
+platoon_maxima = {}
+
+
+# noinspection PyGlobalUndefined
+def registry(plexe_original):
+    global plexe
+    plexe = plexe_original
+    invalidate()
+
+
+def invalidate():
+    global version
+    version = VehicleSnapshot.version
+    distances.clear()
+    platoon_maxima.clear()
+
+
+def get(car):
+    """
+    Returns the distance to end of the car in this step.
+    """
+    if version != VehicleSnapshot.version:
+        invalidate()
+    distance = distances.get(car)
+    if distance is None:
+        distance = plexe.get_distance_to_end(car)
+        distances[car] = distance
+    return distance
+
+
+def get_max_of_members(members, exclude=None):
+    """
+    Returns the maximal distance to end of all members except the excluded car (at least 0).
+    The two largest values of a platoon are memoized, so excluding one member needs no new search.
+    """
+    if version != VehicleSnapshot.version:
+        invalidate()
+    key = tuple(members)
+    maxima = platoon_maxima.get(key)
+    if maxima is None:
+        maxima = sorted(((get(member), member) for member in members), reverse=True)[:2]
+        platoon_maxima[key] = maxima
+    for distance, member in maxima:
+        if member != exclude:
+            return max(distance, 0)
+    return 0
@@ -0,0 +1,129 @@
+"""
+Sparse, append-only monitoring output.
+Instead of a dense (time x car slot) matrix with -1 for missing cars, only existing cars are stored as records:
+
+    data/<seed>/<mode>/state_events.bin     (time, car, old state, new state) of every state transition
+    data/<seed>/<mode>/<metric>.records     (time, car, value) of every sampled car (MONITORING_SPARSE)
+
+State transitions are emitted by VehicleData at full step resolution, a car entering the simulation has the old
+state REMOVED, a car leaving it the new state REMOVED. The files are plain numpy record arrays, appended with tofile.
+The converters rebuild the dense view of the csv files for the plots. This module has no simulation dependencies.
+"""
+
+import os
+
+import numpy as np
+
+REMOVED = -1
+
+STATE_EVENT = np.dtype([("time", np.float64), ("car", np.int32), ("old", np.int8), ("new", np.int8)])
+RECORD = np.dtype([("time", np.float64), ("car", np.int32), ("value", np.float32)])
+
+STATE_EVENTS_FILE = "state_events.bin"
+RECORDS_SUFFIX = ".records"
+
+# Amount of state events kept in memory before they are appended to the file
+buffer_size = 10000
+
+time = 0.0
+events = []
+path = None
+
+
+def registry(directory, enabled=True):
+    """
+    Starts a new state event file in the directory of the simulation. Without registry no events are recorded.
+    """
+    global path
+    global events
+    events = []
+    path = None
+    if enabled:
+        path = os.path.join(directory, STATE_EVENTS_FILE)
+        open(path, 'wb').close()
+
+
+def set_time(step):
+    global time
+    time = float(step) / 100
+
+
+def state_changed(car, old, new):
+    """
+    Records the state transition of the car in the given slot.
+    """
+    if path is None or old == new:
+        return
+    events.append((time, car, old, new))
+    if len(events) >= buffer_size:
+        flush()
+
+
+def flush():
+    """
+    Appends all pending state events to the file.
+    """
+    global events
+    if path is not None and events:
+        with open(path, 'ab') as f:
+            np.array(events, dtype=STATE_EVENT).tofile(f)
+    events = []
+
+
+def write_records(filename, time_buffer, data):
+    """
+    Appends the existing cars (value != -1) of a dense monitoring buffer as records.
+    """
+    rows, cars = np.nonzero(data != -1)
+    records = np.empty(len(rows), dtype=RECORD)
+    records["time"] = time_buffer[rows]
+    records["car"] = cars
+    records["value"] = data[rows, cars]
+    with open(filename, 'ab') as f:
+        records.tofile(f)
+
+
+def read_state_events(directory):
+    return np.fromfile(os.path.join(directory, STATE_EVENTS_FILE), dtype=STATE_EVENT)
+
+
+def read_records(directory, metric):
+    return np.fromfile(os.path.join(directory, metric + RECORDS_SUFFIX), dtype=RECORD)
+
+
+def has_records(directory, metric):
+    return os.path.exists(os.path.join(directory, metric + RECORDS_SUFFIX))
+
+
+def records_to_dense(records, columns, times=None):
+    """
+    Returns the records in the layout of the monitoring csv files: one row per time, the time in the first column,
+    one column per car and -1 for missing cars.
+    @param times: times of the rows, by default all times with at least one record
+    """
+    if times is None:
+        times = np.unique(records["time"])
+    dense = np.full((len(times), columns + 1), -1, dtype=np.float64)
+    dense[:, 0] = times
+    rows = np.searchsorted(times, records["time"])
+    inside = (rows < len(times)) & (records["car"] < columns)
+    inside[inside] = times[rows[inside]] == records["time"][inside]
+    dense[rows[inside], records["car"][inside] + 1] = np.round(records["value"][inside].astype(np.float64), 2)
+    return dense
+
+
+def states_to_dense(state_events, columns, times):
+    """
+    Reconstructs the states of all cars at the given times, in the layout of the states csv file.
+    A transition at time t is already visible in the row of time t, like in the monitoring which samples after the
+    step. Cars which are not in the simulation are -1.
+    """
+    times = np.asarray(times, dtype=np.float64)
+    dense = np.full((len(times), columns + 1), -1, dtype=np.float64)
+    dense[:, 0] = times
+    # The events are in emission order, later events of a car overwrite the rows from their time on.
+    rows = np.searchsorted(times, state_events["time"], side='left')
+    for row, car, new in zip(rows.tolist(), state_events["car"].tolist(), state_events["new"].tolist()):
+        if car < columns:
+            dense[row:, car + 1] = new
+    return dense
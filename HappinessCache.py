@@ -0,0 +1,68 @@
+"""
+LRU cache for the happiness table of a car.
+The entries are kept in an OrderedDict from least to most recently used, so lookups, updates and evictions are O(1).
+Pinned entries (the own platoon leader) are never evicted.
+"""
+
+from collections import OrderedDict
+
+from CONSTANTS import HAPPINESS_TABLE_SIZE
+
+# Eviction statistics of all caches of the current simulation.
+statistics = {"inserts": 0, "updates": 0, "evictions": 0, "pinned_skips": 0}
+
+
+def reset_statistics():
+    for key in statistics:
+        statistics[key] = 0
+
+
+class HappinessCache(OrderedDict):
+    """
+    happiness_table =
+    {
+        #KEY  #Happiness     #N                #Param  #Param
+        v1 - (happiness(v1), times_chosen(v1), param1, param2)
+        v4 - (happiness(v4), times_chosen(v4), param1, param2)
+            .
+            .
+            .
+        v6 - (happiness(v6), times_chosen(v6), param1, param2)
+    }
+    """
+    def __init__(self, capacity=HAPPINESS_TABLE_SIZE):
+        OrderedDict.__init__(self)
+        self.capacity = capacity
+
+    def __move_to_end(self, key):
+        # OrderedDict.move_to_end is not available in Python 2, pop and insert is O(1) as well.
+        entry = OrderedDict.pop(self, key)
+        OrderedDict.__setitem__(self, key, entry)
+
+    def update_entry(self, candidate, new_happiness, param1=0, param2=0, pinned=None):
+        """
+        Stores a new happiness value for the candidate and marks it as most recently used.
+        If the cache exceeds its capacity, the least recently used entry, which is not pinned, is evicted.
+        Returns the evicted candidate or None.
+        """
+        if candidate in self:
+            times_chosen = self[candidate][1]
+            self.__move_to_end(candidate)
+            OrderedDict.__setitem__(self, candidate, (new_happiness, times_chosen + 1, param1, param2))
+            statistics["updates"] += 1
+            return None
+
+        OrderedDict.__setitem__(self, candidate, (new_happiness, 1, param1, param2))
+        statistics["inserts"] += 1
+        if len(self) <= self.capacity:
+            return None
+
+        evicted = next(iter(self))
+        if evicted == pinned:
+            # The pinned entry is the least recently used one. It is kept and counts as used now.
+            self.__move_to_end(pinned)
+            statistics["pinned_skips"] += 1
+            evicted = next(iter(self))
+        OrderedDict.pop(self, evicted)
+        statistics["evictions"] += 1
+        return evicted
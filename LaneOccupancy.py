@@ -0,0 +1,50 @@
+"""
+Per step occupancy of the lanes.
+The vehicles of every lane index are kept sorted by their x position, so the vehicles on a range of lanes within an
+x interval are found with two binary searches (bisect) per lane instead of a loop over all neighbors.
+The index is built from the VehicleSnapshot the first time it is queried in a step, like the DistanceMatrix.
+"""
+
+from bisect import bisect_left, bisect_right
+
+import VehicleSnapshot
+
+version = -1
+# lane index -> (sorted x positions, cars in the same order)
+lanes = {}
+
+
+def reset():
+    global version
+    global lanes
+    version = -1
+    lanes = {}
+
+
+def __build():
+    global version
+    global lanes
+    occupancy = {}
+    for car, lane, x in VehicleSnapshot.get_all_lane_positions():
+        occupancy.setdefault(lane, []).append((x, car))
+    lanes = {}
+    for lane, entries in occupancy.items():
+        entries.sort()
+        lanes[lane] = ([x for x, car in entries], [car for x, car in entries])
+    version = VehicleSnapshot.version
+
+
+def cars_between(first_lane, last_lane, x_lower, x_upper):
+    """
+    Returns all vehicles on the lanes first_lane to last_lane (both included) with x_lower <= x <= x_upper.
+    """
+    if version != VehicleSnapshot.version:
+        __build()
+    cars = []
+    for lane in range(first_lane, last_lane + 1):
+        occupancy = lanes.get(lane)
+        if occupancy is None:
+            continue
+        positions, lane_cars = occupancy
+        cars.extend(lane_cars[bisect_left(positions, x_lower):bisect_right(positions, x_upper)])
+    return cars
@@ -0,0 +1,527 @@
+"""
+Deterministic in-process stand-in for SUMO, TraCI and Plexe.
+The packages in localsim/ (traci, plexe, sumolib) implement the subset of the APIs used by this project on top of the
+World below, so the platooning logic runs unchanged without a SUMO installation. install() puts them in front of the
+SUMO tools on sys.path; PlatooningAPI and SweepRunner call it for LOCAL_SIMULATION or the --local argument.
+
+The World is a vectorized multi-lane kinematic model of the freeway routes of the sumo configuration:
+    - every car has a coordinate s along the freeway axis. On the mainline s is the x position, the ramps are unrolled
+      in front of / behind the mainline junctions they connect to.
+    - cars keep their lane. Only a fixed lane (plexe.set_fixed_lane) moves a car one lane per LANE_CHANGE_TIME
+      towards it, a safe change waits until the target lane is free.
+    - DRIVER cars drive with lane speed * speed factor, ACC / CACC cars with their cruise control speed. All cars
+      follow the car in front on their lane with a constant time headway.
+    - CACC cars with auto feed follow their front car at the path CACC distance, regardless of its lane.
+    - cars arrive at the end of their route and crash, if they overlap with the car in front.
+It is meant for benchmarks and development runs, not for results: there is no free lane changing and no junction
+model, all numbers are plain Euler steps of the step length of the configuration.
+"""
+
+import math
+import os
+import sys
+import xml.etree.ElementTree as ElementTree
+
+import numpy as np
+
+FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "localsim")
+
+# Kinematic model
+LANES = 4
+LANE_WIDTH = 3.2
+LANE_CHANGE_TIME = 1.5          # seconds per lane, half of --lanechange.duration
+MIN_GAP = 2.5                   # standstill gap of the headway controllers
+DRIVER_HEADWAY = 1.0            # seconds
+ACC_HEADWAY = 1.2               # seconds, default of plexe
+GAP_GAIN = 0.1                  # lambda of the headway controllers
+SPEED_TIME_CONSTANT = 2.0       # seconds to reach the desired speed without car in front
+CACC_DISTANCE = 5.0             # default distance of the path CACC
+CACC_GAP_GAIN = 0.45
+CACC_SPEED_GAIN = 1.2
+EMERGENCY_DECEL = 9.0
+COLLISION_STOP_TIME = 10.0      # crashed cars stop and are removed afterwards (collision.stoptime)
+DEFAULT_COLOR = (40, 84, 107, 255)
+
+# Controllers (plexe)
+DRIVER = 0
+ACC = 1
+CACC = 2
+FAKED_CACC = 3
+
+NO_SLOT = -1
+
+
+class TraCIException(Exception):
+    pass
+
+
+def install():
+    """
+    Makes the local backend the one imported as traci, plexe and sumolib. Has to be called before any of them is
+    imported. SUMO_HOME is only required by the import guards of the modules, a missing one is set to this folder.
+    """
+    if FOLDER not in sys.path:
+        sys.path.insert(0, FOLDER)
+    os.environ.setdefault('SUMO_HOME', FOLDER)
+
+
+def read_config(config_file):
+    """
+    Returns (net file, route files, step length) of a sumo configuration file.
+    """
+    root = ElementTree.parse(config_file).getroot()
+    folder = os.path.dirname(config_file)
+
+    def value(name, default=None):
+        element = root.find(".//" + name)
+        return default if element is None else element.get("value")
+
+    net_file = os.path.join(folder, value("net-file"))
+    route_files = [os.path.join(folder, name.strip()) for name in value("route-files").split(",")]
+    return net_file, route_files, float(value("step-length", "1"))
+
+
+class Route(object):
+    """
+    Edges of a route with their [start, end) intervals on the freeway axis.
+    """
+    def __init__(self, network, number, edges):
+        self.number = number
+        self.edges = list(edges)
+        mainline = [network.is_mainline(edge) for edge in self.edges]
+        first = mainline.index(True)
+        last = len(mainline) - 1 - mainline[::-1].index(True)
+        starts = [0.0] * len(self.edges)
+        ends = [0.0] * len(self.edges)
+        for i, edge in enumerate(self.edges):
+            if mainline[i]:
+                starts[i] = network.shapes[edge][0][0]
+                ends[i] = network.shapes[edge][-1][0]
+        # Ramps in front of the mainline end at its first edge, ramps behind it start at its last edge.
+        for i in range(first - 1, -1, -1):
+            ends[i] = starts[i + 1]
+            starts[i] = ends[i] - network.lengths[self.edges[i]]
+        for i in range(last + 1, len(self.edges)):
+            starts[i] = ends[i - 1]
+            ends[i] = starts[i] + network.lengths[self.edges[i]]
+        self.starts = np.array(starts)
+        self.ends = np.array(ends)
+        self.mainline = np.array(mainline)
+        self.speeds = np.array([network.speeds[edge] for edge in self.edges])
+        self.names = np.array(self.edges, dtype=object)
+        self.start = starts[0]
+        self.end = ends[-1]
+        # Ramp edges get their own track behind the lanes, so cars on ramps never follow mainline cars.
+        self.tracks = np.array([NO_SLOT if mainline[i] else LANES + network.ramp_number(edge)
+                                for i, edge in enumerate(self.edges)])
+
+    def edge_index(self, s):
+        return np.clip(np.searchsorted(self.starts, s, side='right') - 1, 0, len(self.edges) - 1)
+
+
+class Network(object):
+    """
+    Geometry of the freeway read from the net and route files. Edges starting with "E" are the mainline.
+    """
+    def __init__(self, net_file, route_files):
+        self.shapes = {}
+        self.lengths = {}
+        self.speeds = {}
+        for edge in ElementTree.parse(net_file).getroot().iter("edge"):
+            if edge.get("function") == "internal" or edge.get("id").startswith(":"):
+                continue
+            lane = edge.find("lane")
+            self.shapes[edge.get("id")] = [tuple(float(c) for c in point.split(","))
+                                           for point in lane.get("shape").split()]
+            self.lengths[edge.get("id")] = float(lane.get("length"))
+            self.speeds[edge.get("id")] = float(lane.get("speed"))
+        self.ramps = sorted(edge for edge in self.shapes if not self.is_mainline(edge))
+        self.lane_y = self.shapes[sorted(e for e in self.shapes if self.is_mainline(e))[0]][0][1]
+
+        self.routes = {}
+        self.route_list = []
+        self.vtypes = {}
+        for route_file in route_files:
+            root = ElementTree.parse(route_file).getroot()
+            for route in root.iter("route"):
+                if route.get("id") is not None:
+                    self.route_list.append(Route(self, len(self.route_list), route.get("edges").split()))
+                    self.routes[route.get("id")] = self.route_list[-1]
+            for vtype in root.iter("vType"):
+                self.vtypes[vtype.get("id")] = dict(vtype.attrib)
+
+    @staticmethod
+    def is_mainline(edge):
+        return edge.startswith("E")
+
+    def ramp_number(self, edge):
+        return self.ramps.index(edge)
+
+    def ramp_point(self, edge, offset):
+        """
+        Returns (x, y, angle) at the offset along the lane shape of a ramp edge.
+        """
+        shape = self.shapes[edge]
+        for (x1, y1), (x2, y2) in zip(shape[:-1], shape[1:]):
+            length = math.hypot(x2 - x1, y2 - y1)
+            angle = math.degrees(math.atan2(x2 - x1, y2 - y1)) % 360
+            if offset <= length or (x2, y2) == shape[-1]:
+                ratio = min(max(offset / length, 0.0), 1.0) if length > 0 else 0.0
+                return x1 + (x2 - x1) * ratio, y1 + (y2 - y1) * ratio, angle
+            offset -= length
+
+
+class World(object):
+    """
+    State of all cars in columns, indexed by slot. The slot of a car is fixed from add() until it leaves.
+    """
+    def __init__(self, network, step_length, capacity=256):
+        self.network = network
+        self.step_length = step_length
+        self.time = 0.0
+        self.version = 0
+        self.slots = {}
+        self.ids = [None] * capacity
+        self.free = list(range(capacity - 1, -1, -1))
+        self.colors = {}
+        self.subscriptions = {}
+        self.listeners = []
+        self.occupancy = None
+        self.occupancy_version = -1
+
+        self.active = np.zeros(capacity, dtype=bool)
+        self.s = np.zeros(capacity)
+        self.lane = np.zeros(capacity, dtype=np.int64)
+        self.speed = np.zeros(capacity)
+        self.acceleration = np.zeros(capacity)
+        self.max_speed = np.zeros(capacity)
+        self.speed_factor = np.ones(capacity)
+        self.max_accel = np.zeros(capacity)
+        self.decel = np.zeros(capacity)
+        self.length = np.zeros(capacity)
+        self.route_end = np.zeros(capacity)
+        self.speed_mode = np.zeros(capacity, dtype=np.int64)
+        self.controller = np.zeros(capacity, dtype=np.int64)
+        self.cc_speed = np.zeros(capacity)
+        self.acc_headway = np.zeros(capacity)
+        self.cacc_distance = np.zeros(capacity)
+        self.fixed_lane = np.zeros(capacity, dtype=np.int64)
+        self.fixed_safe = np.zeros(capacity, dtype=bool)
+        self.lane_change_timer = np.zeros(capacity)
+        self.auto_feed = np.zeros(capacity, dtype=bool)
+        self.feed_front = np.zeros(capacity, dtype=np.int64)
+        self.auto_lane_changing = np.zeros(capacity, dtype=bool)
+        self.crashed = np.zeros(capacity, dtype=bool)
+        self.crash_time = np.zeros(capacity)
+        self.route = np.zeros(capacity, dtype=np.int64)
+        self.edge = np.zeros(capacity, dtype=np.int64)
+        self.track = np.zeros(capacity, dtype=np.int64)
+        self.edge_speed = np.zeros(capacity)
+        self.road = np.zeros(capacity, dtype=object)
+
+    COLUMNS = ("active", "s", "lane", "speed", "acceleration", "max_speed", "speed_factor", "max_accel", "decel", "length",
+               "route_end", "speed_mode", "controller", "cc_speed", "acc_headway", "cacc_distance", "fixed_lane",
+               "fixed_safe", "lane_change_timer", "auto_feed", "feed_front", "auto_lane_changing", "crashed",
+               "crash_time", "route", "edge", "track", "edge_speed", "road")
+
+    def grow(self):
+        capacity = len(self.ids)
+        for name in self.COLUMNS:
+            column = getattr(self, name)
+            setattr(self, name, np.concatenate([column, np.zeros(capacity, dtype=column.dtype)]))
+        self.ids.extend([None] * capacity)
+        self.free = list(range(2 * capacity - 1, capacity - 1, -1)) + self.free
+
+    def slot(self, car):
+        try:
+            return self.slots[car]
+        except KeyError:
+            raise TraCIException("Vehicle '%s' is not known" % car)
+
+    """ ############################################################################
+                                    Vehicles
+    ############################################################################ """
+
+    def add(self, car, route_id, depart_pos=0.0, depart_lane=0, depart_speed=0.0, type_id="DEFAULT_VEHTYPE"):
+        if car in self.slots:
+            raise TraCIException("The vehicle '%s' to add already exists" % car)
+        if not self.free:
+            self.grow()
+        slot = self.free.pop()
+        try:
+            route = self.network.routes[route_id]
+        except KeyError:
+            raise TraCIException("Invalid route '%s'" % route_id)
+        vtype = self.network.vtypes.get(type_id, {})
+        self.slots[car] = slot
+        self.ids[slot] = car
+        self.route[slot] = route.number
+        self.active[slot] = True
+        self.s[slot] = route.start + float(depart_pos)
+        self.lane[slot] = min(max(int(depart_lane), 0), LANES - 1) if route.mainline[0] else 0
+        self.max_speed[slot] = float(vtype.get("maxSpeed", 55.55))
+        self.speed[slot] = min(float(depart_speed), self.max_speed[slot])
+        self.acceleration[slot] = 0
+        self.speed_factor[slot] = float(vtype.get("speedFactor", 1.0))
+        self.max_accel[slot] = float(vtype.get("accel", 2.6))
+        self.decel[slot] = float(vtype.get("decel", 4.5))
+        self.length[slot] = float(vtype.get("length", 5.0))
+        self.route_end[slot] = route.end
+        self.speed_mode[slot] = 31
+        self.controller[slot] = DRIVER
+        self.cc_speed[slot] = self.speed[slot]
+        self.acc_headway[slot] = ACC_HEADWAY
+        self.cacc_distance[slot] = CACC_DISTANCE
+        self.fixed_lane[slot] = NO_SLOT
+        self.fixed_safe[slot] = True
+        self.lane_change_timer[slot] = LANE_CHANGE_TIME
+        self.auto_feed[slot] = False
+        self.feed_front[slot] = NO_SLOT
+        self.auto_lane_changing[slot] = False
+        self.crashed[slot] = False
+        self.colors[car] = DEFAULT_COLOR
+        self.locate(np.array([slot]))
+
+    def remove(self, car):
+        slot = self.slot(car)
+        self.release(np.array([slot]))
+
+    def release(self, slots):
+        if len(slots) == 0:
+            return
+        self.active[slots] = False
+        # Auto feed of a removed car stops, like plexe without data of its front car.
+        self.feed_front[np.isin(self.feed_front, slots)] = NO_SLOT
+        for slot in slots.tolist():
+            car = self.ids[slot]
+            del self.slots[car]
+            self.subscriptions.pop(car, None)
+            self.colors.pop(car, None)
+            self.ids[slot] = None
+            self.free.append(slot)
+
+    def id_list(self):
+        return [self.ids[slot] for slot in np.flatnonzero(self.active).tolist()]
+
+    def locate(self, slots):
+        """
+        Updates edge and track of the cars. Cars on the mainline are on the track of their lane.
+        """
+        routes = self.route[slots]
+        for number in np.unique(routes).tolist():
+            route = self.network.route_list[number]
+            members = slots[routes == number]
+            edge = route.edge_index(self.s[members])
+            self.edge[members] = edge
+            self.track[members] = np.where(route.mainline[edge], self.lane[members], route.tracks[edge])
+            self.edge_speed[members] = route.speeds[edge]
+            self.road[members] = route.names[edge]
+
+    """ ############################################################################
+                                    Simulation step
+    ############################################################################ """
+
+    def front_cars(self, slots):
+        """
+        Returns the slot of the car in front on the same track for every slot (NO_SLOT if there is none).
+        """
+        order = slots[np.lexsort((self.s[slots], self.track[slots]))]
+        front = np.full(len(self.ids), NO_SLOT, dtype=np.int64)
+        same_track = self.track[order[:-1]] == self.track[order[1:]]
+        front[order[:-1][same_track]] = order[1:][same_track]
+        return front[slots]
+
+    def step(self):
+        dt = self.step_length
+        slots = np.flatnonzero(self.active)
+        if len(slots):
+            self.move(slots, dt)
+            self.change_lanes(slots, dt)
+            self.locate(slots)
+            self.collide(slots)
+        self.time += dt
+        self.version += 1
+
+    def move(self, slots, dt):
+        speed = self.speed[slots]
+        front = self.front_cars(slots)
+        has_front = front != NO_SLOT
+        gap = np.full(len(slots), np.inf)
+        front_speed = speed.copy()
+        gap[has_front] = self.s[front[has_front]] - self.length[front[has_front]] - self.s[slots][has_front]
+        front_speed[has_front] = self.speed[front[has_front]]
+
+        driver = self.controller[slots] == DRIVER
+        desired = np.where(driver, np.minimum(self.edge_speed[slots] * self.speed_factor[slots], self.max_speed[slots]),
+                           self.cc_speed[slots])
+        headway = np.where(driver, DRIVER_HEADWAY, self.acc_headway[slots])
+
+        acceleration = (desired - speed) / SPEED_TIME_CONSTANT
+        following = (front_speed - speed + GAP_GAIN * (gap - MIN_GAP - headway * speed)) / headway
+        acceleration = np.where(has_front, np.minimum(acceleration, following), acceleration)
+
+        # Path CACC: the auto fed cars follow their front car, wherever it is.
+        feed = self.feed_front[slots]
+        fed = self.auto_feed[slots] & (feed != NO_SLOT) & np.isin(self.controller[slots], (CACC, FAKED_CACC))
+        if fed.any():
+            fed_front = feed[fed]
+            fed_gap = self.s[fed_front] - self.length[fed_front] - self.s[slots][fed]
+            acceleration[fed] = self.acceleration[fed_front] + CACC_GAP_GAIN * (fed_gap - self.cacc_distance[slots][fed]) \
+                + CACC_SPEED_GAIN * (self.speed[fed_front] - speed[fed])
+
+        acceleration = np.clip(acceleration, -EMERGENCY_DECEL, self.max_accel[slots])
+        acceleration[self.crashed[slots]] = -EMERGENCY_DECEL
+        new_speed = np.clip(speed + acceleration * dt, 0, self.max_speed[slots])
+        # Speed mode with safe speed (bit 0): never drive into the car in front within one step. The limit depends on
+        # the new speed of the car in front, which may be limited itself, so it is applied until nothing changes.
+        safe = np.flatnonzero((self.speed_mode[slots] & 1).astype(bool) & has_front)
+        position = np.full(len(self.ids), NO_SLOT, dtype=np.int64)
+        position[slots] = np.arange(len(slots))
+        front_index = position[front[safe]]
+        for _ in range(len(safe)):
+            limit = np.maximum(new_speed[front_index] + gap[safe] / dt, 0)
+            limited = new_speed[safe] > limit
+            if not limited.any():
+                break
+            new_speed[safe[limited]] = limit[limited]
+
+        self.acceleration[slots] = (new_speed - speed) / dt
+        self.speed[slots] = new_speed
+        self.s[slots] += new_speed * dt
+
+    def change_lanes(self, slots, dt):
+        self.lane_change_timer[slots] += dt
+        target = self.fixed_lane[slots]
+        pending = (target != NO_SLOT) & (target != self.lane[slots]) & (self.track[slots] < LANES) \
+            & (self.lane_change_timer[slots] >= LANE_CHANGE_TIME)
+        for slot in slots[pending].tolist():
+            direction = 1 if self.fixed_lane[slot] > self.lane[slot] else -1
+            if self.fixed_safe[slot] and (self.neighbors(slot, direction, True, True)
+                                          or self.neighbors(slot, direction, False, True)):
+                continue
+            self.lane[slot] += direction
+            self.track[slot] = self.lane[slot]
+            self.lane_change_timer[slot] = 0
+
+    def collide(self, slots):
+        front = self.front_cars(slots)
+        has_front = front != NO_SLOT
+        overlap = np.zeros(len(slots), dtype=bool)
+        overlap[has_front] = self.s[front[has_front]] - self.length[front[has_front]] < self.s[slots][has_front]
+        new = slots[overlap & ~self.crashed[slots]]
+        self.crashed[new] = True
+        self.crash_time[new] = self.time
+        arrived = self.s[slots] >= self.route_end[slots]
+        expired = self.crashed[slots] & (self.time - self.crash_time[slots] >= COLLISION_STOP_TIME)
+        self.release(slots[arrived | expired])
+
+    """ ############################################################################
+                                    Queries
+    ############################################################################ """
+
+    def lanes(self):
+        """
+        Per step index of the mainline: lane -> (sorted s, slots).
+        """
+        if self.occupancy_version != self.version:
+            slots = np.flatnonzero(self.active)
+            slots = slots[self.track[slots] < LANES]
+            order = slots[np.lexsort((self.s[slots], self.lane[slots]))]
+            self.occupancy = {}
+            for lane in range(LANES):
+                on_lane = order[self.lane[order] == lane]
+                self.occupancy[lane] = (self.s[on_lane], on_lane)
+            self.occupancy_version = self.version
+        return self.occupancy
+
+    def neighbors(self, slot, direction, leaders, blocking):
+        """
+        Returns [(car, gap)] of the nearest leader or follower on the lane left (1) or right (-1) of the car.
+        Blocking neighbors are closer than the gap the car or its follower needs to brake to the speed in front.
+        """
+        lane = self.lane[slot] + direction
+        if self.track[slot] >= LANES or not 0 <= lane < LANES:
+            return []
+        positions, cars = self.lanes()[lane]
+        index = np.searchsorted(positions, self.s[slot], side='left')
+        if leaders:
+            while index < len(cars) and cars[index] == slot:
+                index += 1
+            if index >= len(cars):
+                return []
+            other = cars[index]
+            gap = self.s[other] - self.length[other] - self.s[slot]
+            follower_speed, leader_speed = self.speed[slot], self.speed[other]
+        else:
+            index -= 1
+            if index < 0:
+                return []
+            other = cars[index]
+            gap = self.s[slot] - self.length[slot] - self.s[other]
+            follower_speed, leader_speed = self.speed[other], self.speed[slot]
+        if blocking and gap >= MIN_GAP + max(follower_speed ** 2 - leader_speed ** 2, 0) / (2 * self.decel[slot]):
+            return []
+        return [(self.ids[other], float(gap))]
+
+    def distance_to_end(self, car):
+        slot = self.slot(car)
+        return float(self.route_end[slot] - self.s[slot])
+
+    def road_id(self, car):
+        slot = self.slot(car)
+        return self.road[slot]
+
+    def position(self, car):
+        return self.point(self.slot(car))[:2]
+
+    def angle(self, car):
+        return self.point(self.slot(car))[2]
+
+    def point(self, slot):
+        route = self.network.route_list[self.route[slot]]
+        edge = self.edge[slot]
+        if route.mainline[edge]:
+            return float(self.s[slot]), self.network.lane_y + LANE_WIDTH * int(self.lane[slot]), 90.0
+        return self.network.ramp_point(route.edges[edge], self.s[slot] - route.starts[edge])
+
+    def snapshot(self, slots):
+        """
+        Returns the variables of the cars as lists: speed, max_speed, speed_factor, lane, position (x, y), angle, road.
+        The mainline positions are computed at once, cars on ramps one by one.
+        """
+        x = self.s[slots].copy()
+        y = self.network.lane_y + LANE_WIDTH * self.lane[slots]
+        angle = np.full(len(slots), 90.0)
+        for i in np.flatnonzero(self.track[slots] >= LANES).tolist():
+            x[i], y[i], angle[i] = self.point(slots[i])
+        return {"speed": self.speed[slots].tolist(),
+                "max_speed": self.max_speed[slots].tolist(),
+                "speed_factor": self.speed_factor[slots].tolist(),
+                "lane": self.lane[slots].tolist(),
+                "position": list(zip(x.tolist(), y.tolist())),
+                "angle": angle.tolist(),
+                "road": self.road[slots].tolist()}
+
+
+world = None
+
+
+def start(config_file):
+    """
+    Starts a new simulation of the sumo configuration file.
+    """
+    global world
+    net_file, route_files, step_length = read_config(config_file)
+    world = World(Network(net_file, route_files), step_length)
+    return world
+
+
+def close():
+    global world
+    world = None
+
+
+def get_world():
+    if world is None:
+        raise TraCIException("Not connected.")
+    return world
@@ -0,0 +1,103 @@
+"""
+Shared loader of the monitoring metrics for the analysis scripts (Printer.py, Boxplots_Overall.py).
+Each metric of a run is parsed only once: the parsed matrix is kept in memory for the current process and saved as
+.npy next to the data (data/<seed>/<mode>/cache/<metric>.npy), so later processes load it without parsing.
+A cache entry is valid as long as it is not older than the monitoring files it was built from.
+"""
+
+import csv
+import os
+
+import numpy as np
+
+import MetricStore
+import EventLog
+from CONSTANTS import AMOUNT_RANDOM_CARS
+
+CACHE_FOLDER = "cache"
+
+# (directory, metric) -> (mtime of the sources, matrix)
+memory = {}
+
+
+def sources(directory, metric):
+    """
+    Returns the files the metric is read from, in the order of preference: binary chunks, sparse records, csv file.
+    """
+    chunks = MetricStore.chunks(directory, metric)
+    if chunks:
+        return chunks
+    if EventLog.has_records(directory, metric):
+        return [os.path.join(directory, metric + EventLog.RECORDS_SUFFIX)]
+    return [os.path.join(directory, metric + ".csv")]
+
+
+def exists(directory, metric):
+    """
+    Metrics disabled in MONITORING_METRICS have no files.
+    """
+    return all(os.path.exists(source) for source in sources(directory, metric))
+
+
+def parse_csv(path):
+    """
+    Parses a monitoring csv file (two header lines, then one row of numbers per time step) with numpy's C parser.
+    Files which are not purely numeric (e.g. with several sessions) fall back to the csv module.
+    """
+    with open(path, 'r') as f:
+        f.readline()
+        header = f.readline()
+        text = f.read()
+    columns = len(header.split(","))
+    values = np.fromstring(text.replace("\r", "").replace("\n", ",").rstrip(","), dtype=np.float64, sep=",")
+    if text and len(values) % columns == 0 and len(values) // columns == text.count("\n"):
+        return values.reshape(-1, columns)
+    with open(path, 'r') as f:
+        array = list(csv.reader(f, delimiter=","))
+        return np.array(array[2:], dtype=np.float64)
+
+
+def parse(directory, metric):
+    if MetricStore.exists(directory, metric):
+        return MetricStore.read(directory, metric)
+    if EventLog.has_records(directory, metric):
+        return EventLog.records_to_dense(EventLog.read_records(directory, metric), AMOUNT_RANDOM_CARS)
+    return parse_csv(os.path.join(directory, metric + ".csv"))
+
+
+def load(directory, metric):
+    """
+    Returns the metric as (time steps x (1 + cars)) matrix with the time in the first column.
+    The matrix is shared between all callers and therefore read-only.
+    """
+    mtime = max(os.path.getmtime(source) for source in sources(directory, metric))
+    key = (directory, metric)
+    if key in memory and memory[key][0] == mtime:
+        return memory[key][1]
+
+    cache = os.path.join(directory, CACHE_FOLDER, metric + ".npy")
+    if os.path.exists(cache) and os.path.getmtime(cache) >= mtime:
+        array = np.load(cache)
+    else:
+        array = parse(directory, metric)
+        if not os.path.exists(os.path.dirname(cache)):
+            try:
+                os.makedirs(os.path.dirname(cache))
+            except OSError:
+                # Created by a parallel process in the meantime
+                pass
+        # Renaming is atomic, parallel processes never load a partially written cache file.
+        temporary = cache[:-len(".npy")] + ".%d.tmp.npy" % os.getpid()
+        np.save(temporary, array)
+        os.rename(temporary, cache)
+    array.flags.writeable = False
+    memory[key] = (mtime, array)
+    return array
+
+
+def load_file(path):
+    """
+    Like load(), with the path of the csv file of the metric (e.g. data/4/__ucb1/happiness.csv).
+    """
+    directory, filename = os.path.split(path)
+    return load(directory, os.path.splitext(filename)[0])
@@ -0,0 +1,81 @@
+"""
+Columnar binary storage of the monitoring data.
+Every flush of a monitoring ring buffer is saved as one .npz chunk of its metric:
+
+    data/<seed>/<mode>/npy/speed.00000.npz      time: time stamps (in seconds) of the rows
+                                                data: (rows x cars) matrix of the metric
+    ...
+
+The chunks are written in the dtype of the buffer (float32, int8, ...) and loaded without any text parsing. Each
+metric has its own time stamps, as the metrics can be sampled with different intervals.
+This module has no simulation dependencies, so the analysis scripts (Printer.py) can use the reader as well.
+"""
+
+import glob
+import os
+
+import numpy as np
+
+FOLDER = "npy"
+
+
+def folder(directory):
+    return os.path.join(directory, FOLDER)
+
+
+def chunks(directory, metric):
+    """
+    Returns the chunk files of a metric, ordered by their chunk number.
+    """
+    return sorted(glob.glob(os.path.join(folder(directory), metric + ".*.npz")))
+
+
+def exists(directory, metric):
+    return len(chunks(directory, metric)) > 0
+
+
+def clear(directory, metrics):
+    """
+    Removes the chunks of a former run and creates the folder if necessary.
+    """
+    path = folder(directory)
+    if not os.path.exists(path):
+        os.makedirs(path)
+    for metric in metrics:
+        for chunk in chunks(directory, metric):
+            os.remove(chunk)
+
+
+def write_chunk(directory, metric, number, time, data):
+    """
+    Saves one chunk of a metric.
+    @param number: consecutive number of the chunk
+    @param time: time stamps of the rows
+    @param data: (rows x cars) array
+    """
+    np.savez(os.path.join(folder(directory), metric + ".%05d.npz" % number), time=time, data=data)
+
+
+def read_raw(directory, metric):
+    """
+    Returns (time, data) of a metric. data keeps the dtype it was written with.
+    """
+    time = []
+    data = []
+    for chunk in chunks(directory, metric):
+        with np.load(chunk) as content:
+            time.append(content["time"])
+            data.append(content["data"])
+    return np.concatenate(time), np.concatenate(data)
+
+
+def read(directory, metric):
+    """
+    Returns the metric in the layout of the monitoring csv files: one row per time step, the time in the first column
+    and one column per car.
+    """
+    time, data = read_raw(directory, metric)
+    if data.dtype.kind == 'f':
+        # The monitoring rounds all float metrics to two decimals, this removes the float32 representation error.
+        return np.column_stack([time, np.round(data.astype(np.float64), 2)])
+    return np.column_stack([time, data.astype(np.float64)])
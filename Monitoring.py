@@ -1,31 +1,105 @@
+import atexit
 import csv
 from datetime import datetime
 import os
 from math import floor
+import Queue
+
+import numpy as np
 
 import Globals
 from CONSTANTS import *
 import PlatooningAlgorithms
+import VehicleStore
+import HappinessCache
+import MetricStore
+import EventLog
+import RunIndex
+from MonitoringWriter import MonitoringWriter
 
 buffer_size = 100
 
-desired_platoon_speed = [[-1 for i in xrange(AMOUNT_RANDOM_CARS + 1)] for i in xrange(buffer_size)]
-desired_speed = [[-1 for i in xrange(AMOUNT_RANDOM_CARS + 1)] for i in xrange(buffer_size)]
-speed = [[-1 for i in xrange(AMOUNT_RANDOM_CARS + 1)] for i in xrange(buffer_size)]
-speed_factor = [[-1 for i in xrange(AMOUNT_RANDOM_CARS + 1)] for i in xrange(buffer_size)]
-platoon_size = [[-1 for i in xrange(AMOUNT_RANDOM_CARS + 1)] for i in xrange(buffer_size)]
-
-happiness = [[-1 for i in xrange(AMOUNT_RANDOM_CARS + 1)] for i in xrange(buffer_size)]
-speed_happiness = [[-1 for i in xrange(AMOUNT_RANDOM_CARS + 1)] for i in xrange(buffer_size)]
-platoon_size_happiness = [[-1 for i in xrange(AMOUNT_RANDOM_CARS + 1)] for i in xrange(buffer_size)]
-distance_to_end_happiness = [[-1 for i in xrange(AMOUNT_RANDOM_CARS + 1)] for i in xrange(buffer_size)]
-distance_in_between_happiness = [[-1 for i in xrange(AMOUNT_RANDOM_CARS + 1)] for i in xrange(buffer_size)]
-
-happiness_table = [[-1 for i in xrange(2 * HAPPINESS_TABLE_SIZE + 2)] for i in xrange(buffer_size)]
-
-neighborhood = [[-1 for i in xrange(AMOUNT_RANDOM_CARS + 1)] for i in xrange(buffer_size)]
-candidatehood = [[-1 for i in xrange(AMOUNT_RANDOM_CARS + 1)] for i in xrange(buffer_size)]
-states = [[-1 for i in xrange(AMOUNT_RANDOM_CARS + 1)] for i in xrange(buffer_size)]
+# All metrics with the dtype and the amount of columns of their buffers.
+METRICS = (("desired_platoon_speed", np.float32, AMOUNT_RANDOM_CARS),
+           ("desired_speed", np.float32, AMOUNT_RANDOM_CARS),
+           ("speed", np.float32, AMOUNT_RANDOM_CARS),
+           ("speed_factor", np.float32, AMOUNT_RANDOM_CARS),
+           ("platoon_size", np.int32, AMOUNT_RANDOM_CARS),
+           ("happiness", np.float32, AMOUNT_RANDOM_CARS),
+           ("speed_happiness", np.float32, AMOUNT_RANDOM_CARS),
+           ("platoon_size_happiness", np.float32, AMOUNT_RANDOM_CARS),
+           ("distance_to_end_happiness", np.float32, AMOUNT_RANDOM_CARS),
+           ("distance_in_between_happiness", np.float32, AMOUNT_RANDOM_CARS),
+           # The happiness table of a single car mixes ids and values, it is always written as csv file.
+           ("happiness_table", object, 2 * HAPPINESS_TABLE_SIZE + 1),
+           ("neighborhood", np.int16, AMOUNT_RANDOM_CARS),
+           ("candidatehood", np.int16, AMOUNT_RANDOM_CARS),
+           ("states", np.int8, AMOUNT_RANDOM_CARS))
+
+HAPPINESS_METRICS = ("happiness", "speed_happiness", "platoon_size_happiness", "distance_to_end_happiness",
+                     "distance_in_between_happiness")
+# Metrics skipped by MONITORING_CHEAP
+HAPPINESS_DECOMPOSITION = HAPPINESS_METRICS[1:] + ("happiness_table",)
+
+
+def interval_of(name):
+    """
+    Returns the sampling interval of a metric as a multiple of MONITORING_INTERVAL, 0 if it is disabled.
+    """
+    if MONITORING_CHEAP and name in HAPPINESS_DECOMPOSITION:
+        return 0
+    return MONITORING_METRICS.get(name, 0)
+
+
+class MetricBuffer:
+    """
+    Ring buffer of a single metric, one row per sample and one column per car. The time of each row is kept in an
+    own buffer. While a full buffer is written by the writer thread, the samples go into a second one.
+    """
+    def __init__(self, name, dtype, columns, interval):
+        self.name = name
+        self.interval = interval
+        self.free = Queue.Queue()
+        self.free.put(self.__new_buffer(dtype, columns))
+        self.data, self.time = self.__new_buffer(dtype, columns)
+        self.row = 0
+        self.chunk = 0
+
+    @staticmethod
+    def __new_buffer(dtype, columns):
+        return np.full((buffer_size, columns), -1, dtype=dtype), np.zeros(buffer_size)
+
+    def due(self, observation):
+        return observation % self.interval == 0
+
+    def begin(self, time):
+        """
+        Starts a new sample and returns its row. All cars are initialized with -1 (no car).
+        """
+        self.time[self.row] = time
+        row = self.data[self.row]
+        row[:] = -1
+        return row
+
+    def commit(self):
+        """
+        Finishes the current sample. A full buffer is handed over to the writer thread and swapped with the free one,
+        which only waits if the writer has not finished the previous flush of this metric yet.
+        """
+        self.row += 1
+        if self.row < buffer_size:
+            return
+        full = self.data, self.time
+        writer.submit(write_buffer, (directory, self.name, self.chunk) + full, done=lambda: self.free.put(full))
+        self.chunk += 1
+        self.data, self.time = self.free.get()
+        self.row = 0
+
+
+buffers = {}
+writer = None
+# Number of observe() calls of the current simulation
+observation = 0
 
 directory = ''
 
@@ -33,38 +107,37 @@ directory = ''
 def registry(vehicle_infos_original):
     global vehicleInfos
     global directory
+    global buffers
+    global observation
+    global writer
     vehicleInfos = vehicle_infos_original
+    # Pending flushes of the previous simulation
+    drain()
 
-    if Globals.mode == E_GREEDY:
-        mode = '/__e_greedy'
-    elif Globals.mode == UCB1:
-        mode = '/__ucb1'
-    elif Globals.mode == BAYES_UCB:
-        mode = '/__bayes_ucb'
-    elif Globals.mode == THOMPSON_SAMPLING:
-        mode = '/__thompson_sampling'
-    elif Globals.mode == HEINOVSKI:
-        mode = '/__heinovski'
-
-    directory = 'data/' + str(Globals.seed) + mode
+    directory = 'data/' + str(Globals.seed) + '/' + RunIndex.ALGORITHMS[Globals.mode]
     if not os.path.exists(directory):
         os.makedirs(directory)
     print("Path now is: " + directory)
 
-    writeHeader(directory + '/desired_platoon_speed.csv')
-    writeHeader(directory + '/desired_speed.csv')
-    writeHeader(directory + '/speed.csv')
-    writeHeader(directory + '/speed_factor.csv')
-    writeHeader(directory + '/platoon_size.csv')
-    writeHeader(directory + '/happiness.csv')
-    writeHeader(directory + '/speed_happiness.csv')
-    writeHeader(directory + '/platoon_size_happiness.csv')
-    writeHeader(directory + '/distance_to_end_happiness.csv')
-    writeHeader(directory + '/distance_in_between_happiness.csv')
-    writeHeader(directory + '/happiness_table.csv', nocars=True)
-    writeHeader(directory + '/neighborhood.csv')
-    writeHeader(directory + '/candidatehood.csv')
-    writeHeader(directory + '/states.csv')
+    # Disabled metrics get no buffer and no output file.
+    buffers = dict((name, MetricBuffer(name, dtype, columns, interval_of(name)))
+                   for name, dtype, columns in METRICS if interval_of(name) > 0)
+    observation = 0
+    EventLog.registry(directory, MONITORING_STATE_EVENTS)
+    if MONITORING_BINARY and not MONITORING_SPARSE:
+        MetricStore.clear(directory, [name for name in buffers if name != "happiness_table"])
+    for name in buffers:
+        if name == "happiness_table":
+            writeHeader(directory + '/happiness_table.csv', nocars=True)
+        elif MONITORING_SPARSE:
+            open(directory + '/' + name + EventLog.RECORDS_SUFFIX, 'wb').close()
+        elif not MONITORING_BINARY:
+            writeHeader(directory + '/' + name + '.csv')
+
+    # Every metric has at most one flush pending (see MetricBuffer.commit), so buffers filling in the same observation
+    # never wait for each other.
+    writer = MonitoringWriter(queue_size=len(buffers))
+    writer.start()
 
 
 def writeHeader(filename, nocars=False):
@@ -85,146 +158,157 @@ def writeToCSV(array, filename):
             writer.writerow(array[:][i])
 
 
+def buffer_to_rows(array, time_buffer):
+    """
+    Converts a ring buffer into the rows of a csv file, with the time in the first column.
+    """
+    if array.dtype.kind == 'f':
+        # Back to float64 before rounding, so 0.7 is written as 0.7 and not as its float32 representation.
+        array = np.round(array.astype(np.float64), 2)
+    return [[time_buffer[i]] + row for i, row in enumerate(array.tolist())]
+
+
+def write_buffer(directory, name, chunk, data, time_buffer):
+    """
+    Writes a full ring buffer as sparse records, as binary chunk or appends it to the csv file.
+    Runs in the writer thread.
+    """
+    if MONITORING_SPARSE and name != "happiness_table":
+        EventLog.write_records(directory + '/' + name + EventLog.RECORDS_SUFFIX, time_buffer, data)
+    elif MONITORING_BINARY and name != "happiness_table":
+        MetricStore.write_chunk(directory, name, chunk, time_buffer, data)
+    else:
+        writeToCSV(buffer_to_rows(data, time_buffer), directory + '/' + name + '.csv')
+
+
+def drain():
+    """
+    Waits until all flushes are written. Called at the end of every simulation (write_info) and on exit.
+    """
+    global writer
+    if writer is not None:
+        active_writer = writer
+        writer = None
+        active_writer.drain()
+
+
+atexit.register(drain)
+
+
 def observe(steps):
-    time = (steps / 50) % buffer_size
+    """
+    Samples all metrics which are due. Has to be called every MONITORING_INTERVAL steps.
+    """
+    global observation
+    due = [buffer for buffer in buffers.values() if buffer.due(observation)]
+    observation += 1
+    if not due:
+        return
     #Writes the current timestep into the buffer
-    desired_platoon_speed[time][0] = float(steps) / 100
-    desired_speed[time][0] = float(steps) / 100
-    speed[time][0] = float(steps) / 100
-    speed_factor[time][0] = float(steps) / 100
-    platoon_size[time][0] = float(steps) / 100
-    happiness[time][0] = float(steps) / 100
-    speed_happiness[time][0] = float(steps) / 100
-    platoon_size_happiness[time][0] = float(steps) / 100
-    distance_to_end_happiness[time][0] = float(steps) / 100
-    distance_in_between_happiness[time][0] = float(steps) / 100
-    happiness_table[time][0] = float(steps) / 100
-    neighborhood[time][0] = float(steps) / 100
-    candidatehood[time][0] = float(steps) / 100
-    states[time][0] = float(steps) / 100
-
-    for car_id in range(0, AMOUNT_RANDOM_CARS):  # type: int
-        vehicle = "v." + str(car_id)
+    rows = dict((buffer.name, buffer.begin(float(steps) / 100)) for buffer in due)
+    desired_platoon_speed = rows.get("desired_platoon_speed")
+    desired_speed = rows.get("desired_speed")
+    speed = rows.get("speed")
+    speed_factor = rows.get("speed_factor")
+    happiness_table = rows.get("happiness_table")
+    neighborhood = rows.get("neighborhood")
+    candidatehood = rows.get("candidatehood")
+    happiness_rows = [rows.get(name) for name in HAPPINESS_METRICS]
+    with_happiness = any(row is not None for row in happiness_rows)
+
+    """ ############################################################################
+                                Platoon Size and States
+    ############################################################################ """
+    # Both are read column wise from the VehicleStore for all car slots at once. Missing cars are encoded with -1.
+    store = VehicleStore.store
+    if "platoon_size" in rows:
+        rows["platoon_size"][:] = store.platoon_size_code()[:AMOUNT_RANDOM_CARS]
+    if "states" in rows:
+        rows["states"][:] = np.where(store.active, store.state, -1)[:AMOUNT_RANDOM_CARS]
+
+    # All other metrics are only calculated for existing cars.
+    if any(name not in ("platoon_size", "states") for name in rows):
+        car_ids = [car_id for car_id in store.active_slots().tolist()
+                   if car_id < AMOUNT_RANDOM_CARS and store.ids[car_id] in vehicleInfos]
+    else:
+        car_ids = []
+    vehicles = [store.ids[car_id] for car_id in car_ids]
+
+    # Happiness of every car to its own leader, calculated in one batch.
+    if with_happiness:
+        happiness_values = [array.tolist() for array in PlatooningAlgorithms.calc_happiness_batch(
+            [(vehicle, vehicleInfos[vehicle].get_platoon_leader()) for vehicle in vehicles])]
+
+    for i in range(len(car_ids)):
+        car_id = car_ids[i]
+        vehicle = vehicles[i]
         if vehicle in vehicleInfos:
 
             """ ############################################################################
                                                 Speed
             ############################################################################ """
-            desired_platoon_speed[time][car_id + 1] = round(vehicleInfos[vehicle].get_desired_platoon_speed(), 2)
-            desired_speed[time][car_id + 1] = round(vehicleInfos[vehicle].get_desired_speed(), 2)
-
-            speed_factor[time][car_id + 1] = round(vehicleInfos[vehicle].get_current_speed_factor(), 2)
+            if desired_platoon_speed is not None:
+                desired_platoon_speed[car_id] = round(vehicleInfos[vehicle].get_desired_platoon_speed(), 2)
+            if desired_speed is not None:
+                desired_speed[car_id] = round(vehicleInfos[vehicle].get_desired_speed(), 2)
 
-            speed_value = round(vehicleInfos[vehicle].get_speed(), 2)
-            if speed_value < 0:
-                speed_value = round(vehicleInfos[vehicle].get_desired_speed(), 2)
-            speed[time][car_id + 1] = speed_value
+            if speed_factor is not None:
+                speed_factor[car_id] = round(vehicleInfos[vehicle].get_current_speed_factor(), 2)
 
-            """ ############################################################################
-                                                Platoon Size
-            ############################################################################ """
-            if vehicleInfos[vehicle].is_in_platoon():
-                if vehicleInfos[vehicle].is_leader():
-                    platoon_size[time][car_id + 1] = len(vehicleInfos[vehicle].get_platoon_members())
-                else:
-                    platoon_size[time][car_id + 1] = vehicleInfos[vehicleInfos[vehicle].get_platoon_leader()].get_float_id()
-            else:
-                platoon_size[time][car_id + 1] = 1
+            if speed is not None:
+                speed_value = round(vehicleInfos[vehicle].get_speed(), 2)
+                if speed_value < 0:
+                    speed_value = round(vehicleInfos[vehicle].get_desired_speed(), 2)
+                speed[car_id] = speed_value
 
             """ ############################################################################
                                                 HAPPINESS
             ############################################################################ """
-            happy_value, speed_happiness_value, platoon_size_happiness_value, \
-                distance_to_end_happiness_value, distance_in_between_happiness_value \
-                = PlatooningAlgorithms.calc_current_happiness_to_neighbor(vehicle, vehicleInfos[vehicle].get_platoon_leader(), full_print=True)
-            # Bugfix. When a car is spawned, there is a intervall with a speed value of less than -100.000.
-            if happy_value > 1 or happy_value < 0:
-                happy_value = 1
-            happiness[time][car_id + 1] = round(happy_value, 2)
-
-            if speed_happiness_value > 1 or speed_happiness_value < 0:
-                speed_happiness_value = 1
-            speed_happiness[time][car_id + 1] = round(speed_happiness_value, 2)
-
-            if platoon_size_happiness_value > 1 or platoon_size_happiness_value < 0:
-                platoon_size_happiness_value = 1
-            platoon_size_happiness[time][car_id + 1] = round(platoon_size_happiness_value, 2)
-
-            if distance_to_end_happiness_value > 1 or distance_to_end_happiness_value < 0:
-                distance_to_end_happiness_value = 1
-            distance_to_end_happiness[time][car_id + 1] = round(distance_to_end_happiness_value, 2)
-
-            if distance_in_between_happiness_value > 1 or distance_in_between_happiness_value < 0:
-                distance_in_between_happiness_value = 1
-            distance_in_between_happiness[time][car_id + 1] = round(distance_in_between_happiness_value, 2)
+            if with_happiness:
+                for row, value in zip(happiness_rows, [values[i] for values in happiness_values]):
+                    if row is not None:
+                        # Bugfix. When a car is spawned, there is a intervall with a speed value of less than -100.000.
+                        if value > 1 or value < 0:
+                            value = 1
+                        row[car_id] = round(value, 2)
 
             """ ############################################################################
                                                 Happiness Table
             ############################################################################ """
-            if vehicle == "v.16":
+            if vehicle == "v.16" and happiness_table is not None:
                 table = vehicleInfos[vehicle].get_happiness_table()
-                happiness_table[time][1] = round(PlatooningAlgorithms.calc_current_happiness_to_neighbor(vehicle, vehicle), 2)
+                happiness_table[0] = round(PlatooningAlgorithms.calc_current_happiness_to_neighbor(vehicle, vehicle), 2)
 
-                cnt = 2
+                cnt = 1
                 for neighbor in table:
                     if not "LRU" in neighbor:
-                        happiness_table[time][cnt] = str(neighbor)
+                        happiness_table[cnt] = str(neighbor)
                         cnt += 1
-                        happiness_table[time][cnt] = str(round(vehicleInfos[vehicle].get_happiness(neighbor), 2) - happiness_table[time][1])
+                        happiness_table[cnt] = str(round(vehicleInfos[vehicle].get_happiness(neighbor), 2) - happiness_table[0])
                         cnt += 1
-                while cnt < len(happiness_table[time]):
-                    happiness_table[time][cnt] = ""
+                while cnt < len(happiness_table):
+                    happiness_table[cnt] = ""
                     cnt += 1
 
             """ ############################################################################
                                         Neighbor and Candidate hood
             ############################################################################ """
-            state = vehicleInfos[vehicle].get_state()
-            if state == SINGLE_CAR or (state == PLATOON and not Globals.mode == HEINOVSKI):
-                neighborhood[time][car_id + 1] = len(vehicleInfos[vehicle].get_neighbors())
-                candidatehood[time][car_id + 1] = len(vehicleInfos[vehicle].get_candidates())
-            else:
-                neighborhood[time][car_id + 1] = -2
-                candidatehood[time][car_id + 1] = -2
-
-            """ ############################################################################
-                                        States
-            ############################################################################ """
-            states[time][car_id + 1] = state
-
-        else:
-            desired_platoon_speed[time][car_id + 1] = -1
-            desired_speed[time][car_id + 1] = -1
-            speed[time][car_id + 1] = -1
-            speed_factor[time][car_id + 1] = -1
-            platoon_size[time][car_id + 1] = -1
-            happiness[time][car_id + 1] = -1
-            speed_happiness[time][car_id + 1] = -1
-            platoon_size_happiness[time][car_id + 1] = -1
-            distance_to_end_happiness[time][car_id + 1] = -1
-            distance_in_between_happiness[time][car_id + 1] = -1
-            neighborhood[time][car_id + 1] = -1
-            candidatehood[time][car_id + 1] = -1
-            states[time][car_id + 1] = - 1
-
-    if time == buffer_size - 1:
-        writeToCSV(desired_platoon_speed, directory + '/desired_platoon_speed.csv')
-        writeToCSV(desired_speed, directory + '/desired_speed.csv')
-        writeToCSV(speed, directory + '/speed.csv')
-        writeToCSV(speed_factor, directory + '/speed_factor.csv')
-        writeToCSV(platoon_size, directory + '/platoon_size.csv')
-        writeToCSV(happiness, directory + '/happiness.csv')
-        writeToCSV(speed_happiness, directory + '/speed_happiness.csv')
-        writeToCSV(platoon_size_happiness, directory + '/platoon_size_happiness.csv')
-        writeToCSV(distance_to_end_happiness, directory + '/distance_to_end_happiness.csv')
-        writeToCSV(distance_in_between_happiness, directory + '/distance_in_between_happiness.csv')
-        writeToCSV(happiness_table, directory + '/happiness_table.csv')
-        writeToCSV(neighborhood, directory + '/neighborhood.csv')
-        writeToCSV(candidatehood, directory + '/candidatehood.csv')
-        writeToCSV(states, directory + '/states.csv')
-
-
-def write_info(counter, step):
+            if neighborhood is not None or candidatehood is not None:
+                state = vehicleInfos[vehicle].get_state()
+                hood = state == SINGLE_CAR or (state == PLATOON and not Globals.mode == HEINOVSKI)
+                if neighborhood is not None:
+                    neighborhood[car_id] = len(vehicleInfos[vehicle].get_neighbors()) if hood else -2
+                if candidatehood is not None:
+                    candidatehood[car_id] = len(vehicleInfos[vehicle].get_candidates()) if hood else -2
+
+    for buffer in due:
+        buffer.commit()
+
+
+def write_info(counter, step, wall_time=0):
+    drain()
+    EventLog.flush()
+    RunIndex.append('data', Globals.seed, Globals.mode, counter, step, wall_time)
     with open(directory + '/setup.txt', 'a') as f:
         f.write('SEED : ' + str(Globals.seed) + '\n'
                 'CARS : ' + str(AMOUNT_RANDOM_CARS) + '\n'
@@ -237,7 +321,11 @@ def write_info(counter, step):
                 'DIRECT PLATOON CHANGES : ' + str(counter[CHANGE]) + '\n'
                 'ABORTED CHANGES FROM ABOVE : ' + str(counter[CHANGE_ABORT]) + '\n'
                 'MERGED PLATOONS : ' + str(counter[MERGE]) + '\n'
-                'ABORTED MERGE FROM ABOVE: ' + str(counter[MERGE_ABORT]) + '\n'                                                
+                'ABORTED MERGE FROM ABOVE: ' + str(counter[MERGE_ABORT]) + '\n'
+                'HAPPINESS CACHE INSERTS : ' + str(HappinessCache.statistics["inserts"]) + '\n'
+                'HAPPINESS CACHE UPDATES : ' + str(HappinessCache.statistics["updates"]) + '\n'
+                'HAPPINESS CACHE EVICTIONS : ' + str(HappinessCache.statistics["evictions"]) + '\n'
+                'HAPPINESS CACHE PINNED LEADER SKIPS : ' + str(HappinessCache.statistics["pinned_skips"]) + '\n'
                 'END ------------------------------------------------------\n')
 
 
@@ -0,0 +1,56 @@
+"""
+Background writer of the monitoring.
+Flushes are handed over as jobs through a bounded queue, so the simulation loop does not wait for the disk I/O.
+"""
+
+import threading
+import traceback
+import Queue
+
+
+class MonitoringWriter(threading.Thread):
+    def __init__(self, queue_size=1):
+        threading.Thread.__init__(self, name="MonitoringWriter")
+        # A crashed simulation must not hang on exit, pending jobs are drained explicitly (see drain()).
+        self.daemon = True
+        self.jobs = Queue.Queue(maxsize=queue_size)
+        self.error = None
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            function, args, done = job
+            try:
+                function(*args)
+            except Exception as e:
+                traceback.print_exc()
+                if self.error is None:
+                    self.error = e
+            finally:
+                if done is not None:
+                    done()
+
+    def submit(self, function, args=(), done=None):
+        """
+        Queues function(*args). Blocks only while the queue is full, i.e. the writer is behind.
+        @param done: called after the job, also if it failed
+        """
+        self.raise_error()
+        self.jobs.put((function, args, done))
+
+    def drain(self):
+        """
+        Waits until all queued jobs are written and stops the thread. Failed jobs were already reported by run().
+        """
+        if self.is_alive():
+            self.jobs.put(None)
+            self.join()
+
+    def raise_error(self):
+        if self.error is not None:
+            error = self.error
+            self.error = None
+            print("Monitoring writer failed: " + str(error))
+            raise error
@@ -0,0 +1,45 @@
+"""
+Spatial index for the neighbor search.
+All vehicles are kept sorted by their x position. The neighbors of a car are the vehicles within
++- radius of its position, found with two binary searches (numpy.searchsorted) for all cars at once.
+"""
+
+import numpy as np
+
+from CONSTANTS import RADAR_DISTANCE
+
+
+class NeighborIndex:
+    def __init__(self, radius=RADAR_DISTANCE):
+        self.__radius = radius
+        self.__cars = []
+        self.__slots = {}
+        self.__lower = []
+        self.__upper = []
+
+    def rebuild(self, cars, positions):
+        """
+        Sorts the cars by position and computes the window [position - radius, position + radius] of every car.
+        @param cars: list of car ids
+        @param positions: x position of each car, same order as cars
+        """
+        positions = np.asarray(positions, dtype=np.float64)
+        order = np.argsort(positions, kind='mergesort')
+        sorted_positions = positions[order]
+
+        self.__cars = [cars[i] for i in order]
+        self.__slots = dict((car, slot) for slot, car in enumerate(self.__cars))
+        self.__lower = np.searchsorted(sorted_positions, sorted_positions - self.__radius, side='left').tolist()
+        self.__upper = np.searchsorted(sorted_positions, sorted_positions + self.__radius, side='right').tolist()
+
+    def __contains__(self, car):
+        return car in self.__slots
+
+    def get_neighbors(self, car):
+        """
+        Returns all cars within +- radius of the car. The car itself is not a neighbor.
+        """
+        slot = self.__slots.get(car)
+        if slot is None:
+            return []
+        return self.__cars[self.__lower[slot]:slot] + self.__cars[slot + 1:self.__upper[slot]]
@@ -4,7 +4,15 @@ import os
 import sys
 import random
 import math
-from time import sleep
+from time import sleep, time
+
+import numpy as np
+
+import CONSTANTS
+import LocalSimulation
+
+if CONSTANTS.LOCAL_SIMULATION or "--local" in sys.argv:
+    LocalSimulation.install()
 
 import Monitoring
 
@@ -21,6 +29,17 @@ import utils
 import createUtils
 import platoonUtils
 import PlatooningAlgorithms
+import VehicleSnapshot
+import VehicleStore
+import DistanceMatrix
+import LaneOccupancy
+import HappinessCache
+import DistanceToEnd
+import EventLog
+import PlexeCommands
+import Platoons
+import Profiler
+from NeighborIndex import NeighborIndex
 import Globals
 from CONSTANTS import *
 
@@ -37,355 +56,445 @@ def hundred_ms_times(factor, step):
     return step % (factor * 10) == 0
 
 
-def main():
-    seeds = [4,5,6,7,8,9,10, 11]
-    modes = [E_GREEDY, UCB1, BAYES_UCB, THOMPSON_SAMPLING, HEINOVSKI]
-    glossary = []
-
-    for seed in seeds:
-        for mode in modes:
-
+def removal_masks(cars, plexe):
+    """
+    Evaluates the removal conditions of the cars in one pass over their speed, distance to end and crash columns.
+    Returns the masks of the cars to remove (crashed, at the end of the route or standing) and of the cars which
+    count as crashed.
+    """
+    speed = np.array([VehicleSnapshot.get_speed(car) for car in cars], dtype=np.float64)
+    distance_to_end = np.array([DistanceToEnd.get(car) for car in cars], dtype=np.float64)
+    crashed = np.array([bool(plexe.get_crashed(car)) for car in cars], dtype=bool)
+    remove = (distance_to_end < 10) | crashed | ((0 < speed) & (speed < 0.5))
+    crash = crashed | ((0 < speed) & (speed < 1))
+    return remove, crash
+
+
+def remove_vehicles(all_vehicles, vehicles, vehicleInfos, plexe, counter, spawning_list):
+    """
+    Removing routine at the end of a car's route. Removes crashed cars and cars at the end of their route from
+    vehicleInfos, vehicles keeps only the cars which are still handled by the state machine.
+    """
+    handled = [car for car in all_vehicles if car in vehicleInfos]
+    if handled:
+        remove, crash = removal_masks(handled, plexe)
+        # Removing a car changes neither speed, distance to end nor crash flag of the others, so all conditions are
+        # evaluated before the first removal. The cars are removed in the order of all_vehicles.
+        for index in np.flatnonzero(remove):
+            car = handled[index]
+            if vehicleInfos[car].is_in_platoon():
+                platoonUtils.remove_platoon_member(car)
+
+            if crash[index]:
+                counter[CRASH] += 1
+                PlexeCommands.discard(car)
+                traci.vehicle.remove(car)
+            spawning_list.append(car)
+            vehicleInfos.pop(car).release()
+
+    vehicles[:] = [car for car in vehicles if car in vehicleInfos]
+
+
+def update_neighbor_table(neighbor_index, vehicles):
+    """
+    Rebuilds the neighbor table from the positions of this step.
+    """
+    neighbor_index.rebuild(vehicles, [VehicleSnapshot.get_position(car)[0] for car in vehicles])
+
+
+def update_neighbors(car, neighbor_index, vehicleInfos):
+    """
+    Returns all vehicles within RADAR_DISTANCE of the car. The current car is not a neighbor of itself.
+    """
+    neighbors = neighbor_index.get_neighbors(car)
+    vehicleInfos[car].set_neighbors(neighbors)
+    return neighbors
+
+
+def search_neighbor(car, state, neighbors, step):
+    """
+    Happiness update and algorithms. Returns the best neighbor of the car or None, if the car does not search in
+    this step.
+    """
+    if (state == SINGLE_CAR or (state == PLATOON and not Globals.mode == HEINOVSKI)) \
+            and hundred_ms_times(10, step):
+        return PlatooningAlgorithms.processing_neighbor_search(car, neighbors)
+    return None
+
+
+def perform_state_action(car, state, neighbor, neighbors, step, vehicleInfos, counter,
+                         happiness_change_monitor_vehicle, happiness_change_monitor_platoon):
+    """
+    Performs the action of the current state of the car.
+    """
+
+    """ ############################################################################
+                                   State = NEW_SPAWNED
+       ############################################################################ """
+    if state == NEW_SPAWNED:
+        vehicleInfos[car].set_current_speed_factor(vehicleInfos[car].get_desired_speed_factor())
+
+        if vehicleInfos[car].get_road_id() in EDGES:
+            vehicleInfos[car].set_state(SINGLE_CAR)
+            if DEBUG_CREATE:
+                print(car + " start speed: " + str(vehicleInfos[car].get_speed())
+                      + " start speed factor: " + str(vehicleInfos[car].get_desired_speed_factor()))
+                print(car + " switches to Single Car State")
+
+    elif state == SINGLE_CAR:
+        """ ############################################################################
+                                       State = SINGLE_CAR
+           ############################################################################ """
+        platoonUtils.fix_speed_factor(car)
+
+        if platoonUtils.take_next_exit(car):
+            if DEBUG_REMOVE_MEMBER:
+                print(car + ": " + str(DistanceToEnd.get(car)) + " m distance to end")
+            vehicleInfos[car].set_state(NO_PLATOONING)
+
+        elif neighbor is not None and hundred_ms_times(10, step):
+            if not platoonUtils.cars_in_between(car, neighbor, neighbors) \
+                    and len(vehicleInfos[neighbor].get_platoon_members()) < MAX_PLATOON_SIZE:
+                last_member = vehicleInfos[neighbor].get_platoon_members()[-1]
+
+                lane_difference = abs(
+                    vehicleInfos[car].get_lane_id() - vehicleInfos[neighbor].get_lane_id())
+                # It is only possible to join a platoon, if car is behind the last member of the
+                # existing platoon.
+                if platoonUtils.get_distance(car, last_member) \
+                        > (lane_difference + 1) * JOINING_MINIMAL_DISTANCE:
+                    vehicleInfos[car].set_state(PREPARE_JOINING)
+                    vehicleInfos[car].set_desired_platoon_leader(neighbor)
+                    vehicleInfos[neighbor].set_joiner()
+
+    elif state == PREPARE_JOINING:
+        """ ############################################################################
+                                       State = PREPARE_JOINING
+           ############################################################################ """
+        # For monitoring purpose only
+        desired_leader = vehicleInfos[car].get_desired_platoon_leader()
+        members = vehicleInfos[desired_leader].get_platoon_members()
+        member_happiness_list = {}
+        for member in members:
+            member_happiness_list[member] = PlatooningAlgorithms.calc_new_happiness(member, desired_leader)
+
+        platoonUtils.prepare_joining(car, neighbors)
+
+        # For monitoring purpose only
+        if not vehicleInfos[car].get_state() == PREPARE_JOINING and vehicleInfos[car].is_from_another_platoon():
+            if vehicleInfos[car].get_state() == NO_PLATOONING:
+                counter[CHANGE_ABORT] += 1
+
+            # Monitoring happiness change of single car
+            leader = vehicleInfos[car].get_platoon_leader()
+            new_happiness = PlatooningAlgorithms.calc_new_happiness(car, leader)
+            happiness_difference = vehicleInfos[car].get_old_happiness() - new_happiness
+            happiness_change_monitor_vehicle.append((car, happiness_difference, step))
+
+            # Monitoring happiness change of joined platoon if change was successful.
+            if leader == desired_leader:
+                members = vehicleInfos[leader].get_platoon_members()
+                happiness_difference = 0
+                for member in members:
+                    if member in member_happiness_list:
+                        new_happiness = PlatooningAlgorithms.calc_new_happiness(member, leader)
+                        happiness_difference += (member_happiness_list[member] - new_happiness)
+                happiness_change_monitor_platoon.append((leader, happiness_difference, step))
+            vehicleInfos[car].reset_from_another_platoon()
+
+    elif state == JOINING_PROCESS:
+        """ ############################################################################
+                                       State = JOINING_PROCESS
+           ############################################################################ """
+        platoonUtils.joining_process(car)
+        # This routine checks, whether the car wants to leave the highway soon.
+        # If that is the case, the car will leave its platoon.
+        leader = vehicleInfos[car].get_platoon_leader()
+        if platoonUtils.take_next_exit(car) or platoonUtils.cars_in_between(car, leader, neighbors):
+            if DEBUG_REMOVE_MEMBER:
+                print(car + ": " + str(DistanceToEnd.get(car)) + " m distance to end")
+            vehicleInfos[car].set_state(LEAVING_PROCESS)
+
+    elif state == PLATOON:
+        """ ############################################################################
+                                       State = PLATOON
+           ############################################################################ """
+        if DEBUG_PLATOON_MERGING_ALLOWED and hundred_ms_times(10, step) \
+                and Globals.mode != HEINOVSKI:
+            if platoonUtils.check_merging(car, neighbor, neighbors):
+                counter[MERGE] += 1
+
+        if vehicleInfos[car].is_leader():
+            perform_platoon_action(vehicleInfos[car].get_platoon(), state, vehicleInfos, counter)
+        else:
+            leader = vehicleInfos[car].get_platoon_leader()
+            if vehicleInfos[leader].get_state() == PLATOON \
+                    and not vehicleInfos[car].on_same_lane_with_leader() \
+                    and vehicleInfos[car].get_road_id() == vehicleInfos[leader].get_road_id():
+                # Checks, if a platooned car is on the wrong lane and handles the situation.
+                platoonUtils.check_emergency_platoon_quit(car, leader)
+
+        if vehicleInfos[car].get_state() == PLATOON and hundred_ms_times(10, step):
+            # This routine checks, whether the car wants to leave the highway soon.
+            if platoonUtils.take_next_exit(car):
+                if DEBUG_REMOVE_MEMBER:
+                    print(car + ": " + str(DistanceToEnd.get(car)) + " m distance to end")
+                vehicleInfos[car].set_state(LEAVING_PROCESS)
+
+            # This routine checks, whether better platoons are available.
+            if not vehicleInfos[car].has_joiner():
+                if platoonUtils.handle_platoon_changing(car, neighbor, neighbors):
+                    leader = vehicleInfos[car].get_platoon_leader()
+                    old_happiness = PlatooningAlgorithms.calc_new_happiness(car, leader)
+
+                    counter[CHANGE] += 1
+                    vehicleInfos[car].set_from_another_platoon()
+                    vehicleInfos[car].set_old_happiness(old_happiness)
+
+    elif state == MERGING:
+        """ ############################################################################
+                                       State = MERGING
+           ############################################################################ """
+        # The members wait, the merging is done by the leader.
+        if vehicleInfos[car].is_leader():
+            perform_platoon_action(vehicleInfos[car].get_platoon(), state, vehicleInfos, counter)
+
+    elif state == LEAVING_PROCESS:
+        """ ############################################################################
+                                       State = LEAVING_PROCESS
+           ############################################################################ """
+        platoonUtils.prepare_for_remove(car)
+
+    elif state == LEFT:
+        """ ############################################################################
+                                       State = LEFT
+           ############################################################################ """
+        platoonUtils.remove_platoon_member(car)
+
+    elif state == NO_PLATOONING:
+        """ ############################################################################
+                                        State = NO_PLATOONING
+        ############################################################################ """
+        # Adjust speed factor to desired after leaving a platoon.
+        if platoonUtils.take_next_exit(car) and vehicleInfos[car].get_lane_id() != 0:
+            vehicleInfos[car].set_current_speed_factor(0.5)
+        else:
+            platoonUtils.fix_speed_factor(car)
+
+        if not platoonUtils.take_next_exit(car):
+            if vehicleInfos[car].get_counter() >= 20:
+                vehicleInfos[car].set_state(SINGLE_CAR)
+                if DEBUG_PLATOON_SWITCH:
+                    print(car + " is reset into SINGLE CAR STATE")
+                vehicleInfos[car].reset_counter()
+            else:
+                vehicleInfos[car].inc_counter()
+
+
+def setup_simulation(seed, mode, label="default", gui=True):
+    """
+    Starts SUMO and resets all modules for a new simulation of the seed and algorithm mode.
+    Returns the Plexe instance, the (empty) vehicleInfos and the neighbor index of the simulation.
+    """
+    Globals.mode = mode
+    Globals.seed = seed
+    Globals.gui = gui
+    random.seed(seed)
+    if gui:
+        utils.start_sumo("cfg/freeway.sumo.cfg", False, gui=True, label=label)
+    else:
+        # Headless batch mode: plain sumo binary without gui settings.
+        utils.start_sumo("cfg/freeway.headless.sumo.cfg", False, gui=False, label=label)
+    # used to randomly color the vehicles
+    plexe = Plexe()
+    traci.addStepListener(plexe)
+    DistanceToEnd.registry(plexe)
+    PlexeCommands.registry(plexe)
+    vehicleInfos = {}
+    VehicleSnapshot.reset()
+    VehicleStore.reset(AMOUNT_RANDOM_CARS)
+    Platoons.reset()
+    DistanceMatrix.reset()
+    LaneOccupancy.reset()
+    HappinessCache.reset_statistics()
+    platoonUtils.registry(vehicleInfos, plexe)
+    Monitoring.registry(vehicleInfos)
+    createUtils.registry(vehicleInfos)
+    PlatooningAlgorithms.registry(vehicleInfos, plexe)
+    Profiler.reset()
+    Profiler.instrument_api(traci, plexe)
+    return plexe, vehicleInfos, NeighborIndex(RADAR_DISTANCE)
+
+
+def perform_platoon_action(platoon, state, vehicleInfos, counter):
+    """
+    Performs the leader actions of a platoon. Called once per platoon from the state action of its leader, with the
+    state the leader had when the car loop reached it. A platoon which switches to MERGING in this step is therefore
+    merged on the next 100 ms tick, not in the same one.
+    """
+    leader = platoon.leader
+
+    if state == PLATOON:
+        # DEBUG: Platoon desired / real speed
+        if DEBUG_PRINT_PLATOON_DESIRED_REAL_SPEED:
+            print(str(leader) + ": DesiredSpeed: " + str(
+                vehicleInfos[leader].get_desired_speed()) + " isSpeed: " + str(vehicleInfos[leader].get_speed()))
+            for member in platoon.members[1::]:
+                print("member: " + str(member) + ": DesiredSpeed: " + str(
+                    vehicleInfos[member].get_desired_speed()) + " isSpeed: " + str(
+                    vehicleInfos[member].get_speed()))
+            print("----------------------------------------------------------------------")
+
+        platoonUtils.handle_auto_lane_change_in_platoon(platoon)
+
+    elif state == MERGING:
+        leader_front = vehicleInfos[leader].get_desired_platoon_leader()
+
+        # Platoon is out of range, abort.
+        if platoonUtils.get_distance(leader, leader_front) > RADAR_DISTANCE:
+            counter[MERGE_ABORT] += 1
+            for member in platoon.members:
+                vehicleInfos[member].set_state(PLATOON)
+        elif not platoonUtils.cars_in_between(platoon.last_member(), leader_front,
+                                              vehicleInfos[leader].get_neighbors()):
+            platoonUtils.merge_platoons(platoon)
+
+
+def run_simulation(seed, mode, label="default", gui=True):
+    """
+    Runs a single simulation for the given seed and algorithm mode.
+    Returns the counter of the run and its glossary entry (seed, mode, step).
+    :param label: label of the TraCI connection, has to be unique per running SUMO instance
+    :param gui: start sumo-gui or run headless with the plain sumo binary. Headless runs skip all color updates.
+    """
+    start = time()
+    step = 0
+    counter = [0, 0, 0, 0, 0, 0]
+    happiness_change_monitor_vehicle = []
+    happiness_change_monitor_platoon = []
+
+    try:
+        plexe, vehicleInfos, neighbor_index = setup_simulation(seed, mode, label, gui)
+        spawn_timer = 40
+        spawn_threshold = random.randint(200, 300)
+        spawning_list = []
+        spawnable_list = []
+
+        # Reset simulation afer 6 Minutes.
+        while step <= 60002:
+            started = Profiler.start()
+            PlexeCommands.flush()
+            Profiler.stop("commands", started)
+            started = Profiler.start()
             try:
-                Globals.mode = mode
-                Globals.seed = seed
-                random.seed(seed)
-                sleep(0.5)
-                utils.start_sumo("cfg/freeway.sumo.cfg", False, gui=True)
-                # used to randomly color the vehicles
-                plexe = Plexe()
-                traci.addStepListener(plexe)
-                step = 0
-                counter = [0, 0, 0, 0, 0, 0]
-                happiness_change_monitor_vehicle = []
-                happiness_change_monitor_platoon = []
-                spawn_timer = 40
+                traci.simulationStep()
+            except:
+                print(sys.exc_info()[0])
+            Profiler.stop("simulation", started)
+            """ ############################################################################
+                                        Setup Vehicles
+            ############################################################################ """
+
+            started = Profiler.start()
+            all_vehicles = list(traci.vehicle.getIDList())
+            vehicles = list(all_vehicles)
+            # One batched response for the state of all vehicles in this step.
+            VehicleSnapshot.update(all_vehicles)
+            EventLog.set_time(step)
+            Profiler.stop("snapshot", started)
+            spawn_timer += 1
+
+            # Generating cars every second (100 timesteps)
+            if spawn_timer >= spawn_threshold and len(vehicles) < AMOUNT_RANDOM_CARS:
+                started = Profiler.start()
+                spawn_timer = 0
+
+                if len(spawnable_list) == 0:
+                    car_id = "v.%d" % counter[CAR]
+                    counter[CAR] += 1
+                else:
+                    car_id = spawnable_list.pop(0)
+
+                if len(spawning_list) != 0:
+                    spawnable_list.append(spawning_list.pop(0))
+
+                # 0 - 3     Start
+                # 4 - 6     1. Entry
+                # 7 - 8     2. Entry
+                # 9         3. Entry
                 spawn_threshold = random.randint(200, 300)
-                vehicleInfos = {}
-                platoonUtils.registry(vehicleInfos, plexe)
-                Monitoring.registry(vehicleInfos)
-                createUtils.registry(vehicleInfos)
-                PlatooningAlgorithms.registry(vehicleInfos, plexe)
-                neighbor_table = [[] for i in range(500)]
-                spawning_list = []
-                spawnable_list = []
-
-                # Reset simulation afer 6 Minutes.
-                while step <= 60002:
-                    try:
-                        traci.simulationStep()
-                    except:
-                        print(sys.exc_info()[0])
-                    """ ############################################################################
-                                                Setup Vehicles
-                    ############################################################################ """
-
-                    all_vehicles = list(traci.vehicle.getIDList())
-                    vehicles = list(all_vehicles)
-                    spawn_timer += 1
-
-                    # Generating cars every second (100 timesteps)
-                    if spawn_timer >= spawn_threshold and len(vehicles) < AMOUNT_RANDOM_CARS:
-                        spawn_timer = 0
-
-                        if len(spawnable_list) == 0:
-                            car_id = "v.%d" % counter[CAR]
-                            counter[CAR] += 1
-                        else:
-                            car_id = spawnable_list.pop(0)
-
-                        if len(spawning_list) != 0:
-                            spawnable_list.append(spawning_list.pop(0))
-
-                        # 0 - 3     Start
-                        # 4 - 6     1. Entry
-                        # 7 - 8     2. Entry
-                        # 9         3. Entry
-                        spawn_threshold = random.randint(200, 300)
-
-                        if step < 17000:
-                            vroute = random.randint(0, 3)
-                        elif step < 34000:
-                            vroute = random.randint(0, 6)
-                            spawn_threshold /= 1.5
-                        elif step < 51000:
-                            vroute = random.randint(0, 8)
-                            spawn_threshold /= 2
-
-                        if MODE == START_TO_END_SCENARIO:
-                            createUtils.add_vehicle(plexe, car_id, 0, vroute=3)
-                        else:
-                            createUtils.add_vehicle(plexe, car_id, 0, vroute=vroute)
-
-                    """ ############################################################################
-                                                Simulate
-                    ############################################################################ """
-
-                    # for every existing car, do the following actions every 100 ms
-                    if hundred_ms_times(2, step):
-
-                        """ ############################################################################
-                                        Removing Routine at the End of a Car's Route
-                        ############################################################################ """
-
-                        for car in all_vehicles:
-                            if car in vehicleInfos:
-
-                                if plexe.get_distance_to_end(car) < 10 or plexe.get_crashed(car) or 0 < vehicleInfos[car].get_speed() < 0.5:
-                                    if vehicleInfos[car].is_in_platoon():
-                                        platoonUtils.remove_platoon_member(car)
-                                    pos_relative = int(vehicleInfos[car].get_neighbor_table_pos())
-                                    if car in neighbor_table[pos_relative]:
-                                        neighbor_table[pos_relative].remove(car)
-
-                                    if plexe.get_crashed(car) or 0 < vehicleInfos[car].get_speed() < 1:
-                                        counter[CRASH] += 1
-                                        traci.vehicle.remove(car)
-                                    spawning_list.append(car)
-                                    vehicleInfos.pop(car)
-
-                            if car not in vehicleInfos:
-                                vehicles.remove(car)
-                        """ ############################################################################
-                                                    Update Neighbor Table
-                        ############################################################################ """
-                        for car in vehicles:
-                            pos_relative = int(math.floor(plexe.get_vehicle_data(car)[POS_X] / RADAR_DISTANCE))
-                            pos_relative_old = int(vehicleInfos[car].get_neighbor_table_pos())
-                            if pos_relative_old is not pos_relative:
-                                if car in neighbor_table[pos_relative_old]:
-                                    neighbor_table[pos_relative_old].remove(car)
-                                neighbor_table[pos_relative].append(car)
-                                vehicleInfos[car].set_neighbor_table_pos(pos_relative)
-
-                        """ ############################################################################
-                                                    Update Neighbors
-                        ############################################################################ """
-
-                        for car in vehicles:
-                            state = vehicleInfos[car].get_state()
-                            position = vehicleInfos[car].get_neighbor_table_pos()
-
-                            # add all vehicles in the specific neighbor_table area to the neighbors list
-                            if position == 0:
-                                neighbors = neighbor_table[position] + neighbor_table[position + 1]
-                            else:
-                                neighbors = neighbor_table[position - 1] + neighbor_table[position] + neighbor_table[position + 1]
-                            # The current car is not a neighbor of itself
-                            if car in neighbors:
-                                neighbors.remove(car)
-
-                            vehicleInfos[car].set_neighbors(neighbors)
-
-                            """ ############################################################################
-                                                           Happiness Update and Algorithms
-                            ############################################################################ """
-                            if (state == SINGLE_CAR or (state == PLATOON and not Globals.mode == HEINOVSKI)) \
-                                    and hundred_ms_times(10, step):
-                                neighbor = PlatooningAlgorithms.processing_neighbor_search(car, neighbors)
-                            else:
-                                neighbor = None
-
-                            """ ############################################################################
-                                                           Perform State Actions
-                               ############################################################################ """
-
-                            """ ############################################################################
-                                                           State = NEW_SPAWNED
-                               ############################################################################ """
-                            if state == NEW_SPAWNED:
-                                vehicleInfos[car].set_current_speed_factor(vehicleInfos[car].get_desired_speed_factor())
-
-                                if vehicleInfos[car].get_road_id() in EDGES:
-                                    vehicleInfos[car].set_state(SINGLE_CAR)
-                                    if DEBUG_CREATE:
-                                        print(car + " start speed: " + str(vehicleInfos[car].get_speed())
-                                              + " start speed factor: " + str(vehicleInfos[car].get_desired_speed_factor()))
-                                        print(car + " switches to Single Car State")
-
-                            elif state == SINGLE_CAR:
-                                """ ############################################################################
-                                                               State = SINGLE_CAR
-                                   ############################################################################ """
-                                platoonUtils.fix_speed_factor(car)
-
-                                if platoonUtils.take_next_exit(car):
-                                    if DEBUG_REMOVE_MEMBER:
-                                        print(car + ": " + str(plexe.get_distance_to_end(car)) + " m distance to end")
-                                    vehicleInfos[car].set_state(NO_PLATOONING)
-
-                                elif neighbor is not None and hundred_ms_times(10, step):
-                                    if not platoonUtils.cars_in_between(car, neighbor, neighbors) \
-                                            and len(vehicleInfos[neighbor].get_platoon_members()) < MAX_PLATOON_SIZE:
-                                        last_member = vehicleInfos[neighbor].get_platoon_members()[-1]
-
-                                        lane_difference = abs(
-                                            vehicleInfos[car].get_lane_id() - vehicleInfos[neighbor].get_lane_id())
-                                        # It is only possible to join a platoon, if car is behind the last member of the
-                                        # existing platoon.
-                                        if platoonUtils.get_distance(car, last_member) \
-                                                > (lane_difference + 1) * JOINING_MINIMAL_DISTANCE:
-                                            vehicleInfos[car].set_state(PREPARE_JOINING)
-                                            vehicleInfos[car].set_desired_platoon_leader(neighbor)
-                                            vehicleInfos[neighbor].set_joiner()
-
-                            elif state == PREPARE_JOINING:
-                                """ ############################################################################
-                                                               State = PREPARE_JOINING
-                                   ############################################################################ """
-                                # For monitoring purpose only
-                                desired_leader = vehicleInfos[car].get_desired_platoon_leader()
-                                members = vehicleInfos[desired_leader].get_platoon_members()
-                                member_happiness_list = {}
-                                for member in members:
-                                    member_happiness_list[member] = PlatooningAlgorithms.calc_new_happiness(member, desired_leader)
-
-                                platoonUtils.prepare_joining(car, neighbors)
-
-                                # For monitoring purpose only
-                                if not vehicleInfos[car].get_state() == PREPARE_JOINING and vehicleInfos[car].is_from_another_platoon():
-                                    if vehicleInfos[car].get_state() == NO_PLATOONING:
-                                        counter[CHANGE_ABORT] += 1
-
-                                    # Monitoring happiness change of single car
-                                    leader = vehicleInfos[car].get_platoon_leader()
-                                    new_happiness = PlatooningAlgorithms.calc_new_happiness(car, leader)
-                                    happiness_difference = vehicleInfos[car].get_old_happiness() - new_happiness
-                                    happiness_change_monitor_vehicle.append((car, happiness_difference, step))
-
-                                    # Monitoring happiness change of joined platoon if change was successful.
-                                    if leader == desired_leader:
-                                        members = vehicleInfos[leader].get_platoon_members()
-                                        happiness_difference = 0
-                                        for member in members:
-                                            if member in member_happiness_list:
-                                                new_happiness = PlatooningAlgorithms.calc_new_happiness(member, leader)
-                                                happiness_difference += (member_happiness_list[member] - new_happiness)
-                                        happiness_change_monitor_platoon.append((leader, happiness_difference, step))
-                                    vehicleInfos[car].reset_from_another_platoon()
-
-                            elif state == JOINING_PROCESS:
-                                """ ############################################################################
-                                                               State = JOINING_PROCESS
-                                   ############################################################################ """
-                                platoonUtils.joining_process(car)
-                                # This routine checks, whether the car wants to leave the highway soon.
-                                # If that is the case, the car will leave its platoon.
-                                leader = vehicleInfos[car].get_platoon_leader()
-                                if platoonUtils.take_next_exit(car) or platoonUtils.cars_in_between(car, leader, neighbors):
-                                    if DEBUG_REMOVE_MEMBER:
-                                        print(car + ": " + str(plexe.get_distance_to_end(car)) + " m distance to end")
-                                    vehicleInfos[car].set_state(LEAVING_PROCESS)
-
-                            elif state == PLATOON:
-                                """ ############################################################################
-                                                               State = PLATOON
-                                   ############################################################################ """
-                                # DEBUG: Platoon desired / real speed
-                                if DEBUG_PRINT_PLATOON_DESIRED_REAL_SPEED and vehicleInfos[car].is_leader():
-                                    print(str(car) + ": DesiredSpeed: " + str(
-                                        vehicleInfos[car].get_desired_speed()) + " isSpeed: " + str(vehicleInfos[car].get_speed()))
-                                    members = vehicleInfos[car].get_platoon_members()
-                                    for member in members[1::]:
-                                        print("member: " + str(member) + ": DesiredSpeed: " + str(
-                                            vehicleInfos[member].get_desired_speed()) + " isSpeed: " + str(
-                                            vehicleInfos[member].get_speed()))
-                                    print("----------------------------------------------------------------------")
-
-                                if DEBUG_PLATOON_MERGING_ALLOWED and hundred_ms_times(10, step) \
-                                        and Globals.mode != HEINOVSKI:
-                                    if platoonUtils.check_merging(car, neighbor, neighbors):
-                                        counter[MERGE] += 1
-
-                                if vehicleInfos[car].is_leader():
-                                    platoonUtils.handle_auto_lane_change_in_platoon(car)
-                                else:  # if not vehicleInfos[car].is_leader()
-                                    leader = vehicleInfos[car].get_platoon_leader()
-                                    if vehicleInfos[leader].get_state() == PLATOON \
-                                            and not vehicleInfos[car].on_same_lane_with_leader() \
-                                            and vehicleInfos[car].get_road_id() == vehicleInfos[leader].get_road_id():
-                                        # Checks, if a platooned car is on the wrong lane and handles the situation.
-                                        platoonUtils.check_emergency_platoon_quit(car, leader)
-
-                                if vehicleInfos[car].get_state() == PLATOON and hundred_ms_times(10, step):
-                                    # This routine checks, whether the car wants to leave the highway soon.
-                                    if platoonUtils.take_next_exit(car):
-                                        if DEBUG_REMOVE_MEMBER:
-                                            print(car + ": " + str(plexe.get_distance_to_end(car)) + " m distance to end")
-                                        vehicleInfos[car].set_state(LEAVING_PROCESS)
-
-                                    # This routine checks, whether better platoons are available.
-                                    if not vehicleInfos[car].has_joiner():
-                                        if platoonUtils.handle_platoon_changing(car, neighbor, neighbors):
-                                            leader = vehicleInfos[car].get_platoon_leader()
-                                            old_happiness = PlatooningAlgorithms.calc_new_happiness(car, leader)
-
-                                            counter[CHANGE] += 1
-                                            vehicleInfos[car].set_from_another_platoon()
-                                            vehicleInfos[car].set_old_happiness(old_happiness)
-
-                            elif state == MERGING:
-                                """ ############################################################################
-                                                               State = MERGING
-                                   ############################################################################ """
-                                if vehicleInfos[car].is_leader():
-                                    leader_front = vehicleInfos[car].get_desired_platoon_leader()
-                                    members = vehicleInfos[car].get_platoon_members()
-
-                                    # Platoon is out of range, abort.
-                                    if platoonUtils.get_distance(car, leader_front) > RADAR_DISTANCE:
-                                        counter[MERGE_ABORT] += 1
-                                        for member in members:
-                                            vehicleInfos[member].set_state(PLATOON)
-                                    elif not platoonUtils.cars_in_between(members[-1], leader_front, neighbors):
-                                        platoonUtils.merge_platoons(car)
-
-                            elif state == LEAVING_PROCESS:
-                                """ ############################################################################
-                                                               State = LEAVING_PROCESS
-                                   ############################################################################ """
-                                platoonUtils.prepare_for_remove(car)
-
-                            elif state == LEFT:
-                                """ ############################################################################
-                                                               State = LEFT
-                                   ############################################################################ """
-                                platoonUtils.remove_platoon_member(car)
-
-                            elif state == NO_PLATOONING:
-                                """ ############################################################################
-                                                                State = NO_PLATOONING
-                                ############################################################################ """
-                                # Adjust speed factor to desired after leaving a platoon.
-                                if platoonUtils.take_next_exit(car) and vehicleInfos[car].get_lane_id() != 0:
-                                    vehicleInfos[car].set_current_speed_factor(0.5)
-                                else:
-                                    platoonUtils.fix_speed_factor(car)
-
-                                if not platoonUtils.take_next_exit(car):
-                                    if vehicleInfos[car].get_counter() >= 20:
-                                        vehicleInfos[car].set_state(SINGLE_CAR)
-                                        if DEBUG_PLATOON_SWITCH:
-                                            print(car + " is reset into SINGLE CAR STATE")
-                                        vehicleInfos[car].reset_counter()
-                                    else:
-                                        vehicleInfos[car].inc_counter()
-
-                    """ ############################################################################
-                                                Monitoring
-                    ############################################################################ """
-                    if half_second(step):
-                        Monitoring.observe(step)
-                    step += 1
 
-            except:
-                print(sys.exc_info())
-                print("Simulation " + str(seed) + " stops at step " + str(step))
-
-            Monitoring.write_info(counter, step)
-            Monitoring.write_happiness_change(happiness_change_monitor_vehicle, "vehicle")
-            Monitoring.write_happiness_change(happiness_change_monitor_platoon, "platoon")
-            traci.close()
-            glossary.append((seed, mode, step))
+                if step < 17000:
+                    vroute = random.randint(0, 3)
+                elif step < 34000:
+                    vroute = random.randint(0, 6)
+                    spawn_threshold /= 1.5
+                elif step < 51000:
+                    vroute = random.randint(0, 8)
+                    spawn_threshold /= 2
+
+                if MODE == START_TO_END_SCENARIO:
+                    createUtils.add_vehicle(plexe, car_id, 0, vroute=3)
+                else:
+                    createUtils.add_vehicle(plexe, car_id, 0, vroute=vroute)
+                Profiler.stop("spawn", started)
+
+            """ ############################################################################
+                                        Simulate
+            ############################################################################ """
+
+            # for every existing car, do the following actions every 100 ms
+            if hundred_ms_times(2, step):
+                started = Profiler.start()
+                remove_vehicles(all_vehicles, vehicles, vehicleInfos, plexe, counter, spawning_list)
+                Profiler.stop("removal", started)
+                started = Profiler.start()
+                update_neighbor_table(neighbor_index, vehicles)
+                Profiler.stop("neighbor_table", started)
+
+                for car in vehicles:
+                    state = vehicleInfos[car].get_state()
+                    started = Profiler.start()
+                    neighbors = update_neighbors(car, neighbor_index, vehicleInfos)
+                    Profiler.stop("neighbor_update", started)
+                    started = Profiler.start()
+                    neighbor = search_neighbor(car, state, neighbors, step)
+                    Profiler.stop("neighbor_search", started)
+                    started = Profiler.start()
+                    perform_state_action(car, state, neighbor, neighbors, step, vehicleInfos, counter,
+                                         happiness_change_monitor_vehicle, happiness_change_monitor_platoon)
+                    Profiler.stop(Profiler.STATE_SECTIONS[state], started)
+
+            """ ############################################################################
+                                        Monitoring
+            ############################################################################ """
+            if step % MONITORING_INTERVAL == 0:
+                started = Profiler.start()
+                Monitoring.observe(step)
+                Profiler.stop("monitoring", started)
+            step += 1
+
+    except:
+        print(sys.exc_info())
+        print("Simulation " + str(seed) + " stops at step " + str(step))
+
+    Monitoring.write_info(counter, step, wall_time=time() - start)
+    Profiler.write_report(Monitoring.directory, step, time() - start)
+    Monitoring.write_happiness_change(happiness_change_monitor_vehicle, "vehicle")
+    Monitoring.write_happiness_change(happiness_change_monitor_platoon, "platoon")
+    traci.close()
+    return counter, (seed, mode, step)
+
+
+def main():
+    glossary = []
+    headless = HEADLESS or "--headless" in sys.argv
+
+    for seed in SEEDS:
+        for mode in MODES:
+            sleep(0.5)
+            counter, entry = run_simulation(seed, mode, gui=not headless)
+            glossary.append(entry)
 
     Monitoring.writeGlossary(glossary)
 
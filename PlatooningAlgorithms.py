@@ -7,6 +7,7 @@ import numpy as np
 
 import Globals
 import platoonUtils
+import DistanceToEnd
 
 if 'SUMO_HOME' in os.environ:
     tools = os.path.join(os.environ['SUMO_HOME'], 'tools')
@@ -15,6 +16,9 @@ else:
     sys.exit("please declare environment variable 'SUMO_HOME'")
 from CONSTANTS import *
 
+# Happiness values of (car, neighbor) pairs, filled by a batch calculation for the duration of one neighbor search.
+current_happiness = {}
+
 
 def __calc_happiness(speed1, speed2, platoon_size, car, members, distance_in_between):
     """
@@ -35,11 +39,66 @@ def __calc_happiness(speed1, speed2, platoon_size, car, members, distance_in_bet
     return happiness, speed_happiness, platoon_size_happiness, distance_to_end_happiness, distance_in_between_happiness
 
 
+def calc_happiness_batch(pairs):
+    """
+    Calculates the happiness of many (car, neighbor) pairs in one vectorized pass.
+    Speeds, distances to end and platoon information are gathered once per vehicle, the happiness formulas are
+    evaluated on numpy arrays. The results are equal to calc_current_happiness_to_neighbor.
+    Returns the arrays happiness, speed_happiness, platoon_size_happiness, distance_to_end_happiness and
+    distance_in_between_happiness in the order of pairs.
+    """
+    n = len(pairs)
+    desired_speed_car = np.empty(n)
+    is_speed = np.empty(n)
+    platoon_size = np.empty(n)
+    distance_in_between = np.empty(n)
+    distance_to_end_car = np.empty(n)
+    distance_to_end_neighbor = np.zeros(n)
+
+    desired_speeds = {}
+    speeds = {}
+    for i, (car, neighbor) in enumerate(pairs):
+        if car not in desired_speeds:
+            desired_speeds[car] = float(vehicleInfos[car].get_desired_speed())
+        if neighbor not in speeds:
+            speeds[neighbor] = float(vehicleInfos[neighbor].get_speed())
+        members = vehicleInfos[neighbor].get_platoon_members()
+
+        desired_speed_car[i] = desired_speeds[car]
+        is_speed[i] = speeds[neighbor]
+        if vehicleInfos[car].get_platoon_leader() == neighbor:
+            platoon_size[i] = len(members)
+        else:
+            platoon_size[i] = len(members) + 1
+        distance_in_between[i] = platoonUtils.get_distance(car, neighbor)
+        distance_to_end_car[i] = DistanceToEnd.get(car)
+        distance_to_end_neighbor[i] = calc_distance_to_end_of_members(car, members)
+
+    speed_self = np.maximum(desired_speed_car - 19, 0.1)
+    speed_neighbor = np.maximum(is_speed - 19, 0.1)
+    speed_happiness = np.minimum(speed_self / speed_neighbor, speed_neighbor / speed_self)
+    platoon_size_happiness = 1 - (1.0 / platoon_size)
+    no_distance_to_end = distance_to_end_neighbor == 0
+    distance_to_end_happiness = np.where(
+        no_distance_to_end, 0,
+        np.minimum(1, distance_to_end_car / np.where(no_distance_to_end, 1, distance_to_end_neighbor)))
+    distance_in_between_happiness = np.maximum(1 - (distance_in_between / RADAR_DISTANCE), 0)
+
+    happiness = (W_SPEED * speed_happiness
+                 + W_PLATOON_SIZE * platoon_size_happiness
+                 + W_DISTANCE_TO_END * distance_to_end_happiness
+                 + W_DISTANCE_IN_BETWEEN * distance_in_between_happiness) \
+                / (W_SPEED + W_PLATOON_SIZE + W_DISTANCE_TO_END + W_DISTANCE_IN_BETWEEN)
+    return happiness, speed_happiness, platoon_size_happiness, distance_to_end_happiness, distance_in_between_happiness
+
+
 def calc_current_happiness_to_neighbor(car, neighbor, full_print=False):
     """
     Calculates the current happiness of a car to a specific neighbor. If neighbor is the own leader or the car itself,
     the happiness is still calculated.
     """
+    if not full_print and (car, neighbor) in current_happiness:
+        return current_happiness[(car, neighbor)]
     desired_speed_car = float(vehicleInfos[car].get_desired_speed())
     is_speed = float(vehicleInfos[neighbor].get_speed())
     members = vehicleInfos[neighbor].get_platoon_members()
@@ -66,14 +125,27 @@ def calc_platoon_size_happiness(size):
     return float(1 - (float(1) / size))
 
 
+def calc_distance_to_end_of_members(car, members):
+    """
+    Returns the distance to end the car is compared with: the first member (in platoon order), which drives at least
+    as far as the car. If no member does, the maximum of all members.
+    """
+    distance_to_end_car = DistanceToEnd.get(car)
+    # The per step maximum of the platoon decides without looking at single members, if no member drives further.
+    distance_to_end_neighbor = DistanceToEnd.get_max_of_members(members, exclude=car)
+    if distance_to_end_car <= distance_to_end_neighbor:
+        distance_to_end_neighbor = 0
+        for member in members:
+            if member != car:
+                distance_to_end_neighbor = max(DistanceToEnd.get(member), distance_to_end_neighbor)
+                if distance_to_end_car <= distance_to_end_neighbor:
+                    break
+    return distance_to_end_neighbor
+
+
 def calc_distance_to_end_happiness(car, members):
-    distance_to_end_car = plexe.get_distance_to_end(car)
-    distance_to_end_neighbor = 0
-    for member in members:
-        if member != car:
-            distance_to_end_neighbor = max(plexe.get_distance_to_end(member), distance_to_end_neighbor)
-            if distance_to_end_car <= distance_to_end_neighbor:
-                break
+    distance_to_end_car = DistanceToEnd.get(car)
+    distance_to_end_neighbor = calc_distance_to_end_of_members(car, members)
     if distance_to_end_neighbor == 0:
         return 0
     else:
@@ -100,6 +172,17 @@ def calc_new_happiness(car, best_neighbor):
     return 0
 
 
+def __calc_new_entries(car, candidates):
+    """
+    Calculates the happiness to all candidates without an entry in the happiness table of the car in one batch.
+    These are read right after by the algorithm, when it opens their entries.
+    """
+    happiness = vehicleInfos[car].get_happiness_table()
+    pairs = [(car, candidate) for candidate in candidates if candidate not in happiness]
+    if len(pairs) > 0:
+        current_happiness.update(zip(pairs, calc_happiness_batch(pairs)[0].tolist()))
+
+
 def __e_greedy(car, candidates):
     happiness = vehicleInfos[car].get_happiness_table()
     best_value = 0
@@ -111,6 +194,7 @@ def __e_greedy(car, candidates):
             best_neighbor = candidates[random.randint(0, len(candidates) - 1)]
 
         else:
+            __calc_new_entries(car, candidates)
             for candidate in candidates:
                 # If no entry exists, a new entry is opened
                 # suggestion time.
@@ -142,6 +226,7 @@ def __ucb1(car, candidates):
     amount_of_tries = 0
 
     if len(candidates) > 0:
+        __calc_new_entries(car, candidates)
         for candidate in candidates:
             # If no entry exists, a new entry is opened
             # suggestion time.
@@ -175,6 +260,7 @@ def __bayes_ucb(car, candidates):
     best_neighbor = None
 
     if len(candidates) > 0:
+        __calc_new_entries(car, candidates)
         for candidate in candidates:
             # If no entry exists, a new entry is opened
             # suggestion time.
@@ -215,20 +301,25 @@ def __thompson_sampling(car, candidates):
     best_neighbor = None
 
     if len(candidates) > 0:
-        for candidate in candidates:
+        __calc_new_entries(car, candidates)
+        alphas = np.empty(len(candidates))
+        betas = np.empty(len(candidates))
+        for i, candidate in enumerate(candidates):
             # If no entry exists, a new entry is opened
             # suggestion time.
             if candidate not in happiness:
                 new_happiness = calc_current_happiness_to_neighbor(car, candidate)
                 vehicleInfos[car].update_happiness(candidate, new_happiness, INITIAL_ALPHA, INITIAL_BETA)
 
-            # looking for the match with highest value stored in the table.
-            alpha = vehicleInfos[car].get_happiness_param1(candidate)
-            beta = vehicleInfos[car].get_happiness_param2(candidate)
-            sample = np.random.beta(alpha, beta)
+            alphas[i] = vehicleInfos[car].get_happiness_param1(candidate)
+            betas[i] = vehicleInfos[car].get_happiness_param2(candidate)
 
-            if sample >= best_value:
-                best_value = sample
+        # looking for the match with highest value stored in the table.
+        # One beta sample per candidate, drawn in candidate order with a single call.
+        samples = np.random.beta(alphas, betas)
+        for i, candidate in enumerate(candidates):
+            if samples[i] >= best_value:
+                best_value = samples[i]
                 best_neighbor = candidate
 
         # Update the best fitting candidate with current happiness.
@@ -371,5 +462,9 @@ def filter_neighbors(car, neighbors):
 def processing_neighbor_search(car, neighbors):
     candidates = filter_neighbors(car, neighbors)
     vehicleInfos[car].set_candidates(candidates)
-    update_happiness_table(car, candidates)
-    return choose_best_neighbor(car, candidates)
+
+    try:
+        update_happiness_table(car, candidates)
+        return choose_best_neighbor(car, candidates)
+    finally:
+        current_happiness.clear()
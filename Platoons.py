@@ -0,0 +1,110 @@
+"""
+Registry of the running platoons.
+A Platoon is created by init_platoon_leader and keeps its id while the leadership is handed over to another member
+(fix_order). It owns the member list (the leader is the first member), the sum of the desired speeds of all members and
+caches the lane and road of its leader per simulation step, so per platoon queries need no lookups over the members.
+"""
+
+from collections import OrderedDict
+
+import VehicleSnapshot
+from CONSTANTS import VEHICLE_LENGTH, INTER_VERHICLE_DISTANCE
+
+
+class Platoon:
+    def __init__(self, platoon_id, leader):
+        self.id = platoon_id
+        self.leader = leader
+        self.members = []
+        self.speed_sum = 0.0
+        self.__version = -1
+        self.__lane = None
+        self.__road = None
+
+    def size(self):
+        return len(self.members)
+
+    def length(self):
+        """
+        Length of the platoon including the gaps between the members.
+        """
+        return max(len(self.members), 1) * (VEHICLE_LENGTH + INTER_VERHICLE_DISTANCE)
+
+    def desired_speed(self):
+        """
+        Average of the desired speeds of all members.
+        """
+        return self.speed_sum / max(len(self.members), 1)
+
+    def last_member(self):
+        return self.members[-1] if self.members else self.leader
+
+    def __update(self):
+        if self.__version != VehicleSnapshot.version:
+            self.__lane = VehicleSnapshot.get_lane_index(self.leader)
+            self.__road = VehicleSnapshot.get_road_id(self.leader)
+            self.__version = VehicleSnapshot.version
+
+    def lane(self):
+        self.__update()
+        return self.__lane
+
+    def road(self):
+        self.__update()
+        return self.__road
+
+    def set_leader(self, leader):
+        self.leader = leader
+        self.__version = -1
+
+
+next_id = 0
+# id -> Platoon, in the order of creation
+platoons = OrderedDict()
+# leader -> Platoon
+leaders = {}
+
+
+def reset():
+    """
+    Removes all platoons. Has to be called at the start of every simulation.
+    """
+    global next_id
+    next_id = 0
+    platoons.clear()
+    leaders.clear()
+
+
+def create(leader):
+    global next_id
+    platoon = Platoon(next_id, leader)
+    next_id += 1
+    platoons[platoon.id] = platoon
+    leaders[leader] = platoon
+    return platoon
+
+
+def dissolve(platoon):
+    """
+    Removes the platoon from the registry. The member list is left untouched.
+    """
+    platoons.pop(platoon.id, None)
+    if leaders.get(platoon.leader) is platoon:
+        del leaders[platoon.leader]
+
+
+def hand_over(platoon, leader):
+    """
+    Makes another member the leader of the platoon.
+    """
+    if leaders.get(platoon.leader) is platoon:
+        del leaders[platoon.leader]
+    platoon.set_leader(leader)
+    leaders[leader] = platoon
+
+
+def of(leader):
+    """
+    Returns the platoon led by the car or None.
+    """
+    return leaders.get(leader)
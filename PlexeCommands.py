@@ -0,0 +1,136 @@
+"""
+Per tick buffer of the Plexe / TraCI setters of the platoon reconfiguration.
+Tearing down and rebuilding a platoon (init_platoon_leader, add_platoon_member, reset_to_single_car) writes the same
+parameters of a car several times in one tick, e.g. the controller DRIVER and right afterwards CACC. The setters are
+collected here instead, only the last write of every car and parameter is kept, and the buffer is sent with flush()
+right before the next traci.simulationStep(). SUMO applies all of them in that step anyway, so the result is the same.
+
+Reads of buffered values have to go through this module (get_color). Cars which are removed with
+traci.vehicle.remove() have to be discarded first.
+With PLEXE_COMMAND_BUFFER = False every setter is sent immediately.
+"""
+
+from collections import OrderedDict
+
+import traci
+
+from CONSTANTS import PLEXE_COMMAND_BUFFER
+
+# (car, parameter) -> (target, method, arguments), in the order of the last write
+commands = OrderedDict()
+# [setter calls, sent commands] since the last registry
+statistics = [0, 0]
+
+
+# noinspection PyGlobalUndefined
+def registry(plexe_original):
+    global plexe
+    plexe = plexe_original
+    commands.clear()
+    statistics[0] = statistics[1] = 0
+
+
+def put(car, parameter, target, method, *arguments):
+    statistics[0] += 1
+    if not PLEXE_COMMAND_BUFFER:
+        send(target, method, arguments)
+        return
+    key = (car, parameter)
+    # Re-inserted, so the command is sent after all commands which were written before it.
+    commands.pop(key, None)
+    commands[key] = (target, method, arguments)
+
+
+def send(target, method, arguments):
+    statistics[1] += 1
+    # The method is looked up when it is sent, wrapped methods (Profiler) are counted as well.
+    if target == "plexe":
+        getattr(plexe, method)(*arguments)
+    else:
+        getattr(traci.vehicle, method)(*arguments)
+
+
+def flush():
+    """
+    Sends all buffered commands. Has to be called before every traci.simulationStep().
+    """
+    if not commands:
+        return
+    pending = list(commands.values())
+    commands.clear()
+    for target, method, arguments in pending:
+        send(target, method, arguments)
+
+
+def discard(car):
+    """
+    Drops the buffered commands of the car.
+    """
+    for key in [key for key in commands if key[0] == car]:
+        del commands[key]
+
+
+def get_color(car):
+    command = commands.get((car, "color"))
+    if command is not None:
+        return command[2][1]
+    return traci.vehicle.getColor(car)
+
+
+""" ############################################################################
+                                Plexe
+############################################################################ """
+
+
+def set_active_controller(car, controller):
+    put(car, "controller", "plexe", "set_active_controller", car, controller)
+
+
+def set_fixed_lane(car, lane, safe=True):
+    put(car, "fixed_lane", "plexe", "set_fixed_lane", car, lane, safe)
+
+
+def disable_fixed_lane(car):
+    put(car, "fixed_lane", "plexe", "disable_fixed_lane", car)
+
+
+def enable_auto_lane_changing(car, enable):
+    put(car, "auto_lane_changing", "plexe", "enable_auto_lane_changing", car, enable)
+
+
+def enable_auto_feed(car, enable, leader_id=None, front_id=None):
+    put(car, "auto_feed", "plexe", "enable_auto_feed", car, enable, leader_id, front_id)
+
+
+def set_path_cacc_parameters(car, distance=None, xi=None, omega_n=None, c1=None):
+    put(car, "path_cacc_parameters", "plexe", "set_path_cacc_parameters", car, distance, xi, omega_n, c1)
+
+
+def set_cc_desired_speed(car, speed):
+    put(car, "cc_desired_speed", "plexe", "set_cc_desired_speed", car, speed)
+
+
+def set_acc_headway_time(car, headway):
+    put(car, "acc_headway_time", "plexe", "set_acc_headway_time", car, headway)
+
+
+def add_member(leader, car, position):
+    # One entry per member of the leader
+    put(leader, ("member", car), "plexe", "add_member", leader, car, position)
+
+
+""" ############################################################################
+                                TraCI
+############################################################################ """
+
+
+def set_speed_mode(car, speed_mode):
+    put(car, "speed_mode", "traci", "setSpeedMode", car, speed_mode)
+
+
+def set_speed_factor(car, speed_factor):
+    put(car, "speed_factor", "traci", "setSpeedFactor", car, speed_factor)
+
+
+def set_color(car, color):
+    put(car, "color", "traci", "setColor", car, color)
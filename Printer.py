@@ -1,17 +1,28 @@
 import os
+import sys
+import json
 from math import floor
+from multiprocessing import Pool
 
 import numpy as np
 import csv
+import matplotlib
+# Figures are only saved, the Agg backend needs no display and works in worker processes.
+matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 
 from CONSTANTS import SINGLE_CAR, JOINING_PROCESS, PREPARE_JOINING, PLATOON, MERGING, LEAVING_PROCESS, LEFT, \
     NO_PLATOONING, NEW_SPAWNED, AMOUNT_RANDOM_CARS
+import MetricLoader
+import RunIndex
+import aggregate
 
 BOXPLOTS = True
 ALG_COMPARISON_PLOTS = True
 ALG_DETAILED_PLOTS = True
 HISTOGRAM = True
+RENDER_WORKERS = None           # Processes rendering the figures, None uses all available cores
+RENDER_MANIFEST = "render_manifest.txt"
 COLORS = ['tab:blue', 'tab:orange', 'tab:brown', 'tab:purple', 'tab:cyan', 'tab:olive', 'tab:pink', 'tab:red']
 PLOTNAMES = {
     "__bayes_ucb": "Bayes UCB",
@@ -28,7 +39,7 @@ BIGGER_SIZE = 16
 MEGA_SIZE = 20
 
 
-def main():
+def setup_style():
     plt.rc('font', size=MEDIUM_SIZE)  # controls default text sizes
     plt.rc('axes', titlesize=MEGA_SIZE)  # fontsize of the axes title
     plt.rc('axes', labelsize=MEGA_SIZE)  # fontsize of the x and y labels
@@ -37,51 +48,163 @@ def main():
     plt.rc('legend', fontsize=BIGGER_SIZE)  # legend fontsize
     plt.rc('figure', titlesize=MEGA_SIZE)  # fontsize of the figure title
 
+
+def main():
+    setup_style()
+
     folder = "data"
-    subfolders = os.listdir(folder)
+    runs = run_index(folder)
     if BOXPLOTS:
-        alg_boxplot(folder)
-        print("Boxplots processing")
+        missing = [RunIndex.run_path(folder, record) for records in runs.values() for record in records
+                   if missing_metrics(BOXPLOT_METRICS, [RunIndex.run_path(folder, record)])]
+        if missing:
+            print("Skipping boxplots, " + ", ".join(BOXPLOT_METRICS) + " not monitored in: " + ", ".join(missing))
+        else:
+            alg_boxplot(folder)
+            print("Boxplots processing")
     statistics(folder)
     if HISTOGRAM:
         histogram(folder)
 
-    for subfolder in subfolders:
-        if not (subfolder.endswith(".png") or subfolder.endswith(".txt")):
-            subsubfolders = os.listdir(folder + "/" + subfolder)
-
-            if ALG_COMPARISON_PLOTS:
-                print("Processing Algorithm Comparison Plots in: " + folder + "/" + subfolder)
-                alg_avg_overview(folder + "/" + subfolder)
-
-            if ALG_DETAILED_PLOTS:
-                for subsubfolder in subsubfolders:
-                    if not subsubfolder.endswith(".png"):
-                        path = folder + "/" + subfolder + "/" + subsubfolder
-                        print("Detailed Plots in Path: " + path)
-
-                        average_platoon_size(path)
-                        desired_current_speed(path)
-                        happiness_overview(path)
-                        neighbourhood(path)
-                        single_car_happiness_change_rate(path)
-                        states(path)
+    jobs = []
+    if ALG_COMPARISON_PLOTS:
+        for seed in sorted(set(record["seed"] for records in runs.values() for record in records)):
+            jobs.append(("alg_avg_overview", folder + "/" + str(seed)))
+
+    if ALG_DETAILED_PLOTS:
+        for records in runs.values():
+            for record in records:
+                for plot in DETAILED_PLOTS:
+                    jobs.append((plot, RunIndex.run_path(folder, record)))
+
+    renderable = []
+    for plot, path in jobs:
+        missing = missing_metrics(PLOTS[plot][0], directories_of(plot, path))
+        if missing:
+            print("Skipping " + plot + " in " + path + ", not monitored: " + ", ".join(missing))
+        else:
+            renderable.append((plot, path))
+    render(renderable, folder + "/" + RENDER_MANIFEST, force="--force" in sys.argv)
+
+
+""" ############################################################################
+                                Rendering pipeline
+############################################################################ """
+# plot -> (metrics it reads, figures it saves). The comparison plot reads the metrics of all algorithm folders.
+PLOTS = {
+    "alg_avg_overview": (("platoon_size", "happiness"), ("AVG_Platoon_Size.png", "AVG_Happiness.png")),
+    "average_platoon_size": (("platoon_size", "happiness"), ("Platoon Size vs Happiness.png",)),
+    "desired_current_speed": (("speed", "desired_speed", "desired_platoon_speed"),
+                              ("Speed Loss.png", "Amount of Cars.png")),
+    "happiness_overview": (("happiness", "speed_happiness", "platoon_size_happiness", "distance_to_end_happiness",
+                            "distance_in_between_happiness"), ("Happiness Overview.png",)),
+    "neighbourhood": (("neighborhood", "candidatehood"), ("Neighborhood.png",)),
+    "single_car_happiness_change_rate": (("happiness",), ("Happiness Change Rate Single Car.png",)),
+    "states": (("states",), ("States_Of_Cars_Relative.png", "States_Of_Cars_Absolut.png"))
+}
+BOXPLOT_METRICS = ("platoon_size", "happiness")
+DETAILED_PLOTS = ("average_platoon_size", "desired_current_speed", "happiness_overview", "neighbourhood",
+                  "single_car_happiness_change_rate", "states")
+
+
+def directories_of(plot, path):
+    """
+    Returns the run directories a figure job reads.
+    """
+    if plot == "alg_avg_overview":
+        return [path + "/" + subsubfolder for subsubfolder in sorted(os.listdir(path))
+                if not subsubfolder.endswith(".png")]
+    return [path]
+
+
+def inputs_of(plot, path):
+    """
+    Returns the monitoring files a figure job depends on.
+    """
+    metrics, figures = PLOTS[plot]
+    return [source for directory in directories_of(plot, path) for metric in metrics
+            for source in MetricLoader.sources(directory, metric)]
+
+
+def missing_metrics(metrics, directories):
+    """
+    Returns the metrics which have no files in one of the directories (disabled in MONITORING_METRICS). Plots which
+    combine them are skipped instead of failing in the worker.
+    """
+    return [metric for metric in metrics
+            if not all(MetricLoader.exists(directory, metric) for directory in directories)]
+
+
+def signature(plot, path):
+    """
+    Modification times of all inputs. A job is rendered again as soon as its signature changes.
+    """
+    return sorted([source, os.path.getmtime(source)] for source in inputs_of(plot, path))
+
+
+def is_up_to_date(plot, path, manifest):
+    metrics, figures = PLOTS[plot]
+    key = plot + ":" + path
+    return key in manifest and manifest[key] == signature(plot, path) and \
+        all(os.path.exists(path + "/" + figure) for figure in figures)
+
+
+def render_job(job):
+    """
+    Renders one figure job in a worker process. Returns (job, signature) or None if it failed.
+    """
+    plot, path = job
+    try:
+        current = signature(plot, path)
+        print("Rendering " + plot + " in: " + path)
+        globals()[plot](path)
+        return job, current
+    except Exception as e:
+        print("Rendering " + plot + " in " + path + " failed: " + str(e))
+        return None
+
+
+def render(jobs, manifest_path, force=False, workers=RENDER_WORKERS):
+    """
+    Renders all jobs, whose inputs changed since the last render, on a process pool.
+    The signatures of the rendered jobs are stored in the manifest.
+    """
+    manifest = {}
+    if os.path.exists(manifest_path) and not force:
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
+
+    pending = [job for job in jobs if force or not is_up_to_date(job[0], job[1], manifest)]
+    print("Rendering " + str(len(pending)) + " of " + str(len(jobs)) + " figure jobs")
+    if pending:
+        pool = Pool(processes=workers, initializer=setup_style)
+        try:
+            for result in pool.imap_unordered(render_job, pending):
+                if result is not None:
+                    (plot, path), current = result
+                    manifest[plot + ":" + path] = current
+        finally:
+            pool.close()
+            pool.join()
+
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+
+
+def run_index(path):
+    """
+    Returns the runs of the data folder grouped by algorithm, see RunIndex. Data folders from before the index are
+    indexed from their setup.txt files once.
+    """
+    if not RunIndex.exists(path):
+        RunIndex.import_setup_files(path)
+    return RunIndex.by_algorithm(RunIndex.read(path))
 
 
 def statistics(path):
-    tmp_subfolders = os.listdir(path)
-    subfolders = []
-    # Seeds
-    for s in tmp_subfolders:
-        if not (s.endswith(".png") or s.endswith(".txt")):
-            subfolders.append(s)
-
+    runs = run_index(path)
     # Algorithm folder names
-    tmp_algorithms = os.listdir(path + "/" + subfolders[0])
-    algorithms = []
-    for a in tmp_algorithms:
-        if not (a.endswith(".png") or a.endswith(".txt")):
-            algorithms.append(a)
+    algorithms = list(runs.keys())
 
     mean_time = [0 for a in xrange(len(algorithms))]
     mean_crashes = [0 for a in xrange(len(algorithms))]
@@ -100,41 +223,14 @@ def statistics(path):
     # For each algorithm
     for a in range(len(algorithms)):
 
-        amount_of_seeds = len(subfolders)
-        times = np.zeros(len(subfolders))
-        crashes = np.zeros(len(subfolders))
-        changes = np.zeros(len(subfolders))
-        changes_abort = np.zeros(len(subfolders))
-        merges = np.zeros(len(subfolders))
-        merges_abort = np.zeros(len(subfolders))
-
-        # Look at each seed
-        cnt = 0
-        for subfolder in subfolders:
-            full_path = path + "/" + subfolder + "/" + algorithms[a]
-            f = open(full_path + "/setup.txt", "r")
-            for line in f:
-                if "TIME STEPS" in line:
-                    line = line.lstrip("TIME STEPS (in seconds) : ")
-                    times[cnt] = float(line)
-                elif "CRASHED CARS" in line:
-                    line = line.lstrip("CRASHED CARS : ")
-                    crashes[cnt] = float(line)
-                elif "PLATOON CHANGES" in line:
-                    line = line.lstrip("DIRECT PLATOON CHANGES : ")
-                    changes[cnt] = float(line)
-                elif "ABORTED CHANGES" in line:
-                    line = line.lstrip("ABORTED CHANGES FROM ABOVE : ")
-                    changes_abort[cnt] = float(line)
-                elif "MERGED PLATOONS" in line:
-                    line = line.lstrip("MERGED PLATOONS : ")
-                    merges[cnt] = float(line)
-                elif "ABORTED MERGE" in line:
-                    line = line.lstrip("ABORTED MERGE FROM ABOVE: ")
-                    merges_abort[cnt] = float(line)
-            cnt += 1
-
-        f.close()
+        records = runs[algorithms[a]]
+        amount_of_seeds = len(records)
+        times = np.array([record["time"] for record in records], dtype=np.float64)
+        crashes = np.array([record["counters"]["crashes"] for record in records], dtype=np.float64)
+        changes = np.array([record["counters"]["changes"] for record in records], dtype=np.float64)
+        changes_abort = np.array([record["counters"]["changes_aborted"] for record in records], dtype=np.float64)
+        merges = np.array([record["counters"]["merges"] for record in records], dtype=np.float64)
+        merges_abort = np.array([record["counters"]["merges_aborted"] for record in records], dtype=np.float64)
 
         mean_time[a] = np.mean(times) #0
         mean_crashes[a] = np.mean(crashes) #1
@@ -208,19 +304,9 @@ def autolabel(rects, ax):
 
 
 def histogram(path):
-    tmp_subfolders = os.listdir(path)
-    subfolders = []
-    # Seeds
-    for s in tmp_subfolders:
-        if not (s.endswith(".png") or s.endswith(".txt")):
-            subfolders.append(s)
-
+    runs = run_index(path)
     # Algorithm folder names
-    tmp_algorithms = os.listdir(path + "/" + subfolders[0])
-    algorithms = []
-    for a in tmp_algorithms:
-        if not (a.endswith(".png") or a.endswith(".txt")):
-            algorithms.append(a)
+    algorithms = list(runs.keys())
 
 
     single_car_data = [[] for a in xrange(len(algorithms))]
@@ -235,8 +321,8 @@ def histogram(path):
             happiness_changes_single_car = None
             happiness_changes_platoon = None
 
-            for subfolder in subfolders:
-                full_path = path + "/" + subfolder + "/" + algorithms[a]
+            for record in runs[algorithms[a]]:
+                full_path = RunIndex.run_path(path, record)
 
                 happiness_changes_single_car = extract_and_concatenate(full_path + "/happiness_change_monitor_vehicle.csv", happiness_changes_single_car)
                 happiness_changes_platoon = extract_and_concatenate(full_path + "/happiness_change_monitor_platoon.csv", happiness_changes_platoon)
@@ -336,17 +422,9 @@ def make_boxplot(path, x_tick1, x_tick2, platoon_size_data, xlabel, ylabel, titl
 
 
 def alg_boxplot(path):
-    tmp_subfolders = os.listdir(path)
-    subfolders = []
-    for s in tmp_subfolders:
-        if not (s.endswith(".png") or s.endswith(".txt")):
-            subfolders.append(s)
-
-    tmp_algorithms = os.listdir(path + "/" + subfolders[0])
-    algorithms = []
-    for a in tmp_algorithms:
-        if not (a.endswith(".png") or a.endswith(".txt")):
-            algorithms.append(a)
+    runs = run_index(path)
+    algorithms = list(runs.keys())
+    amount_of_seeds = max(len(records) for records in runs.values())
 
     timesteps = np.arange(50, 600, 50)
     #       Aufrufreihenfolge data[algorithm][timestep]
@@ -354,27 +432,19 @@ def alg_boxplot(path):
     average_happiness = [[[] for i in xrange(len(timesteps))] for a in xrange(len(algorithms))]
 
     for a in range(len(algorithms)):
-        for subfolder in subfolders:
-            full_path = path + "/" + subfolder + "/" + algorithms[a]
+        for record in runs[algorithms[a]]:
+            full_path = RunIndex.run_path(path, record)
 
-            platoon_size = csv_to_array(full_path + "/platoon_size.csv")
-            happiness = csv_to_array(full_path + "/happiness.csv")
+            platoon_size, happiness = aggregate.align(csv_to_array(full_path + "/platoon_size.csv"),
+                                                      csv_to_array(full_path + "/happiness.csv"))
 
-            cnt = 0
-            for step in timesteps:
-                # for every line in array
-                if len(platoon_size) / 2 > step:
-                    platoon_size_step = (platoon_size[step, 1:])
-                    happiness_step = (happiness[step, 1:])
-                    # amount of cars is actually the same
-                    amount_of_cars = np.sum((platoon_size_step > -1))
+            average_platoon_size_all, amount_of_cars = aggregate.average_platoon_size(platoon_size)
+            average_happiness_all = aggregate.ratio(aggregate.sum_present(happiness, amount_of_cars), amount_of_cars)
 
-                    platoon_leaders = np.sum((platoon_size_step > -1) & (platoon_size_step < 1000))
-                    average_platoon_size[a][cnt].append(float(amount_of_cars) / platoon_leaders)
-
-                    happiness_sum = sum(happiness_step) - amount_of_cars + len(happiness_step)
-                    average_happiness[a][cnt].append(float(happiness_sum) / amount_of_cars)
-                cnt += 1
+            # timesteps is sorted, the available ones are the first entries.
+            for cnt, step in enumerate(aggregate.rows_before(platoon_size, timesteps)):
+                average_platoon_size[a][cnt].append(average_platoon_size_all[step])
+                average_happiness[a][cnt].append(average_happiness_all[step])
 
     # One plot for each algorithm.
     # for all algorithms
@@ -421,10 +491,10 @@ def alg_boxplot(path):
     x_tick1 = np.arange(3, len(timesteps) * (len(algorithms)+2) + 1, 7)
     x_tick2 = timesteps
     make_boxplot(path, x_tick1, x_tick2, platoon_size_data, 'Time samples (s)',
-                 "Average Platoon Size", "Average Platoon Size Boxplot (n = " + str(len(subfolders)) + ")", (0.75, 3.25), colorize=True,
+                 "Average Platoon Size", "Average Platoon Size Boxplot (n = " + str(amount_of_seeds) + ")", (0.75, 3.25), colorize=True,
                  legend=algorithms,  amount_of_bars=7)
     make_boxplot(path, x_tick1, x_tick2, happiness_data, 'Time samples (s)',
-                 'Average Happiness', "Average Happiness Boxplot (n = " + str(len(subfolders)) + ")", (0.5, 0.9), colorize=True,
+                 'Average Happiness', "Average Happiness Boxplot (n = " + str(amount_of_seeds) + ")", (0.5, 0.9), colorize=True,
                  legend=algorithms,  amount_of_bars=7)
 
 
@@ -451,31 +521,14 @@ def alg_avg_overview(path):
 
     for subsubfolder in subsubfolders:
         if not subsubfolder.endswith(".png"):
-            platoon_size = csv_to_array(path + "/" + subsubfolder + "/platoon_size.csv")
-            happiness = csv_to_array(path + "/" + subsubfolder + "/happiness.csv")
-
-            time = (platoon_size[:, 0])
-            average_platoon_size = np.zeros(len(time))
-            average_happiness = np.zeros(len(time))
-            cut_off_cnt = 0
-
-            for i in range(len(time)):
-                # for every line in array
-                platoon_size_step = (platoon_size[i, 1:])
-                happiness_step = (happiness[i, 1:])
+            platoon_size, happiness = aggregate.align(csv_to_array(path + "/" + subsubfolder + "/platoon_size.csv"),
+                                                      csv_to_array(path + "/" + subsubfolder + "/happiness.csv"))
 
-                # amount of cars is actually the same
-                amount_of_cars = np.sum((platoon_size_step > -1))
-
-                # division zero.
-                if amount_of_cars > 0:
-                    platoon_leaders = np.sum((platoon_size_step > -1) & (platoon_size_step < 1000))
-                    average_platoon_size[i] = float(amount_of_cars) / platoon_leaders
-
-                    happiness_sum = sum(happiness_step) - amount_of_cars + len(happiness_step)
-                    average_happiness[i] = float(happiness_sum) / amount_of_cars
-                else:
-                    cut_off_cnt += 1
+            time = aggregate.time(platoon_size)
+            average_platoon_size, amount_of_cars = aggregate.average_platoon_size(platoon_size)
+            average_platoon_size = aggregate.where_cars(average_platoon_size, amount_of_cars)
+            average_happiness = aggregate.average(happiness, amount_of_cars)
+            cut_off_cnt = aggregate.cut_off(amount_of_cars)
 
             color = COLORS[cnt]
             label = PLOTNAMES[subsubfolder]
@@ -499,14 +552,7 @@ def single_car_happiness_change_rate(path):
     time = (happiness[:, 0])
     cars = [10, 20, 30, 40]
 
-    car_happiness = np.zeros((len(cars), len(time)))
-
-    for i in range(len(time)):
-        # for every line in array
-        happiness_step = (happiness[i, 1:])
-
-        for j in range(len(cars)):
-            car_happiness[j, i] = happiness_step[cars[j]]
+    car_happiness = aggregate.cars(happiness)[:, cars].T
 
     # Plotting
     fig, ax1 = plt.subplots()
@@ -528,9 +574,8 @@ def single_car_happiness_change_rate(path):
 
 
 def csv_to_array(path):
-    with open(path, 'r') as f:
-        array = list(csv.reader(f, delimiter=","))
-        return np.array(array[2:], dtype=np.float)
+    # Parsed once per run and metric, see MetricLoader.
+    return MetricLoader.load_file(path)
 
 
 def happiness_overview(path):
@@ -539,47 +584,23 @@ def happiness_overview(path):
     platoon_size_happiness = csv_to_array(path + "/platoon_size_happiness.csv")
     distance_to_end_happiness = csv_to_array(path + "/distance_to_end_happiness.csv")
     distance_in_between_happiness = csv_to_array(path + "/distance_in_between_happiness.csv")
+    happiness, speed_happiness, platoon_size_happiness, distance_to_end_happiness, distance_in_between_happiness = \
+        aggregate.align(happiness, speed_happiness, platoon_size_happiness, distance_to_end_happiness,
+                        distance_in_between_happiness)
 
-    time = (happiness[:, 0])
-
-    average_happiness = np.zeros(len(time))
-    average_speed_happiness = np.zeros(len(time))
-    average_platoon_size_happiness = np.zeros(len(time))
-    average_distance_to_end_happiness = np.zeros(len(time))
-    average_distance_in_between_happiness = np.zeros(len(time))
-
-    cut_off_cnt = 0
-
-    for i in range(len(time)):
-        # for every line in array
-        happiness_step = (happiness[i, 1:])
-        speed_happiness_step = (speed_happiness[i, 1:])
-        platoon_size_happiness_step = (platoon_size_happiness[i, 1:])
-        distance_to_end_happiness_step = (distance_to_end_happiness[i, 1:])
-        distance_in_between_happiness_step = (distance_in_between_happiness[i, 1:])
-
-        # amount of cars is actually the same
-        amount_of_cars = np.sum((happiness_step > -1))
+    time = aggregate.time(happiness)
 
-        # division zero.
-        if amount_of_cars > 0:
-            happiness_sum = sum(happiness_step) + (len(happiness_step) - amount_of_cars)
-            average_happiness[i] = (float(happiness_sum) / amount_of_cars)
+    # amount of cars is actually the same
+    amount_of_cars = aggregate.amount_of_cars(happiness)
 
-            speed_happiness_sum = sum(speed_happiness_step) + (len(happiness_step) - amount_of_cars)
-            average_speed_happiness[i] = (float(speed_happiness_sum) / amount_of_cars)
+    average_happiness = aggregate.average(happiness, amount_of_cars)
+    average_speed_happiness = aggregate.average(speed_happiness, amount_of_cars)
+    average_platoon_size_happiness = aggregate.average(platoon_size_happiness, amount_of_cars)
+    average_distance_to_end_happiness = aggregate.average(distance_to_end_happiness, amount_of_cars)
+    average_distance_in_between_happiness = aggregate.average(distance_in_between_happiness, amount_of_cars)
 
-            platoon_size_happiness_sum = sum(platoon_size_happiness_step) + (len(happiness_step) - amount_of_cars)
-            average_platoon_size_happiness[i] = (float(platoon_size_happiness_sum) / amount_of_cars)
-
-            distance_to_end_happiness_sum = sum(distance_to_end_happiness_step) + (len(happiness_step) - amount_of_cars)
-            average_distance_to_end_happiness[i] = (float(distance_to_end_happiness_sum) / amount_of_cars)
-
-            distance_in_between_happiness_sum = sum(distance_in_between_happiness_step) + (
-                    len(happiness_step) - amount_of_cars)
-            average_distance_in_between_happiness[i] = (float(distance_in_between_happiness_sum) / amount_of_cars)
-        else:
-            cut_off_cnt += 1
+    # division zero.
+    cut_off_cnt = aggregate.cut_off(amount_of_cars)
 
     x_data = time[cut_off_cnt:]
     y_data = average_happiness[cut_off_cnt:], average_speed_happiness[cut_off_cnt:], \
@@ -592,36 +613,23 @@ def happiness_overview(path):
 def states(path):
     state_list = csv_to_array(path + "/states.csv")
 
-    time = (state_list[:, 0])
-    single_car_cnt = np.zeros(len(time))
-    join_cnt = np.zeros(len(time))
-    platoon_cnt = np.zeros(len(time))
-    leave_cnt = np.zeros(len(time))
-    no_platoon_cnt = np.zeros(len(time))
-    amount_of_cars_cnt = np.zeros(len(time))
-    cut_off_cnt = 0
-
-    for i in range(len(time)):
-        # for every line in array
-        states_step = (state_list[i, 1:])
-
-        # amount of cars is actually the same
-        amount_of_cars = np.count_nonzero(states_step != -1)
-
-        # division zero.
-        if amount_of_cars > 0:
-            single_car_cnt[i] = float(np.count_nonzero(states_step == SINGLE_CAR)) / AMOUNT_RANDOM_CARS
-            join_cnt[i] = float(
-                np.count_nonzero((states_step == PREPARE_JOINING) | (states_step == JOINING_PROCESS))) / AMOUNT_RANDOM_CARS
-            platoon_cnt[i] = float(
-                np.count_nonzero((states_step == PLATOON) | (states_step == MERGING))) / AMOUNT_RANDOM_CARS
-            leave_cnt[i] = float(
-                np.count_nonzero((states_step == LEAVING_PROCESS) | (states_step == LEFT))) / AMOUNT_RANDOM_CARS
-            no_platoon_cnt[i] = float(
-                np.count_nonzero((states_step == NO_PLATOONING) | (states_step == NEW_SPAWNED))) / AMOUNT_RANDOM_CARS
-            amount_of_cars_cnt[i] = float(amount_of_cars) / AMOUNT_RANDOM_CARS
-        else:
-            cut_off_cnt += 1
+    time = aggregate.time(state_list)
+
+    # amount of cars is actually the same
+    amount_of_cars = aggregate.count(aggregate.cars(state_list) != -1)
+
+    # division zero.
+    single_car_cnt = aggregate.where_cars(
+        aggregate.count_in(state_list, [SINGLE_CAR]) / float(AMOUNT_RANDOM_CARS), amount_of_cars)
+    join_cnt = aggregate.where_cars(
+        aggregate.count_in(state_list, [PREPARE_JOINING, JOINING_PROCESS]) / float(AMOUNT_RANDOM_CARS), amount_of_cars)
+    platoon_cnt = aggregate.where_cars(
+        aggregate.count_in(state_list, [PLATOON, MERGING]) / float(AMOUNT_RANDOM_CARS), amount_of_cars)
+    leave_cnt = aggregate.where_cars(
+        aggregate.count_in(state_list, [LEAVING_PROCESS, LEFT]) / float(AMOUNT_RANDOM_CARS), amount_of_cars)
+    no_platoon_cnt = aggregate.where_cars(
+        aggregate.count_in(state_list, [NO_PLATOONING, NEW_SPAWNED]) / float(AMOUNT_RANDOM_CARS), amount_of_cars)
+    amount_of_cars_cnt = amount_of_cars / float(AMOUNT_RANDOM_CARS)
 
     # Plotting
     fig, ax1 = plt.subplots()
@@ -682,34 +690,11 @@ def states(path):
 def neighbourhood(path):
     neighboorhood = csv_to_array(path + "/neighborhood.csv")
     candidatehood = csv_to_array(path + "/candidatehood.csv")
+    neighboorhood, candidatehood = aggregate.align(neighboorhood, candidatehood)
 
-    time = (neighboorhood[:, 0])
-    average_neighborhood = np.zeros(len(time))
-    average_candidatehood = np.zeros(len(time))
-    cut_off_cnt = 0
-
-    for i in range(len(time)):
-        # for every line in array
-        neighborhood_step = neighboorhood[i, 1:]
-        candidatehood_step = candidatehood[i, 1:]
-
-        # amount of cars is actually the same
-        amount_of_cars = np.sum((neighborhood_step != -1))
-        # counts -2 in candidatehood step. This signals a existing car not in State Platoon or Single_car
-        amount_of_cars_in_wrong_state = np.sum((candidatehood_step == -2))
-        amount_of_single_and_platoon_cars = amount_of_cars - amount_of_cars_in_wrong_state
-
-        # division zero.
-        if amount_of_single_and_platoon_cars > 0:
-            neighborhood_sum = sum(neighborhood_step) - amount_of_cars + len(
-                neighborhood_step) + 2 * amount_of_cars_in_wrong_state
-            candidate_sum = sum(candidatehood_step) - amount_of_cars + len(
-                neighborhood_step) + 2 * amount_of_cars_in_wrong_state
-            average_neighborhood[i] = float(neighborhood_sum) / amount_of_single_and_platoon_cars
-            average_candidatehood[i] = float(candidate_sum) / amount_of_single_and_platoon_cars
-
-        else:
-            cut_off_cnt += 1
+    time = aggregate.time(neighboorhood)
+    average_neighborhood, average_candidatehood, amount_of_single_and_platoon_cars = \
+        aggregate.average_neighborhood(neighboorhood, candidatehood)
 
     x_data = time
     y_data = average_neighborhood, average_candidatehood
@@ -738,32 +723,16 @@ def make_plot(path, x_data, y_data, xlabel, ylabel, title, data_labels=None):
 
 
 def average_platoon_size(path):
-    platoon_size = csv_to_array(path + "/platoon_size.csv")
-    happiness = csv_to_array(path + "/happiness.csv")
-
-    time = (platoon_size[:, 0])
-    average_platoon_size = np.zeros(len(time))
-    average_happiness = np.zeros(len(time))
-
-    cut_off_cnt = 0
+    platoon_size, happiness = aggregate.align(csv_to_array(path + "/platoon_size.csv"),
+                                              csv_to_array(path + "/happiness.csv"))
 
-    for i in range(len(time)):
-        # for every line in array
-        platoon_size_step = (platoon_size[i, 1:])
-        happiness_step = (happiness[i, 1:])
+    time = aggregate.time(platoon_size)
+    average_platoon_size, amount_of_cars = aggregate.average_platoon_size(platoon_size)
+    average_platoon_size = aggregate.where_cars(average_platoon_size, amount_of_cars)
+    average_happiness = aggregate.average(happiness, amount_of_cars)
 
-        # amount of cars is actually the same
-        amount_of_cars = np.sum((platoon_size_step > -1))
-
-        # division zero.
-        if amount_of_cars > 0:
-            platoon_leaders = np.sum((platoon_size_step > -1) & (platoon_size_step < 1000))
-            average_platoon_size[i] = float(amount_of_cars) / platoon_leaders
-
-            happiness_sum = sum(happiness_step) - amount_of_cars + len(happiness_step)
-            average_happiness[i] = float(happiness_sum) / amount_of_cars
-        else:
-            cut_off_cnt += 1
+    # division zero.
+    cut_off_cnt = aggregate.cut_off(amount_of_cars)
 
     # Plotting
     fig, ax1 = plt.subplots()
@@ -792,34 +761,15 @@ def desired_current_speed(path):
     speed = csv_to_array(path + "/speed.csv")
     desired_speed = csv_to_array(path + "/desired_speed.csv")
     desired_platoon_speed = csv_to_array(path + "/desired_platoon_speed.csv")
+    speed, desired_speed, desired_platoon_speed = aggregate.align(speed, desired_speed, desired_platoon_speed)
 
-    desired_speed_difference = abs(speed - desired_speed)
-    desired_platoon_speed_difference = abs(speed - desired_platoon_speed)
-
-    time = (speed[:, 0])
-    sum_desired_speed_difference = np.zeros(len(time))
-    sum_desired_platoon_speed_difference = np.zeros(len(time))
-    amount_of_cars_array = np.zeros(len(time))
-
-    for i in range(len(time)):
-        # for every line in array
-        desired_speed_difference_step = (desired_speed_difference[i, 1:])
-        desired_platoon_speed_difference_step = (desired_platoon_speed_difference[i, 1:])
-        speed_step = (speed[i, 1:])
-
-        # amount of cars is actually the same
-        amount_of_cars = np.sum((speed_step > -1))
-
-        if amount_of_cars > 0:
-            # - amount_of_cars + len(speed_step) removes all -1 in this array.
-            sum_speed = sum(speed_step) - amount_of_cars + len(speed_step)
-            sum_desired_speed_difference[i] = sum(desired_speed_difference_step) / sum_speed
-            sum_desired_platoon_speed_difference[i] = sum(desired_platoon_speed_difference_step) / sum_speed
-            amount_of_cars_array[i] = amount_of_cars
-        else:
-            sum_desired_speed_difference[i] = 0
-            sum_desired_platoon_speed_difference[i] = 0
-            amount_of_cars_array[i] = 0
+    time = aggregate.time(speed)
+
+    # amount of cars is actually the same
+    amount_of_cars_array = aggregate.amount_of_cars(speed)
+    sum_desired_speed_difference = aggregate.relative_speed_loss(speed, desired_speed, amount_of_cars_array)
+    sum_desired_platoon_speed_difference = aggregate.relative_speed_loss(speed, desired_platoon_speed,
+                                                                         amount_of_cars_array)
 
     x_data = time
     y_data = sum_desired_speed_difference, sum_desired_platoon_speed_difference
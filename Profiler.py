@@ -0,0 +1,131 @@
+"""
+Opt-in profiling of a simulation run, enabled with PROFILING or the --profile argument.
+Two kinds of measurements are collected and written to data/<seed>/<mode>/profile.txt next to setup.txt:
+
+    sections    wall time of the parts of the main loop in PlatooningAPI (spawn, removal, neighbors, the handler of
+                every state, monitoring, ...), started with start() and ended with stop()
+    API calls   number and latency of every traci / plexe method, the methods are wrapped by instrument_api()
+
+Disabled, start() and stop() only check a flag and no method is wrapped.
+"""
+
+import sys
+from timeit import default_timer as clock
+
+import CONSTANTS
+
+enabled = CONSTANTS.PROFILING or "--profile" in sys.argv
+
+REPORT_FILE = "profile.txt"
+
+TRACI_METHODS = ("simulationStep",)
+TRACI_VEHICLE_METHODS = ("getIDList", "getSpeed", "getMaxSpeed", "getSpeedFactor", "getLaneIndex", "getAngle",
+                         "getRoadID", "getPosition", "getColor", "getNeighbors", "subscribe",
+                         "getAllSubscriptionResults", "add", "remove", "setSpeedMode", "setSpeedFactor", "setColor")
+PLEXE_METHODS = ("set_fixed_lane", "disable_fixed_lane", "set_active_controller", "enable_auto_lane_changing",
+                 "enable_auto_feed", "add_member", "set_cc_desired_speed", "set_path_cacc_parameters",
+                 "set_acc_headway_time", "get_distance_to_end", "get_crashed", "get_vehicle_data")
+
+# Section name of the handler of every state
+STATES = ("NEW_SPAWNED", "SINGLE_CAR", "PREPARE_JOINING", "JOINING_PROCESS", "PLATOON", "MERGING", "LEAVING_PROCESS",
+          "LEFT", "NO_PLATOONING")
+STATE_SECTIONS = dict((getattr(CONSTANTS, name), "state " + name) for name in STATES)
+
+# name -> [calls, seconds]
+sections = {}
+api_calls = {}
+
+
+def reset():
+    """
+    Clears all measurements. Has to be called at the start of every simulation.
+    """
+    sections.clear()
+    api_calls.clear()
+
+
+def record(table, name, seconds):
+    entry = table.get(name)
+    if entry is None:
+        table[name] = [1, seconds]
+    else:
+        entry[0] += 1
+        entry[1] += seconds
+
+
+def start():
+    """
+    Returns the start time of a section, 0 if profiling is disabled.
+    """
+    if enabled:
+        return clock()
+    return 0
+
+
+def stop(name, started):
+    """
+    Adds the time since started to the section.
+    """
+    if enabled:
+        record(sections, name, clock() - started)
+
+
+def timed(name, function):
+    def wrapper(*args, **kwargs):
+        started = clock()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            record(api_calls, name, clock() - started)
+    wrapper.profiled = True
+    return wrapper
+
+
+def instrument(target, prefix, methods):
+    for method in methods:
+        function = getattr(target, method, None)
+        if function is not None and not getattr(function, "profiled", False):
+            setattr(target, method, timed(prefix + method, function))
+
+
+def instrument_api(traci, plexe):
+    """
+    Wraps the traci and traci.vehicle functions (once per process) and the methods of the Plexe instance of the
+    simulation, so every call is counted.
+    """
+    if not enabled:
+        return
+    instrument(traci, "traci.", TRACI_METHODS)
+    instrument(traci.vehicle, "traci.vehicle.", TRACI_VEHICLE_METHODS)
+    instrument(plexe, "plexe.", PLEXE_METHODS)
+
+
+def table(entries, steps, unit, factor):
+    """
+    Returns the lines of a table, the most expensive entry first.
+    """
+    total = sum(seconds for calls, seconds in entries.values()) or 1
+    lines = []
+    for name, (calls, seconds) in sorted(entries.items(), key=lambda entry: -entry[1][1]):
+        lines.append('%-40s : %10d calls  %10.3f s  %10.2f %s/call  %8.2f calls/step  %5.1f %%'
+                     % (name, calls, seconds, seconds * factor / calls, unit, float(calls) / max(steps, 1),
+                        100.0 * seconds / total))
+    return lines
+
+
+def write_report(directory, steps, wall_time):
+    """
+    Writes the profile of the simulation to directory/profile.txt.
+    """
+    if not enabled:
+        return
+    with open(directory + '/' + REPORT_FILE, 'w') as f:
+        f.write('\n'.join(['STEPS : ' + str(steps),
+                           'WALL TIME (in seconds) : ' + str(round(wall_time, 3)),
+                           '----------------------------------------------------------',
+                           'SECTIONS'] +
+                          table(sections, steps, 'ms', 1000) +
+                          ['----------------------------------------------------------',
+                           'API CALLS : ' + str(sum(calls for calls, seconds in api_calls.values()))] +
+                          table(api_calls, steps, 'us', 1000000) +
+                          ['END ------------------------------------------------------', '']))
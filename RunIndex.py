@@ -0,0 +1,151 @@
+"""
+Append-only index of all simulation runs.
+Every finished simulation appends one JSON record to data/run_index.txt:
+
+    {"seed": 4, "mode": 1, "algorithm": "__ucb1", "run": "4/__ucb1", "step": 60003, "time": 600,
+     "counters": {"cars": 1234, "crashes": 0, ...}, "wall_time": 812.4, "config_hash": "...", "finished": ...}
+
+"run" is the run directory relative to the folder of the index, so copied data folders (e.g. for
+Boxplots_Overall.py) stay valid. A run which is simulated again gets a new record, the reader returns the latest one.
+The analysis scripts find their runs here instead of walking the data folders and parsing setup.txt.
+"""
+
+import errno
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+
+import CONSTANTS
+from CONSTANTS import CAR, CRASH, CHANGE, MERGE, CHANGE_ABORT, MERGE_ABORT, E_GREEDY, UCB1, BAYES_UCB, \
+    THOMPSON_SAMPLING, HEINOVSKI
+
+INDEX_FILE = "run_index.txt"
+
+# Folder name of the runs of each algorithm mode
+ALGORITHMS = OrderedDict([(E_GREEDY, "__e_greedy"),
+                          (UCB1, "__ucb1"),
+                          (BAYES_UCB, "__bayes_ucb"),
+                          (THOMPSON_SAMPLING, "__thompson_sampling"),
+                          (HEINOVSKI, "__heinovski")])
+
+COUNTERS = (("cars", CAR),
+            ("crashes", CRASH),
+            ("changes", CHANGE),
+            ("changes_aborted", CHANGE_ABORT),
+            ("merges", MERGE),
+            ("merges_aborted", MERGE_ABORT))
+
+
+def config_hash():
+    """
+    Short hash over all configuration values in CONSTANTS, runs with the same hash are comparable.
+    """
+    values = sorted((name, repr(getattr(CONSTANTS, name))) for name in dir(CONSTANTS) if name.isupper())
+    return hashlib.sha1(repr(values).encode("utf-8")).hexdigest()[:12]
+
+
+def append(folder, seed, mode, counter, step, wall_time):
+    """
+    Appends the record of a finished run. The record is written with a single write call, so parallel
+    simulations (SweepRunner) can append to the same index. The first record of a data folder imports the runs,
+    which were simulated before the index existed.
+    """
+    if not exists(folder):
+        import_setup_files(folder)
+    algorithm = ALGORITHMS[mode]
+    record = {"seed": seed,
+              "mode": mode,
+              "algorithm": algorithm,
+              "run": str(seed) + "/" + algorithm,
+              "step": step,
+              "time": step // 100,
+              "counters": dict((name, counter[index]) for name, index in COUNTERS),
+              "wall_time": round(wall_time, 3),
+              "config_hash": config_hash(),
+              "finished": round(time.time(), 3)}
+    with open(os.path.join(folder, INDEX_FILE), 'a') as f:
+        f.write(json.dumps(record, sort_keys=True) + "\n")
+
+
+def exists(folder):
+    return os.path.exists(os.path.join(folder, INDEX_FILE))
+
+
+def read(folder):
+    """
+    Returns the latest record of every run (seed, mode), in the order the runs were first recorded.
+    """
+    records = OrderedDict()
+    with open(os.path.join(folder, INDEX_FILE), 'r') as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                records[(record["seed"], record["mode"])] = record
+    return list(records.values())
+
+
+def by_algorithm(records):
+    """
+    Groups the records by algorithm folder name, in mode order and with the runs of each algorithm ordered by seed.
+    """
+    groups = OrderedDict()
+    for record in sorted(records, key=lambda r: (r["mode"], r["seed"])):
+        groups.setdefault(record["algorithm"], []).append(record)
+    return groups
+
+
+def run_path(folder, record):
+    return folder + "/" + record["run"]
+
+
+def import_setup_files(folder):
+    """
+    Builds the index of a data folder from the setup.txt files of runs, which were simulated before the index
+    existed. Wall time and configuration hash of these runs are unknown.
+    Only the process which creates the index imports, an index created in the meantime by a parallel simulation is
+    left as it is.
+    """
+    modes = dict((algorithm, mode) for mode, algorithm in ALGORITHMS.items())
+    names = {"TIME STEPS (in seconds)": "time",
+             "CRASHED CARS": "crashes",
+             "DIRECT PLATOON CHANGES": "changes",
+             "ABORTED CHANGES FROM ABOVE": "changes_aborted",
+             "MERGED PLATOONS": "merges",
+             "ABORTED MERGE FROM ABOVE": "merges_aborted"}
+    lines = []
+    for seed in sorted(os.listdir(folder)):
+        for algorithm in ALGORITHMS.values():
+            setup = os.path.join(folder, seed, algorithm, "setup.txt")
+            if not os.path.exists(setup):
+                continue
+            values = {}
+            with open(setup, 'r') as f:
+                for line in f:
+                    name, separator, value = line.partition(":")
+                    if separator and name.strip() in names:
+                        # Later sessions in the same file overwrite earlier ones.
+                        values[names[name.strip()]] = int(float(value))
+            counters = dict((name, values.get(name, 0)) for name, index in COUNTERS)
+            record = {"seed": int(seed),
+                      "mode": modes[algorithm],
+                      "algorithm": algorithm,
+                      "run": seed + "/" + algorithm,
+                      "step": values.get("time", 0) * 100,
+                      "time": values.get("time", 0),
+                      "counters": counters,
+                      "wall_time": None,
+                      "config_hash": None,
+                      "finished": None}
+            lines.append(json.dumps(record, sort_keys=True) + "\n")
+    try:
+        index = os.open(os.path.join(folder, INDEX_FILE), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except OSError as e:
+        if e.errno == errno.EEXIST:
+            return
+        raise
+    try:
+        os.write(index, "".join(lines).encode("utf-8"))
+    finally:
+        os.close(index)
@@ -0,0 +1,64 @@
+"""
+Runs the seed x algorithm sweep in parallel. Every (seed, mode) pair is simulated in its own worker process with its
+own SUMO instance and TraCI connection label. Counters and glossary entries are collected in the parent process.
+"""
+
+import sys
+from multiprocessing import Pool, cpu_count
+
+import Monitoring
+import PlatooningAPI
+from CONSTANTS import *
+
+
+def run_job(job):
+    """
+    Worker entry point. A job is a tuple (seed, mode, gui).
+    """
+    seed, mode, gui = job
+    label = "sim_%d_%d" % (seed, mode)
+    counter, entry = PlatooningAPI.run_simulation(seed, mode, label=label, gui=gui)
+    return seed, mode, counter, entry
+
+
+def run_sweep(seeds=SEEDS, modes=MODES, workers=SWEEP_WORKERS, gui=False):
+    """
+    Simulates all seeds x modes with a pool of worker processes.
+    Every worker process handles exactly one simulation (maxtasksperchild=1), so module level state like the
+    Monitoring buffers never leaks from one run into the next.
+    Returns a dict {(seed, mode): counter} and the glossary ordered like the sequential sweep.
+    """
+    if workers is None:
+        workers = cpu_count()
+    jobs = [(seed, mode, gui) for seed in seeds for mode in modes]
+
+    counters = {}
+    entries = {}
+    pool = Pool(processes=min(workers, len(jobs)), maxtasksperchild=1)
+    try:
+        for seed, mode, counter, entry in pool.imap_unordered(run_job, jobs):
+            counters[(seed, mode)] = counter
+            entries[(seed, mode)] = entry
+            print("Simulation " + str(seed) + " Mode: " + str(mode) + " finished at step " + str(entry[2]))
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+    glossary = [entries[(seed, mode)] for seed in seeds for mode in modes if (seed, mode) in entries]
+    return counters, glossary
+
+
+def main():
+    workers = SWEEP_WORKERS
+    arguments = [argument for argument in sys.argv[1:] if not argument.startswith("--")]
+    if arguments:
+        workers = int(arguments[0])
+    counters, glossary = run_sweep(workers=workers)
+    Monitoring.writeGlossary(glossary)
+
+
+if __name__ == "__main__":
+    main()
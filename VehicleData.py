@@ -12,114 +12,139 @@ if 'SUMO_HOME' in os.environ:
 else:
     sys.exit("please declare environment variable 'SUMO_HOME'")
 import traci
-from CONSTANTS import DEBUG_HAPPINESS, HAPPINESS_TABLE_SIZE, NEW_SPAWNED, STANDARD_COLOR
+from traci import constants as tc
+import Globals
+import VehicleSnapshot
+import VehicleStore
+import EventLog
+import PlexeCommands
+import Platoons
+from HappinessCache import HappinessCache
+from CONSTANTS import DEBUG_HAPPINESS, HAPPINESS_TABLE_SIZE, STANDARD_COLOR
 
 
 class VehicleData:
+    """
+    View over the slot of a car in the VehicleStore. Numeric information (state, leader, flags, counters, ...) lives
+    in the store columns, lists and dicts (happiness table, neighbors) stay in this object. The members of the platoon
+    of a leader are kept by its Platoon (Platoons registry).
+    """
     def __init__(self, id, desired_speed_factor=0):
         self.__id = id
         self.__floatID = int(id[2:]) + 1000
-        self.__isLeader = False
-        self.__platoonLeader = None
+        self.__store = VehicleStore.store
+        self.__slot = self.__store.allocate(id, desired_speed_factor)
+        EventLog.state_changed(self.__slot, EventLog.REMOVED, self.__store.state[self.__slot])
         self.__desiredPlatoonLeader = None
-        self.__platoonMembers = []
-        self.__desiredPlatoonSpeed = -1
-        self.__posInPlatoon = None
-        self.__state = NEW_SPAWNED
         self.__color = random.uniform(70, 255), random.uniform(70, 255), random.uniform(70, 255), 255
-        self.__happiness_table = {}
-        self.__neighbor_table_pos = 0
-        self.__hasJoiner = False
-        self.__hasLeaver = False
-        self.__desired_speed_factor = desired_speed_factor
-        self.__counter = 0
-        self.__crash_counter = 0
+        self.__happiness_table = HappinessCache(HAPPINESS_TABLE_SIZE)
         self.__neighbors = []
         self.__candidates = []
-        self.__cache = []
-        self.__from_another_platoon = False
-        self.__old_happiness = 0
+
+    def release(self):
+        """
+        Frees the slot in the VehicleStore. Has to be called when the car is removed from vehicleInfos.
+        """
+        EventLog.state_changed(self.__slot, self.__store.state[self.__slot], EventLog.REMOVED)
+        self.__store.release(self.__slot)
 
     """ ############################################################################
                                 Methods for Monitoring
     ############################################################################ """
 
     def set_old_happiness(self, value):
-        self.__old_happiness = value
+        self.__store.old_happiness[self.__slot] = value
 
     def get_old_happiness(self):
-        return self.__old_happiness
+        return float(self.__store.old_happiness[self.__slot])
 
     def is_from_another_platoon(self):
-        return self.__from_another_platoon
+        return bool(self.__store.from_another_platoon[self.__slot])
 
     def set_from_another_platoon(self):
-        self.__from_another_platoon = True
+        self.__store.from_another_platoon[self.__slot] = True
 
     def reset_from_another_platoon(self):
-        self.__from_another_platoon = False
+        self.__store.from_another_platoon[self.__slot] = False
 
     def inc_crash_counter(self):
-        self.__crash_counter += 1
+        self.__store.crash_counter[self.__slot] += 1
 
     def get_crash_counter(self):
-        return self.__crash_counter
+        return int(self.__store.crash_counter[self.__slot])
 
     def reset_crash_counter(self):
-        self.__crash_counter = 0
+        self.__store.crash_counter[self.__slot] = 0
 
     """ ############################################################################
                                 Joiner / Leaver Management
     ############################################################################ """
 
     def inc_counter(self):
-        self.__counter += 1
+        self.__store.counter[self.__slot] += 1
 
     def get_counter(self):
-        return self.__counter
+        return int(self.__store.counter[self.__slot])
 
     def reset_counter(self):
-        self.__counter = 0
+        self.__store.counter[self.__slot] = 0
 
     def has_joiner(self):
-        return self.__hasJoiner
+        return bool(self.__store.has_joiner[self.__slot])
 
     def set_joiner(self):
-        self.__hasJoiner = True
+        self.__store.has_joiner[self.__slot] = True
 
     def reset_joiner(self):
-        self.__hasJoiner = False
+        self.__store.has_joiner[self.__slot] = False
 
     def has_leaver(self):
-        return self.__hasLeaver
+        return bool(self.__store.has_leaver[self.__slot])
 
     def set_leaver(self):
-        self.__hasLeaver = True
+        self.__store.has_leaver[self.__slot] = True
 
     def reset_leaver(self):
-        self.__hasLeaver = False
+        self.__store.has_leaver[self.__slot] = False
 
     """ ############################################################################
                                 Platoon Related
     ############################################################################ """
 
+    def get_platoon(self):
+        """
+        Returns the Platoon led by this car or None.
+        """
+        return Platoons.of(self.__id)
+
     def add_platoon_member(self, member, pos=-1):
+        platoon = Platoons.of(self.__id)
+        if platoon is None:
+            platoon = Platoons.create(self.__id)
         if pos == -1:
-            self.__platoonMembers.append(member)
+            platoon.members.append(member)
         else:
-            self.__platoonMembers.insert(pos, member)
+            platoon.members.insert(pos, member)
+        self.__store.platoon_size[self.__slot] = len(platoon.members)
 
     def remove_platoon_member(self, member):
-        self.__platoonMembers.remove(member)
+        platoon = Platoons.of(self.__id)
+        platoon.members.remove(member)
+        self.__store.platoon_size[self.__slot] = len(platoon.members)
+
+    def set_platoon_members(self, members):
+        platoon = Platoons.of(self.__id)
+        platoon.members = members
+        self.__store.platoon_size[self.__slot] = len(platoon.members)
 
     def set_to_leader(self):
-        self.__isLeader = True
+        self.__store.is_leader[self.__slot] = True
 
     def is_leader(self):
-        return self.__isLeader
+        return bool(self.__store.is_leader[self.__slot])
 
     def is_in_platoon(self):
-        if self.__platoonLeader is None:
+        if self.__store.leader_slot[self.__slot] == VehicleStore.NO_SLOT:
             return False
         return True
 
@@ -148,39 +173,18 @@ class VehicleData:
 
     def update_happiness(self, candidate, new_happiness, param1=0, param2=0):
         """
-        happiness_table =
-        {
-            #KEY  #Happiness     #N                #Param  #Param
-            v1 - [happiness(v1), times_chosen(v1), param1, param2]
-            v4 - [happiness(v4), times_chosen(v4), param1, param2]
-                .
-                .
-                .
-            v6 - [happiness(v6), times_chosen(v6), param1, param2]
-        }
+        Stores the happiness of a candidate in the LRU happiness table (see HappinessCache).
+        The own platoon leader is pinned and never evicted.
         """
-        if candidate in self.__happiness_table:
-            times_chosen = self.__happiness_table[candidate][1]
-            self.__happiness_table[candidate] = [new_happiness, times_chosen + 1, param1, param2]
-            self.__cache.remove(candidate)
-            self.__cache.insert(0, candidate)
-
-        else:
-            self.__happiness_table[candidate] = [new_happiness, 1, param1, param2]
-            self.__cache.insert(0, candidate)
-            if DEBUG_HAPPINESS:
-                print("INSERTED " + candidate + " in cache of vehicle: " + self.__id)
-            if len(self.__happiness_table.values()) > HAPPINESS_TABLE_SIZE:
-                deleted = self.__cache.pop(-1)
-                # Avoids deleting its own leader.
-                if deleted == self.get_platoon_leader():
-                    self.__cache.insert(0, deleted)
-                    deleted = self.__cache.pop(-1)
-                self.__happiness_table.pop(deleted)
-                if DEBUG_HAPPINESS:
-                    print("REMOVED " + deleted + " from cache of vehicle: " + self.__id)
+        inserted = DEBUG_HAPPINESS and candidate not in self.__happiness_table
+        deleted = self.__happiness_table.update_entry(candidate, new_happiness, param1, param2,
+                                                      pinned=self.get_platoon_leader())
         if DEBUG_HAPPINESS:
-            print("Car: + " + candidate + " Happiness Table: " + str(self.__happiness_table.values()) + " LRU Cache: " + self.__cache)
+            if inserted:
+                print("INSERTED " + candidate + " in cache of vehicle: " + self.__id)
+            if deleted is not None:
+                print("REMOVED " + deleted + " from cache of vehicle: " + self.__id)
+            print("Car: + " + candidate + " Happiness Table: " + str(self.__happiness_table.items()))
 
     """ ############################################################################
                                 Getter
@@ -199,61 +203,59 @@ class VehicleData:
         return self.__floatID
 
     def get_state(self):
-        return self.__state
+        return int(self.__store.state[self.__slot])
 
     def get_platoon_leader(self):
         if self.is_in_platoon():
-            return self.__platoonLeader
+            return self.__store.ids[self.__store.leader_slot[self.__slot]]
         return self.__id
 
     def get_desired_platoon_leader(self):
         return self.__desiredPlatoonLeader
 
     def get_platoon_members(self):
-        if len(self.__platoonMembers) == 0:
+        platoon = Platoons.of(self.__id)
+        if platoon is None or len(platoon.members) == 0:
             return [self.__id]
-        return self.__platoonMembers
+        return platoon.members
 
     def get_pos_in_platoon(self):
-        return int(self.__posInPlatoon)
+        return int(self.__store.pos_in_platoon[self.__slot])
 
     def get_desired_speed(self):
-        return traci.vehicle.getMaxSpeed(self.__id) * self.__desired_speed_factor  #calculating in m/s!
+        return VehicleSnapshot.get_max_speed(self.__id) * self.get_desired_speed_factor()  #calculating in m/s!
 
     def get_desired_platoon_speed(self):
         if self.is_in_platoon():
-            return self.__desiredPlatoonSpeed
+            return float(self.__store.desired_platoon_speed[self.__slot])
         return self.get_desired_speed()
 
     def get_speed(self):
-        return traci.vehicle.getSpeed(self.__id)
+        return VehicleSnapshot.get_speed(self.__id)
 
     def get_max_speed(self):
-        return traci.vehicle.getMaxSpeed(self.__id)  #calculating in m/s!
+        return VehicleSnapshot.get_max_speed(self.__id)  #calculating in m/s!
 
     def get_desired_speed_factor(self):
-        return self.__desired_speed_factor
+        return float(self.__store.desired_speed_factor[self.__slot])
 
     def get_current_speed_factor(self):
-        return traci.vehicle.getSpeedFactor(self.__id)
+        return VehicleSnapshot.get_speed_factor(self.__id)
 
     def get_lane_id(self):
         """
         Returns the ID of the currently used lane of the road.
         """
-        return traci.vehicle.getLaneIndex(self.__id)
+        return VehicleSnapshot.get_lane_index(self.__id)
 
     def get_color(self):
         return self.__color
 
     def get_angle(self):
-        return traci.vehicle.getAngle(self.__id)
+        return VehicleSnapshot.get_angle(self.__id)
 
     def get_road_id(self):
-        return traci.vehicle.getRoadID(self.__id)
-
-    def get_neighbor_table_pos(self):
-        return self.__neighbor_table_pos
+        return VehicleSnapshot.get_road_id(self.__id)
 
     """ ############################################################################
                                 Setter
@@ -266,22 +268,24 @@ class VehicleData:
         self.__candidates = list(candidates)
 
     def set_state(self, state):
-        self.__state = state
+        EventLog.state_changed(self.__slot, self.__store.state[self.__slot], state)
+        self.__store.state[self.__slot] = state
 
     def set_platoon_leader(self, leader):
-        self.__platoonLeader = leader
+        if leader is None:
+            self.__store.leader_slot[self.__slot] = VehicleStore.NO_SLOT
+        else:
+            self.__store.leader_slot[self.__slot] = self.__store.slot_of(leader)
 
     def set_pos_in_platoon(self, pos):
-        self.__posInPlatoon = pos
+        self.__store.pos_in_platoon[self.__slot] = pos
 
     def set_desired_platoon_speed(self, speed):
-        self.__desiredPlatoonSpeed = speed
+        self.__store.desired_platoon_speed[self.__slot] = speed
 
     def set_current_speed_factor(self, speed_factor):
-        traci.vehicle.setSpeedFactor(self.__id, speed_factor)
-
-    def set_neighbor_table_pos(self, pos_relative):
-        self.__neighbor_table_pos = pos_relative
+        PlexeCommands.set_speed_factor(self.__id, speed_factor)
+        VehicleSnapshot.write(self.__id, tc.VAR_SPEED_FACTOR, speed_factor)
 
     def set_desired_platoon_leader(self, leader):
         self.__desiredPlatoonLeader = leader
@@ -291,27 +295,32 @@ class VehicleData:
     ############################################################################ """
 
     def colorize(self):
+        # Headless runs have nobody to look at the colors. Saves the setColor / getColor round-trips.
+        # The colors are buffered in PlexeCommands, the color of the leader may not be sent yet.
+        if not Globals.gui:
+            return
         # print(self.__id)
-        if self.__isLeader:
+        if self.is_leader():
             # print("COLOR --> Own Leader")
-            traci.vehicle.setColor(self.__id, self.__color)
-        elif self.__platoonLeader is not None:
+            PlexeCommands.set_color(self.__id, self.__color)
+        elif self.is_in_platoon():
             # print("COLOR --> Platoon Leader")
-            traci.vehicle.setColor(self.__id, traci.vehicle.getColor(self.__platoonLeader))
+            PlexeCommands.set_color(self.__id, PlexeCommands.get_color(self.get_platoon_leader()))
         else:
-            traci.vehicle.setColor(self.__id, STANDARD_COLOR)
+            PlexeCommands.set_color(self.__id, STANDARD_COLOR)
             # print("COLOR --> STANDART")
 
 
     def on_same_lane_with_leader(self):
-        if self.__platoonLeader is None:
+        if not self.is_in_platoon():
             if self.__desiredPlatoonLeader is not None:
-                if traci.vehicle.getLaneIndex(self.__id) == traci.vehicle.getLaneIndex(self.__desiredPlatoonLeader) \
-                        and traci.vehicle.getAngle(self.__id) == traci.vehicle.getAngle(self.__desiredPlatoonLeader):
+                if VehicleSnapshot.get_lane_index(self.__id) == VehicleSnapshot.get_lane_index(self.__desiredPlatoonLeader) \
+                        and VehicleSnapshot.get_angle(self.__id) == VehicleSnapshot.get_angle(self.__desiredPlatoonLeader):
                     return True
         else:
-            if traci.vehicle.getLaneIndex(self.__id) == traci.vehicle.getLaneIndex(self.__platoonLeader) \
-                    and traci.vehicle.getAngle(self.__id) == traci.vehicle.getAngle(self.__platoonLeader):
+            leader = self.get_platoon_leader()
+            if VehicleSnapshot.get_lane_index(self.__id) == VehicleSnapshot.get_lane_index(leader) \
+                    and VehicleSnapshot.get_angle(self.__id) == VehicleSnapshot.get_angle(leader):
                 return True
         return False
 
@@ -332,11 +341,8 @@ class VehicleData:
         return len(neighbors_right_follower + neighbors_right_front) > 0
 
     def reset_car(self):
-        self.__isLeader = False
-        self.__platoonLeader = None
-        self.__platoonMembers = []
-        self.__desiredPlatoonSpeed = -1
-        self.__posInPlatoon = None
-        self.__hasJoiner = False
-        self.__hasLeaver = False
+        platoon = Platoons.of(self.__id)
+        if platoon is not None:
+            Platoons.dissolve(platoon)
+        self.__store.reset_platoon(self.__slot)
         self.colorize()
@@ -0,0 +1,122 @@
+"""
+Per step snapshot of the vehicle state.
+Every vehicle is subscribed once to all variables the getters of VehicleData and platoonUtils need. SUMO sends the
+values of all subscribed vehicles together with the response of traci.simulationStep(), so reading the snapshot
+costs no additional round-trip.
+"""
+
+import os
+import sys
+
+if 'SUMO_HOME' in os.environ:
+    tools = os.path.join(os.environ['SUMO_HOME'], 'tools')
+    sys.path.append(tools)
+else:
+    sys.exit("please declare environment variable 'SUMO_HOME'")
+
+import traci
+from traci import constants as tc
+
+VARIABLES = (tc.VAR_SPEED, tc.VAR_MAXSPEED, tc.VAR_SPEED_FACTOR, tc.VAR_LANE_INDEX, tc.VAR_ANGLE, tc.VAR_ROAD_ID,
+             tc.VAR_POSITION)
+
+snapshot = {}
+subscribed = set()
+# Incremented with every update, allows derived per step data (e.g. the DistanceMatrix) to detect a new step.
+version = 0
+
+
+def reset():
+    """
+    Clears the snapshot. Has to be called at the start of every simulation.
+    """
+    global snapshot
+    global subscribed
+    global version
+    snapshot = {}
+    subscribed = set()
+    version += 1
+
+
+def update(vehicles):
+    """
+    Refreshes the snapshot after traci.simulationStep().
+    New vehicles are subscribed, the subscribe response already contains their current values.
+    @param vehicles: ids of all vehicles in the simulation (traci.vehicle.getIDList())
+    """
+    global snapshot
+    global subscribed
+    global version
+    current = set(vehicles)
+    for car in current - subscribed:
+        traci.vehicle.subscribe(car, VARIABLES)
+    # Subscriptions of vehicles which left the simulation are dropped by SUMO itself.
+    subscribed = current
+    snapshot = traci.vehicle.getAllSubscriptionResults()
+    version += 1
+
+
+def get(car, variable, fallback):
+    """
+    Returns the value of a subscribed variable from the snapshot. If the car is not part of the current snapshot
+    (e.g. it was added in this step), the value is requested with the fallback getter instead.
+    """
+    values = snapshot.get(car)
+    if values is not None and variable in values:
+        return values[variable]
+    return fallback(car)
+
+
+def write(car, variable, value):
+    """
+    Write-through for setters, so getters in the same step see the new value.
+    """
+    values = snapshot.get(car)
+    if values is not None:
+        values[variable] = value
+
+
+def get_speed(car):
+    return get(car, tc.VAR_SPEED, traci.vehicle.getSpeed)
+
+
+def get_max_speed(car):
+    return get(car, tc.VAR_MAXSPEED, traci.vehicle.getMaxSpeed)
+
+
+def get_speed_factor(car):
+    return get(car, tc.VAR_SPEED_FACTOR, traci.vehicle.getSpeedFactor)
+
+
+def get_lane_index(car):
+    return get(car, tc.VAR_LANE_INDEX, traci.vehicle.getLaneIndex)
+
+
+def get_angle(car):
+    return get(car, tc.VAR_ANGLE, traci.vehicle.getAngle)
+
+
+def get_road_id(car):
+    return get(car, tc.VAR_ROAD_ID, traci.vehicle.getRoadID)
+
+
+def get_position(car):
+    """
+    Returns the (x, y) position of the front bumper. This is the same position plexe reports as POS_X / POS_Y.
+    """
+    return get(car, tc.VAR_POSITION, traci.vehicle.getPosition)
+
+
+def get_all_positions():
+    """
+    Returns (car, (x, y)) for every vehicle in the snapshot.
+    """
+    return [(car, values[tc.VAR_POSITION]) for car, values in snapshot.items() if tc.VAR_POSITION in values]
+
+
+def get_all_lane_positions():
+    """
+    Returns (car, lane index, x position) for every vehicle in the snapshot.
+    """
+    return [(car, values[tc.VAR_LANE_INDEX], values[tc.VAR_POSITION][0]) for car, values in snapshot.items()
+            if tc.VAR_LANE_INDEX in values and tc.VAR_POSITION in values]
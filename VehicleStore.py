@@ -0,0 +1,124 @@
+"""
+Columnar storage of the numeric vehicle information.
+Every vehicle owns one slot in a set of numpy arrays. The slot is the number of the car id ("v.17" -> 17), so ids
+and slots are reused together when the spawning routine reuses a car id. VehicleData is a thin view over one slot,
+analysis code (e.g. Monitoring) can work on whole columns with masks instead of looping over vehicleInfos.
+"""
+
+import numpy as np
+
+from CONSTANTS import AMOUNT_RANDOM_CARS, NEW_SPAWNED
+
+NO_SLOT = -1
+
+
+class VehicleStore:
+    def __init__(self, capacity=AMOUNT_RANDOM_CARS):
+        self.capacity = 0
+        self.ids = []
+        self.active = np.zeros(0, dtype=bool)
+        self.state = np.zeros(0, dtype=np.int8)
+        self.leader_slot = np.zeros(0, dtype=np.int32)
+        self.pos_in_platoon = np.zeros(0, dtype=np.int16)
+        self.platoon_size = np.zeros(0, dtype=np.int16)
+        self.desired_speed_factor = np.zeros(0, dtype=np.float64)
+        self.desired_platoon_speed = np.zeros(0, dtype=np.float64)
+        self.old_happiness = np.zeros(0, dtype=np.float64)
+        self.counter = np.zeros(0, dtype=np.int32)
+        self.crash_counter = np.zeros(0, dtype=np.int32)
+        self.is_leader = np.zeros(0, dtype=bool)
+        self.has_joiner = np.zeros(0, dtype=bool)
+        self.has_leaver = np.zeros(0, dtype=bool)
+        self.from_another_platoon = np.zeros(0, dtype=bool)
+        self.__grow(max(capacity, 1))
+
+    def __grow(self, capacity):
+        """
+        Enlarges all columns to the given capacity. New slots are inactive.
+        """
+        added = capacity - self.capacity
+        self.ids.extend([None] * added)
+        self.active = np.concatenate([self.active, np.zeros(added, dtype=bool)])
+        self.state = np.concatenate([self.state, np.full(added, NEW_SPAWNED, dtype=np.int8)])
+        self.leader_slot = np.concatenate([self.leader_slot, np.full(added, NO_SLOT, dtype=np.int32)])
+        self.pos_in_platoon = np.concatenate([self.pos_in_platoon, np.full(added, -1, dtype=np.int16)])
+        self.platoon_size = np.concatenate([self.platoon_size, np.zeros(added, dtype=np.int16)])
+        self.desired_speed_factor = np.concatenate([self.desired_speed_factor, np.zeros(added)])
+        self.desired_platoon_speed = np.concatenate([self.desired_platoon_speed, np.full(added, -1.0)])
+        self.old_happiness = np.concatenate([self.old_happiness, np.zeros(added)])
+        self.counter = np.concatenate([self.counter, np.zeros(added, dtype=np.int32)])
+        self.crash_counter = np.concatenate([self.crash_counter, np.zeros(added, dtype=np.int32)])
+        self.is_leader = np.concatenate([self.is_leader, np.zeros(added, dtype=bool)])
+        self.has_joiner = np.concatenate([self.has_joiner, np.zeros(added, dtype=bool)])
+        self.has_leaver = np.concatenate([self.has_leaver, np.zeros(added, dtype=bool)])
+        self.from_another_platoon = np.concatenate([self.from_another_platoon, np.zeros(added, dtype=bool)])
+        self.capacity = capacity
+
+    @staticmethod
+    def slot_of(car):
+        return int(car[2:])
+
+    def allocate(self, car, desired_speed_factor=0):
+        """
+        Initializes the slot of a new car and returns it.
+        """
+        slot = self.slot_of(car)
+        if slot >= self.capacity:
+            self.__grow(max(slot + 1, 2 * self.capacity))
+        self.ids[slot] = car
+        self.active[slot] = True
+        self.state[slot] = NEW_SPAWNED
+        self.desired_speed_factor[slot] = desired_speed_factor
+        self.old_happiness[slot] = 0
+        self.counter[slot] = 0
+        self.crash_counter[slot] = 0
+        self.from_another_platoon[slot] = False
+        self.reset_platoon(slot)
+        return slot
+
+    def release(self, slot):
+        self.active[slot] = False
+
+    def reset_platoon(self, slot):
+        """
+        Removes all platoon information of a slot.
+        """
+        self.is_leader[slot] = False
+        self.leader_slot[slot] = NO_SLOT
+        self.platoon_size[slot] = 0
+        self.desired_platoon_speed[slot] = -1
+        self.pos_in_platoon[slot] = -1
+        self.has_joiner[slot] = False
+        self.has_leaver[slot] = False
+
+    def active_slots(self):
+        return np.flatnonzero(self.active)
+
+    def in_state(self, *states):
+        """
+        Returns a mask of all active slots with one of the given states.
+        """
+        return self.active & np.isin(self.state, states)
+
+    def in_platoon(self):
+        return self.active & (self.leader_slot != NO_SLOT)
+
+    def platoon_size_code(self):
+        """
+        Encodes the platoon situation of each slot like the platoon_size monitoring file does:
+        leader -> size of its platoon, member -> 1000 + number of its leader, single car -> 1, no car -> -1
+        """
+        code = np.where(self.is_leader, np.maximum(self.platoon_size, 1), self.leader_slot + 1000)
+        code = np.where(self.leader_slot == NO_SLOT, 1, code)
+        return np.where(self.active, code, -1)
+
+
+store = VehicleStore()
+
+
+def reset(capacity=AMOUNT_RANDOM_CARS):
+    """
+    Creates an empty store. Has to be called at the start of every simulation.
+    """
+    global store
+    store = VehicleStore(capacity)
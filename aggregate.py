@@ -0,0 +1,132 @@
+"""
+Vectorized reductions over the monitoring matrices of MetricLoader: one row per time step, the time in the first
+column and one column per car, -1 for missing cars.
+Every function reduces the whole (time steps x cars) matrix at once and returns one value per time step. The results
+are the curves of the former per time step loops in Printer.py and Boxplots_Overall.py.
+"""
+
+from functools import reduce
+
+import numpy as np
+
+
+def time(matrix):
+    return matrix[:, 0]
+
+
+def cars(matrix):
+    return matrix[:, 1:]
+
+
+def align(*matrices):
+    """
+    Restricts the matrices to the time steps sampled in all of them, so their rows can be combined. Metrics with
+    different sampling intervals (MONITORING_METRICS) only share the time steps of the coarsest interval.
+    """
+    first = time(matrices[0])
+    if all(len(matrix) == len(first) and np.array_equal(time(matrix), first) for matrix in matrices[1:]):
+        return matrices
+    common = reduce(np.intersect1d, [time(matrix) for matrix in matrices])
+    return tuple(matrix[np.isin(time(matrix), common)] for matrix in matrices)
+
+
+def count(mask):
+    """
+    Number of cars per time step for which the mask is True.
+    """
+    return np.count_nonzero(mask, axis=1)
+
+
+def count_in(matrix, values):
+    """
+    Number of cars per time step with one of the given values (e.g. states).
+    """
+    return count(np.isin(cars(matrix), values))
+
+
+def amount_of_cars(matrix):
+    """
+    Number of existing cars per time step. Valid values of all metrics are > -1.
+    """
+    return count(cars(matrix) > -1)
+
+
+def cut_off(amount):
+    """
+    Number of time steps without cars. The plots skip that many steps at the start of the run.
+    """
+    return int(np.count_nonzero(amount == 0))
+
+
+def sum_present(matrix, amount):
+    """
+    Sum over the existing cars per time step. Missing cars are -1, adding 1 for each of them removes them from the sum.
+    """
+    values = cars(matrix)
+    return values.sum(axis=1) + (values.shape[1] - amount)
+
+
+def ratio(numerator, denominator):
+    """
+    Element wise division. Division by zero gives inf / nan like the former scalar numpy divisions, without warnings.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.true_divide(numerator, denominator)
+
+
+def where_cars(values, amount):
+    """
+    Sets all time steps without cars to 0.
+    """
+    return np.where(amount > 0, values, 0)
+
+
+def average(matrix, amount):
+    """
+    Average value of the existing cars per time step, 0 for time steps without cars.
+    """
+    return where_cars(ratio(sum_present(matrix, amount), amount), amount)
+
+
+def average_platoon_size(platoon_size):
+    """
+    Returns (average platoon size, amount of cars) per time step. Leaders and single cars have a platoon_size value
+    below 1000, members 1000 + number of their leader.
+    """
+    values = cars(platoon_size)
+    amount = count(values > -1)
+    platoon_leaders = count((values > -1) & (values < 1000))
+    return ratio(amount, platoon_leaders), amount
+
+
+def average_neighborhood(neighborhood, candidatehood):
+    """
+    Returns (average neighborhood, average candidatehood, amount of single and platoon cars) per time step.
+    Cars in other states are -2 and are not part of the average.
+    """
+    amount = count(cars(neighborhood) != -1)
+    amount_in_wrong_state = count(cars(candidatehood) == -2)
+    amount_of_single_and_platoon_cars = amount - amount_in_wrong_state
+    neighborhood_sum = sum_present(neighborhood, amount) + 2 * amount_in_wrong_state
+    candidate_sum = sum_present(candidatehood, amount) + 2 * amount_in_wrong_state
+    return where_cars(ratio(neighborhood_sum, amount_of_single_and_platoon_cars), amount_of_single_and_platoon_cars), \
+        where_cars(ratio(candidate_sum, amount_of_single_and_platoon_cars), amount_of_single_and_platoon_cars), \
+        amount_of_single_and_platoon_cars
+
+
+def relative_speed_loss(speed, reference_speed, amount):
+    """
+    Sum of the absolute differences between speed and reference speed relative to the sum of the speeds of all
+    existing cars, 0 for time steps without cars.
+    """
+    difference = np.abs(cars(speed) - cars(reference_speed)).sum(axis=1)
+    return where_cars(ratio(difference, sum_present(speed, amount)), amount)
+
+
+def rows_before(matrix, timesteps):
+    """
+    Returns the timesteps which are available as row of the matrix. Like the boxplots, only the first half of the
+    rows is used as index.
+    """
+    timesteps = np.asarray(timesteps)
+    return timesteps[len(matrix) // 2 > timesteps]
@@ -0,0 +1,98 @@
+"""
+Local stand-in for the plexe python API, backed by the World of LocalSimulation.py. See LocalSimulation.install().
+"""
+
+import LocalSimulation
+from LocalSimulation import DRIVER, ACC, CACC, FAKED_CACC
+
+# Keys of get_vehicle_data
+INDEX = 0
+SPEED = 1
+ACCELERATION = 2
+POS_X = 3
+POS_Y = 4
+TIME = 5
+LENGTH = 6
+U = 7
+SPEED_X = 8
+SPEED_Y = 9
+ANGLE = 10
+
+# Keys of get_radar_data
+RADAR_DISTANCE = "d"
+RADAR_REL_SPEED = "v"
+
+
+class Plexe(object):
+    """
+    The controllers, auto feed and fixed lanes are columns of the World. The step listener has nothing to do, the
+    auto feed is part of the World step.
+    """
+
+    @staticmethod
+    def world():
+        return LocalSimulation.get_world()
+
+    def step(self, step):
+        return True
+
+    def set_fixed_lane(self, vid, lane, safe=True):
+        w = self.world()
+        slot = w.slot(vid)
+        w.fixed_lane[slot] = min(max(int(lane), 0), LocalSimulation.LANES - 1)
+        w.fixed_safe[slot] = safe
+
+    def disable_fixed_lane(self, vid):
+        w = self.world()
+        w.fixed_lane[w.slot(vid)] = LocalSimulation.NO_SLOT
+
+    def set_active_controller(self, vid, controller):
+        w = self.world()
+        w.controller[w.slot(vid)] = controller
+
+    def enable_auto_lane_changing(self, vid, enable):
+        w = self.world()
+        w.auto_lane_changing[w.slot(vid)] = enable
+
+    def enable_auto_feed(self, vid, enable, leader_id=None, front_id=None):
+        w = self.world()
+        slot = w.slot(vid)
+        w.auto_feed[slot] = enable
+        w.feed_front[slot] = w.slots.get(front_id, LocalSimulation.NO_SLOT) if enable else LocalSimulation.NO_SLOT
+
+    def add_member(self, vid, member_id, position):
+        self.world().slot(member_id)
+
+    def set_cc_desired_speed(self, vid, speed):
+        w = self.world()
+        w.cc_speed[w.slot(vid)] = speed
+
+    def set_path_cacc_parameters(self, vid, distance=None, xi=None, omega_n=None, c1=None):
+        if distance is not None:
+            w = self.world()
+            w.cacc_distance[w.slot(vid)] = distance
+
+    def set_acc_headway_time(self, vid, headway):
+        w = self.world()
+        w.acc_headway[w.slot(vid)] = headway
+
+    def get_distance_to_end(self, vid):
+        return self.world().distance_to_end(vid)
+
+    def get_crashed(self, vid):
+        w = self.world()
+        return bool(w.crashed[w.slot(vid)])
+
+    def get_vehicle_data(self, vid):
+        w = self.world()
+        slot = w.slot(vid)
+        x, y, angle = w.point(slot)
+        return {INDEX: -1,
+                SPEED: float(w.speed[slot]),
+                ACCELERATION: float(w.acceleration[slot]),
+                POS_X: x,
+                POS_Y: y,
+                TIME: w.time,
+                LENGTH: float(w.length[slot]),
+                U: float(w.acceleration[slot]),
+                ANGLE: angle}
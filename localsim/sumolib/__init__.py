@@ -0,0 +1,7 @@
+"""
+Local stand-in for sumolib. There is no binary to check, traci.start() of localsim never runs one.
+"""
+
+
+def checkBinary(name, bindir=None):
+    return name
@@ -0,0 +1,41 @@
+"""
+Local stand-in for traci, backed by the World of LocalSimulation.py. See LocalSimulation.install().
+"""
+
+import LocalSimulation
+from LocalSimulation import TraCIException
+
+from . import constants
+from . import vehicle
+
+listeners = []
+
+
+def start(cmd, port=None, numRetries=None, label="default", **kwargs):
+    """
+    Starts the simulation of the configuration file given with -c. All other sumo arguments are ignored.
+    """
+    del listeners[:]
+    LocalSimulation.start(cmd[cmd.index("-c") + 1])
+    return None, "local"
+
+
+def load(args):
+    LocalSimulation.start(args[args.index("-c") + 1])
+
+
+def close(wait=True):
+    del listeners[:]
+    LocalSimulation.close()
+
+
+def simulationStep(step=0.):
+    world = LocalSimulation.get_world()
+    world.step()
+    for listener in list(listeners):
+        listener.step(step)
+
+
+def addStepListener(listener):
+    listeners.append(listener)
+    return len(listeners) - 1
@@ -0,0 +1,11 @@
+"""
+Variable ids of the traci constants used by this project, with the values of SUMO.
+"""
+
+VAR_SPEED = 0x40
+VAR_MAXSPEED = 0x41
+VAR_POSITION = 0x42
+VAR_ANGLE = 0x43
+VAR_ROAD_ID = 0x50
+VAR_LANE_INDEX = 0x52
+VAR_SPEED_FACTOR = 0x5e
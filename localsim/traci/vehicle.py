@@ -0,0 +1,120 @@
+"""
+Local stand-in for traci.vehicle.
+"""
+
+import numpy as np
+
+import LocalSimulation
+
+from . import constants as tc
+
+
+def world():
+    return LocalSimulation.get_world()
+
+
+def getIDList():
+    return tuple(world().id_list())
+
+
+def getSpeed(vehID):
+    w = world()
+    return float(w.speed[w.slot(vehID)])
+
+
+def getMaxSpeed(vehID):
+    w = world()
+    return float(w.max_speed[w.slot(vehID)])
+
+
+def getSpeedFactor(vehID):
+    w = world()
+    return float(w.speed_factor[w.slot(vehID)])
+
+
+def getLaneIndex(vehID):
+    w = world()
+    return int(w.lane[w.slot(vehID)])
+
+
+def getAngle(vehID):
+    return world().angle(vehID)
+
+
+def getRoadID(vehID):
+    return world().road_id(vehID)
+
+
+def getPosition(vehID):
+    return world().position(vehID)
+
+
+def getColor(vehID):
+    w = world()
+    w.slot(vehID)
+    return w.colors[vehID]
+
+
+def getNeighbors(vehID, mode):
+    """
+    Bit 0 - 0 left, 1 right; bit 1 - 0 following, 1 leading; bit 2 - 0 all cars, 1 blocking cars
+    """
+    w = world()
+    direction = -1 if mode & 1 else 1
+    return tuple(w.neighbors(w.slot(vehID), direction, bool(mode & 2), bool(mode & 4)))
+
+
+# Column of World.snapshot() for every variable
+COLUMNS = {tc.VAR_SPEED: "speed",
+           tc.VAR_MAXSPEED: "max_speed",
+           tc.VAR_SPEED_FACTOR: "speed_factor",
+           tc.VAR_LANE_INDEX: "lane",
+           tc.VAR_ANGLE: "angle",
+           tc.VAR_ROAD_ID: "road",
+           tc.VAR_POSITION: "position"}
+
+
+def subscribe(objectID, varIDs=(tc.VAR_ROAD_ID, tc.VAR_LANE_INDEX), begin=None, end=None):
+    w = world()
+    w.slot(objectID)
+    w.subscriptions[objectID] = tuple(varIDs)
+
+
+def getAllSubscriptionResults():
+    w = world()
+    results = {}
+    # Cars with the same variables are read together, column by column.
+    for variables in set(w.subscriptions.values()):
+        cars = [car for car, subscribed in w.subscriptions.items() if subscribed == variables]
+        columns = w.snapshot(np.array([w.slots[car] for car in cars], dtype=np.int64))
+        for car, values in zip(cars, zip(*[columns[COLUMNS[variable]] for variable in variables])):
+            results[car] = dict(zip(variables, values))
+    return results
+
+
+def add(vehID, routeID, typeID="DEFAULT_VEHTYPE", depart=None, departLane="first", departPos="base",
+        departSpeed="0", **kwargs):
+    lane = 0 if departLane in ("first", "free", "best", "random", "allowed") else int(departLane)
+    position = 0 if departPos in ("base", "free", "random", "last") else float(departPos)
+    speed = 0 if departSpeed in ("max", "desired", "random", "speedLimit") else float(departSpeed)
+    world().add(vehID, routeID, position, lane, speed, typeID)
+
+
+def remove(vehID, reason=3):
+    world().remove(vehID)
+
+
+def setSpeedMode(vehID, sm):
+    w = world()
+    w.speed_mode[w.slot(vehID)] = sm
+
+
+def setSpeedFactor(vehID, factor):
+    w = world()
+    w.speed_factor[w.slot(vehID)] = factor
+
+
+def setColor(vehID, color):
+    w = world()
+    w.slot(vehID)
+    w.colors[vehID] = tuple(int(c) for c in color)
@@ -12,6 +12,12 @@ import traci
 from plexe import DRIVER, ACC, CACC, FAKED_CACC, POS_X, POS_Y, RADAR_DISTANCE
 from CONSTANTS import *
 import Globals
+import DistanceMatrix
+import DistanceToEnd
+import PlexeCommands
+import Platoons
+import LaneOccupancy
+import VehicleSnapshot
 
 
 # noinspection PyGlobalUndefined
@@ -40,14 +46,15 @@ def init_platoon_leader(leader):
     vehicleInfos[leader].colorize()
     vehicleInfos[leader].add_platoon_member(leader)
     vehicleInfos[leader].set_desired_platoon_speed(speed)
+    vehicleInfos[leader].get_platoon().speed_sum = speed
     # Change behaviour into platooning vehicle.
     change_into_platooning_vehicle(leader, speed)
     # Setup lead controller
-    plexe.set_active_controller(leader, ACC)
+    PlexeCommands.set_active_controller(leader, ACC)
     # Disable lane change. For platoon driving, no member is allowed to change lanes on his own. Instead the leader gets
     # an auto lange change possibility.
-    plexe.set_fixed_lane(leader, vehicleInfos[leader].get_lane_id(), False)
-    plexe.enable_auto_lane_changing(leader, True)
+    PlexeCommands.set_fixed_lane(leader, vehicleInfos[leader].get_lane_id(), False)
+    PlexeCommands.enable_auto_lane_changing(leader, True)
 
 
 def add_platoon_member(car, leader):
@@ -58,11 +65,11 @@ def add_platoon_member(car, leader):
     Afterwards the car will automatically accelerate and change lanes in order to reach the platoon.
     """
     reset_to_single_car(car)
-    nr_of_vehicle_in_platoon = len(vehicleInfos[leader].get_platoon_members())
-    # (Derzeitige Durchschnittsgeschwindigkeit * Anzahl derzeitiger Fahrzeuge) + gewuenschte Geschwindigkeit von
-    # car, geteilt durch Gesamtmenge an Fahrzeugen.
-    speed = ((vehicleInfos[leader].get_desired_platoon_speed() * nr_of_vehicle_in_platoon) + vehicleInfos[
-        car].get_desired_speed()) / (nr_of_vehicle_in_platoon + 1)
+    platoon = vehicleInfos[leader].get_platoon()
+    nr_of_vehicle_in_platoon = platoon.size()
+    # Summe der gewuenschten Geschwindigkeiten aller Fahrzeuge inklusive car, geteilt durch Gesamtmenge an Fahrzeugen.
+    platoon.speed_sum += vehicleInfos[car].get_desired_speed()
+    speed = platoon.speed_sum / (nr_of_vehicle_in_platoon + 1)
 
     # Add information to the data structure.
     vehicleInfos[car].set_platoon_leader(leader)
@@ -71,19 +78,16 @@ def add_platoon_member(car, leader):
 
     # Set up platooning vehicle
     change_into_platooning_vehicle(car, speed)
-    plexe.set_fixed_lane(car, vehicleInfos[leader].get_lane_id(), False)
-    plexe.set_active_controller(car, CACC)
-    front_car = vehicleInfos[leader].get_platoon_members()[nr_of_vehicle_in_platoon - 1]
-    plexe.enable_auto_feed(car, True, leader, front_car)
+    PlexeCommands.set_fixed_lane(car, vehicleInfos[leader].get_lane_id(), False)
+    PlexeCommands.set_active_controller(car, CACC)
+    front_car = platoon.last_member()
+    PlexeCommands.enable_auto_feed(car, True, leader, front_car)
 
     # Update leader information
     vehicleInfos[leader].add_platoon_member(car)
-    plexe.add_member(leader, car, vehicleInfos[car].get_pos_in_platoon())
-    plexe.set_cc_desired_speed(leader, speed)
+    PlexeCommands.add_member(leader, car, vehicleInfos[car].get_pos_in_platoon())
+    set_platoon_speed(leader)
 
-    for member in vehicleInfos[leader].get_platoon_members():
-        vehicleInfos[member].set_desired_platoon_speed(speed)
-    
     if DEBUG_ADD_MEMBER:
         print("AddMember Method called")
         print("Car: " + str(car) + " Front car: " + str(front_car) + " Leader: " + str(leader))
@@ -137,18 +141,18 @@ def prepare_for_remove(car):
 
             # only the car will move.
             if current_lane > desired_lane and not vehicleInfos[car].right_line_blocked():
-                plexe.set_fixed_lane(car, int(vehicleInfos[leader].get_lane_id() - 1), False)
+                PlexeCommands.set_fixed_lane(car, int(vehicleInfos[leader].get_lane_id() - 1), False)
             # In this situation, the whole platoon will move.
             elif current_lane == desired_lane and not left_lane_blocked(members):
                 set_platoon_lane_to(members, int(vehicleInfos[car].get_lane_id() + 1))
             # only the car will move.
             elif current_lane < desired_lane and not vehicleInfos[car].left_line_blocked():
-                plexe.set_fixed_lane(car, int(vehicleInfos[leader].get_lane_id() + 1), False)
+                PlexeCommands.set_fixed_lane(car, int(vehicleInfos[leader].get_lane_id() + 1), False)
 
         # CASE 2: Speed and distance to end check
         # If the platoon is faster than the leaver, the platoon will change lane to the left.
         elif (vehicleInfos[leader].get_desired_platoon_speed() > vehicleInfos[car].get_desired_speed() \
-              or plexe.get_distance_to_end(car) - vehicleInfos[car].get_pos_in_platoon() \
+              or DistanceToEnd.get(car) - vehicleInfos[car].get_pos_in_platoon() \
               * (INTER_VERHICLE_DISTANCE + VEHICLE_LENGTH) < LEAVE_HIGHWAY_DISTANCE) \
                 and not left_lane_blocked(members):
             set_platoon_lane_to(members, int(vehicleInfos[car].get_lane_id() + 1))
@@ -156,10 +160,10 @@ def prepare_for_remove(car):
         # If the leaver is faster than the platoon, the leaver will change lane to the left.
         elif vehicleInfos[leader].get_desired_platoon_speed() <= vehicleInfos[car].get_desired_speed() \
                 and not vehicleInfos[car].left_line_blocked():
-            plexe.set_fixed_lane(car, int(vehicleInfos[leader].get_lane_id() + 1), False)
+            PlexeCommands.set_fixed_lane(car, int(vehicleInfos[leader].get_lane_id() + 1), False)
 
     elif vehicleInfos[car].get_lane_id() >= 3 and not vehicleInfos[car].right_line_blocked():
-        plexe.set_fixed_lane(car, int(vehicleInfos[leader].get_lane_id() - 1), False)
+        PlexeCommands.set_fixed_lane(car, int(vehicleInfos[leader].get_lane_id() - 1), False)
 
     # Identify the new leader (the old one or in case the leader itself will leave, the first member in the platoon)
     leader = get_new_leader(leader, members)
@@ -178,7 +182,7 @@ def set_platoon_lane_to(members, lane):
         if vehicleInfos[member].get_state() == PLATOON \
                 or vehicleInfos[member].get_state() == JOINING_PROCESS \
                 or vehicleInfos[member].get_state() == PREPARE_JOINING:
-            plexe.set_fixed_lane(member, lane, False)
+            PlexeCommands.set_fixed_lane(member, lane, False)
 
 
 def get_new_leader(leader, members):
@@ -213,27 +217,18 @@ def remove_platoon_member(car):
             vehicleInfos[member].set_state(NO_PLATOONING)
 
     else:
-        # Identify the new leader if needed
-        if leader == car:
-            leader = members[1]
-        # leader = get_new_leader(leader_old, members)
-
-        # Setup the new platoon
-        # Deleting leader and leaving car information from memberlist.
-        if car in members:
-            members.remove(car)
-        if leader in members:
-            members.remove(leader)
-
-        # Initialize the former leader or the former 2. car as the new platoon leader.
+        # The leaving car (and cars which are not simulated anymore) are taken out of the member list. The former leader
+        # or the former 2. car leads the rest of the platoon. Unlike fix_order, the rest of the platoon is set up again
+        # from scratch: every car is reset (joiner and leaver flags) and gets its lane, CACC parameters and desired
+        # speed again. The states of the members are kept in order to allow other vehicles to leave close to this
+        # timestep.
+        remaining = [member for member in members if member != car and member in vehicleInfos]
+        leader = remaining[0]
         init_platoon_leader(leader)
-        # Adds all following cars as platoon members of the new leader. The current state is saved in order to allow
-        # other vehicles to leave close to this timestep.
-        for member in members:
-            if member in vehicleInfos:
-                state = vehicleInfos[member].get_state()
-                add_platoon_member(member, leader)
-                vehicleInfos[member].set_state(state)
+        for member in remaining[1:]:
+            state = vehicleInfos[member].get_state()
+            add_platoon_member(member, leader)
+            vehicleInfos[member].set_state(state)
 
         # Delete leaving car platoon information and resets its state.
         reset_to_single_car(car)
@@ -248,6 +243,78 @@ def remove_platoon_member(car):
               + " Leader: " + str(leader) + " DesiredSpeed: " + str(vehicleInfos[leader].get_desired_speed()))
 
 
+def set_platoon_speed(leader):
+    """
+    Sets the average of the desired speeds of all members as the desired speed of the platoon.
+    """
+    platoon = vehicleInfos[leader].get_platoon()
+    speed = platoon.desired_speed()
+    PlexeCommands.set_cc_desired_speed(leader, speed)
+    for member in platoon.members:
+        vehicleInfos[member].set_desired_platoon_speed(speed)
+    return speed
+
+
+def reindex_platoon(leader, old_members, members):
+    """
+    Applies a new member order (fix_order) to the platoon of leader. The first car of members leads the platoon
+    afterwards. Instead of rebuilding the whole platoon, only the cars with a new leader, position or predecessor are
+    updated. The sum of the desired speeds has to be up to date already.
+    """
+    new_leader = members[0]
+    if new_leader != leader:
+        promote_to_leader(new_leader, vehicleInfos[leader].get_platoon(), members)
+    else:
+        vehicleInfos[leader].set_platoon_members(members)
+        vehicleInfos[leader].set_state(PLATOON)
+        vehicleInfos[leader].reset_joiner()
+
+    for pos in range(1, len(members)):
+        member = members[pos]
+        if member == leader:
+            # The former leader drives behind another member now.
+            reset_to_single_car(member)
+            link_platoon_member(member, new_leader, pos, members[pos - 1])
+            PlexeCommands.set_fixed_lane(member, vehicleInfos[new_leader].get_lane_id(), False)
+            PlexeCommands.set_active_controller(member, CACC)
+        elif new_leader != leader:
+            link_platoon_member(member, new_leader, pos, members[pos - 1])
+        elif vehicleInfos[member].get_pos_in_platoon() != pos or old_members[pos - 1] != members[pos - 1]:
+            link_platoon_member(member, new_leader, pos, members[pos - 1])
+
+    set_platoon_speed(new_leader)
+
+
+def promote_to_leader(leader, platoon, members):
+    """
+    Sets up a member of a running platoon as its leader. The Platoon keeps its id and sum of the desired speeds, the
+    platooning parameters of the car (CACC parameters, speed mode) are already set.
+    """
+    vehicleInfos[leader].reset_car()
+    Platoons.hand_over(platoon, leader)
+    vehicleInfos[leader].set_platoon_leader(leader)
+    vehicleInfos[leader].set_state(PLATOON)
+    vehicleInfos[leader].set_to_leader()
+    vehicleInfos[leader].set_pos_in_platoon(0)
+    vehicleInfos[leader].set_platoon_members(members)
+    vehicleInfos[leader].colorize()
+    PlexeCommands.enable_auto_feed(leader, False)
+    PlexeCommands.set_active_controller(leader, ACC)
+    PlexeCommands.set_fixed_lane(leader, vehicleInfos[leader].get_lane_id(), False)
+    PlexeCommands.enable_auto_lane_changing(leader, True)
+
+
+def link_platoon_member(car, leader, pos, front_car):
+    """
+    Updates the leader, position and predecessor of a platoon member.
+    """
+    vehicleInfos[car].set_platoon_leader(leader)
+    vehicleInfos[car].set_pos_in_platoon(pos)
+    vehicleInfos[car].colorize()
+    PlexeCommands.enable_auto_feed(car, True, leader, front_car)
+    PlexeCommands.add_member(leader, car, pos)
+
+
 def reset_to_single_car(car):
     """
     Resets a car into a single driving vehicle.
@@ -255,13 +322,13 @@ def reset_to_single_car(car):
     # Removes all platoon information
     vehicleInfos[car].reset_car()
     # Deactivate auto feed
-    plexe.enable_auto_feed(car, False)
+    PlexeCommands.enable_auto_feed(car, False)
     # Deactivate auto lane change
-    plexe.enable_auto_lane_changing(car, False)
+    PlexeCommands.enable_auto_lane_changing(car, False)
     # Reset controller to Driver
-    plexe.set_active_controller(car, DRIVER)
+    PlexeCommands.set_active_controller(car, DRIVER)
     # free lane choice
-    plexe.disable_fixed_lane(car)
+    PlexeCommands.disable_fixed_lane(car)
 
 
 def get_distance(v1, v2):
@@ -271,43 +338,45 @@ def get_distance(v1, v2):
     :param v2: id of the second vehicle
     :return: distance between v1 and v2
     """
-    v1_data = plexe.get_vehicle_data(v1)
-    v2_data = plexe.get_vehicle_data(v2)
-
-    distance = math.sqrt((v1_data[POS_X] - v2_data[POS_X]) ** 2 +
-                         (v1_data[POS_Y] - v2_data[POS_Y]) ** 2) - 4
-    if v1_data[POS_X] > v2_data[POS_X]:
-        return - distance
-    return distance
+    return DistanceMatrix.get_distance(v1, v2)
 
 
 def change_into_platooning_vehicle(car, speed):
-    plexe.set_path_cacc_parameters(car, INTER_VERHICLE_DISTANCE, 2, 1, 0.5)
-    plexe.set_cc_desired_speed(car, speed)
-    plexe.set_acc_headway_time(car, 1.5)
-    traci.vehicle.setSpeedMode(car, 0)
+    PlexeCommands.set_path_cacc_parameters(car, INTER_VERHICLE_DISTANCE, 2, 1, 0.5)
+    PlexeCommands.set_cc_desired_speed(car, speed)
+    PlexeCommands.set_acc_headway_time(car, 1.5)
+    PlexeCommands.set_speed_mode(car, 0)
 
 
-def merge_platoons(leader_back):
+def merge_platoons(platoon_back):
+    """
+    Merges the platoon into the platoon of the desired platoon leader of its leader, once both leaders are on the same
+    lane. Until then, the members of the back platoon are moved to the lane of the front platoon.
+    """
+    leader_back = platoon_back.leader
     if vehicleInfos[leader_back].is_leader():
         leader_front = vehicleInfos[leader_back].get_desired_platoon_leader()
         member_back = vehicleInfos[leader_back].get_platoon_members()
+        platoon_front = vehicleInfos[leader_front].get_platoon()
 
-        leader_back_lane = vehicleInfos[leader_back].get_lane_id()
-        leader_front_lane = vehicleInfos[leader_front].get_lane_id()
+        leader_back_lane = platoon_back.lane()
+        leader_front_lane = platoon_front.lane() if platoon_front is not None \
+            else vehicleInfos[leader_front].get_lane_id()
+        leader_front_road = platoon_front.road() if platoon_front is not None \
+            else vehicleInfos[leader_front].get_road_id()
 
         # Road must be the same, else the number of lanes may not fit.
-        if vehicleInfos[leader_back].get_road_id() == vehicleInfos[leader_front].get_road_id():
+        if platoon_back.road() == leader_front_road:
 
             # leader back is on higher lane than leader front and right lane is not blocked.
             if leader_back_lane > leader_front_lane and vehicleInfos[leader_back].right_line_blocked():
                 for member in member_back:
-                    plexe.set_fixed_lane(member, vehicleInfos[leader_front].get_lane_id(), False)
+                    PlexeCommands.set_fixed_lane(member, leader_front_lane, False)
 
             # leader back is on lower lane than leader front and left lane is not blocked.
             elif leader_back_lane < leader_front_lane and vehicleInfos[leader_back].left_line_blocked():
                 for member in member_back:
-                    plexe.set_fixed_lane(member, vehicleInfos[leader_front].get_lane_id(), False)
+                    PlexeCommands.set_fixed_lane(member, leader_front_lane, False)
 
             # leader back is on same lane as leader front.
             else:
@@ -328,9 +397,9 @@ def lane_change(car, leader, neighbors, cautious=False):
     if not vehicleInfos[car].on_same_lane_with_leader() \
             and vehicleInfos[car].get_road_id() == vehicleInfos[leader].get_road_id() \
             and not cars_in_between(car, vehicleInfos[car].get_platoon_leader(), neighbors):
-        plexe.set_fixed_lane(car, vehicleInfos[leader].get_lane_id(), cautious)
+        PlexeCommands.set_fixed_lane(car, vehicleInfos[leader].get_lane_id(), cautious)
     else:
-        plexe.set_fixed_lane(car, vehicleInfos[car].get_lane_id(), cautious)
+        PlexeCommands.set_fixed_lane(car, vehicleInfos[car].get_lane_id(), cautious)
 
 
 def prepare_joining(car, neighbors):
@@ -377,7 +446,7 @@ def joining_process(car):
 
     if not vehicleInfos[car].on_same_lane_with_leader() \
             and vehicleInfos[car].get_road_id() == vehicleInfos[leader].get_road_id():
-        plexe.set_fixed_lane(car, vehicleInfos[leader].get_lane_id(), False)
+        PlexeCommands.set_fixed_lane(car, vehicleInfos[leader].get_lane_id(), False)
 
     if get_distance(car, predecessor) < JOINING_CRITICAL_DISTANCE:
         vehicleInfos[vehicleInfos[car].get_platoon_leader()].reset_joiner()
@@ -392,6 +461,7 @@ def fix_order(car):
     """
     leader = vehicleInfos[car].get_platoon_leader()
     members = vehicleInfos[leader].get_platoon_members()
+    old_members = list(members)
     pos_car = vehicleInfos[car].get_pos_in_platoon()
     switched = False
 
@@ -408,11 +478,9 @@ def fix_order(car):
                 print("switched " + car + " with " + predecessor)
 
     if switched:
+        reindex_platoon(leader, old_members, members)
         leader = members[0]
-        members.remove(leader)
-        init_platoon_leader(leader)
-        for member in members:
-            add_platoon_member(member, leader)
+        for member in members[1:]:
             vehicleInfos[member].set_state(PLATOON)
 
         if DEBUG_ADD_MEMBER:
@@ -422,26 +490,45 @@ def fix_order(car):
 def cars_in_between(car, leader_front, neighbors):
     """
     This method checks, if there is a car or platoon in between a car and its platoon it wants to joining_process.
+    Only the neighbors on the lanes from the car to the leader within the longitudinal range of the check are
+    candidates, they are found with a range query on the LaneOccupancy.
     @param car: The car
     @param leader_front: The new leader of car
     @param neighbors: all neighbors wo are in range and in state Platoon or Single Car
     """
-    length_platoon = max(len(vehicleInfos[leader_front].get_platoon_members()), 1) * (
-            VEHICLE_LENGTH + INTER_VERHICLE_DISTANCE)
-    for neighbor in neighbors:
+    platoon = vehicleInfos[leader_front].get_platoon()
+    length_platoon = platoon.length() if platoon is not None else VEHICLE_LENGTH + INTER_VERHICLE_DISTANCE
+    max_distance = get_distance(car, leader_front) - length_platoon
+    if max_distance <= -10:
+        return False
+
+    # The neighbor is on the lane of the leader or on a lane between car and leader.
+    car_lane = vehicleInfos[car].get_lane_id()
+    leader_lane = platoon.lane() if platoon is not None else vehicleInfos[leader_front].get_lane_id()
+    if leader_lane > car_lane:
+        first_lane, last_lane = car_lane + 1, leader_lane
+    elif leader_lane < car_lane:
+        first_lane, last_lane = leader_lane, car_lane - 1
+    else:
+        first_lane, last_lane = leader_lane, leader_lane
+
+    # The distance is measured between the positions, a distance in (-10, max_distance) needs an x position in this
+    # interval. The candidates are checked with the exact distance afterwards.
+    x = VehicleSnapshot.get_position(car)[0]
+    candidates = LaneOccupancy.cars_between(first_lane, last_lane, x - VEHICLE_LENGTH - 10,
+                                            x + max(max_distance + VEHICLE_LENGTH, 0))
+    if not candidates:
+        return False
+
+    neighbors = set(neighbors)
+    own_leader = vehicleInfos[car].get_platoon_leader()
+    for neighbor in candidates:
         # There is a neighbor between the car and its leader
-        if -10 < get_distance(car, neighbor) < get_distance(car, leader_front) - length_platoon:
+        if neighbor in neighbors and -10 < get_distance(car, neighbor) < max_distance:
             # This neighbor is not a member of the same platoon as the car or the front leader.
-            if not (vehicleInfos[neighbor].get_platoon_leader() == leader_front \
-                    or vehicleInfos[neighbor].get_platoon_leader() == vehicleInfos[car].get_platoon_leader()):
-                # The neighbor is on the same lane
-                if vehicleInfos[neighbor].get_lane_id() == vehicleInfos[leader_front].get_lane_id():
-                    return True
-                # Or the neighbor is on the lane between car and leader.
-                if vehicleInfos[leader_front].get_lane_id() >= vehicleInfos[neighbor].get_lane_id() > vehicleInfos[car].get_lane_id():
-                    return True
-                if vehicleInfos[leader_front].get_lane_id() <= vehicleInfos[neighbor].get_lane_id() < vehicleInfos[car].get_lane_id():
-                    return True
+            neighbor_leader = vehicleInfos[neighbor].get_platoon_leader()
+            if not (neighbor_leader == leader_front or neighbor_leader == own_leader):
+                return True
     return False
 
 
@@ -460,9 +547,9 @@ def take_next_exit(car):
     Checks, if the car is near its exit, it wants to take.
     """
     if vehicleInfos[car].is_in_platoon():
-        return plexe.get_distance_to_end(car) - vehicleInfos[car].get_pos_in_platoon() \
+        return DistanceToEnd.get(car) - vehicleInfos[car].get_pos_in_platoon() \
             * (INTER_VERHICLE_DISTANCE + VEHICLE_LENGTH) < LEAVE_HIGHWAY_DISTANCE
-    return plexe.get_distance_to_end(car) < LEAVE_HIGHWAY_DISTANCE
+    return DistanceToEnd.get(car) < LEAVE_HIGHWAY_DISTANCE
 
 
 def fix_speed_factor(car):
@@ -501,19 +588,18 @@ def check_merging(car, neighbor, neighbors):
     return False
 
 
-def handle_auto_lane_change_in_platoon(car):
+def handle_auto_lane_change_in_platoon(platoon):
     """
     Error routine to make it easier for a car to close up to the platoon.
     While the last platoon member is not on the same lane as the platoon leader, the platoon leader is not allowed to
     do a lange changing maneuver.
     """
-    members = vehicleInfos[car].get_platoon_members()
-    last_member = members[-1]
-    if vehicleInfos[last_member].get_road_id() == vehicleInfos[car].get_road_id() \
+    car = platoon.leader
+    if vehicleInfos[platoon.last_member()].get_road_id() == platoon.road() \
             and not vehicleInfos[car].has_leaver() and not vehicleInfos[car].has_joiner():
-        plexe.enable_auto_lane_changing(car, True)
+        PlexeCommands.enable_auto_lane_changing(car, True)
     else:
-        plexe.enable_auto_lane_changing(car, False)
+        PlexeCommands.enable_auto_lane_changing(car, False)
 
 
 def check_emergency_platoon_quit(car, leader):
@@ -529,7 +615,9 @@ def check_emergency_platoon_quit(car, leader):
             print(car + ": emegency platoon quit from leader: " + leader)
         vehicleInfos[car].set_state(LEAVING_PROCESS)
     else:
-        plexe.set_fixed_lane(car, vehicleInfos[leader].get_lane_id(), False)
+        platoon = vehicleInfos[leader].get_platoon()
+        lane = platoon.lane() if platoon is not None else vehicleInfos[leader].get_lane_id()
+        PlexeCommands.set_fixed_lane(car, lane, False)
 
 
 def handle_platoon_changing(car, neighbor, neighbors):
@@ -28,22 +28,26 @@ else:
 import sumolib
 import traci
 
-def start_sumo(config_file, already_running, gui=True):
+def start_sumo(config_file, already_running, gui=True, label="default"):
     """
     Starts or restarts sumo with the given configuration file
     :param config_file: sumo configuration file
     :param already_running: if set to true then the command simply reloads
     the given config file, otherwise sumo is started from scratch
     :param gui: start GUI or not
+    :param label: label of the TraCI connection. Parallel simulations need
+    distinct labels
     """
     arguments = ["--lanechange.duration", "3", "-c"]
+    if not gui:
+        arguments = ["--no-step-log", "true"] + arguments
     sumo_cmd = [sumolib.checkBinary('sumo-gui' if gui else 'sumo')]
     arguments.append(config_file)
     if already_running:
         traci.load(arguments)
     else:
         sumo_cmd.extend(arguments)
-        traci.start(sumo_cmd)
+        traci.start(sumo_cmd, label=label)
 
 
 def running(demo_mode, step, max_step):